@@ -0,0 +1,59 @@
+"""
+Koszt tworzenia klienta S3: nowy boto3.client na każde wywołanie vs wspólny oss.get_client().
+Nie wymaga sieci – mierzy samo budowanie klienta (model usługi botocore, sesja, pula HTTP).
+
+    python -m benchmarks.s3_client --calls 50
+"""
+import argparse
+import statistics
+import time
+import tracemalloc
+
+import boto3
+from botocore.client import Config
+
+from benchmarks import standin
+
+
+def fresh_client():
+    # Tak jak wcześniej robiły oss._client() i ovh_oss.upload_fileobj().
+    return boto3.client(
+        "s3",
+        endpoint_url="https://s3.waw.io.cloud.ovh.net",
+        aws_access_key_id="bench",
+        aws_secret_access_key="bench",
+        config=Config(signature_version="s3v4"),
+    )
+
+
+def measure(make_client, calls: int) -> tuple[list[float], int]:
+    timings = []
+    tracemalloc.start()
+    for _ in range(calls):
+        started = time.perf_counter()
+        make_client()
+        timings.append(time.perf_counter() - started)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return timings, peak
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    standin.setup_django()
+    from todo.services import oss
+
+    print(f"{'wariant':<14} {'pierwsze ms':>12} {'p50 ms':>9} {'suma ms':>9} {'peak MB':>9}")
+    for name, make_client in (("nowy klient", fresh_client), ("get_client()", oss.get_client)):
+        timings, peak = measure(make_client, args.calls)
+        print(
+            f"{name:<14} {timings[0] * 1000:>12.2f} {statistics.median(timings) * 1000:>9.3f} "
+            f"{sum(timings) * 1000:>9.1f} {peak / 1024 / 1024:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""
+Mikrobenchmarki warstwy serwisów na lokalnym zamienniku (SQLite + FakeS3Client w pamięci).
+
+    python -m benchmarks.services --dataset 1k
+    python -m benchmarks.services --dataset 100k --save-baseline
+    FOMO_BENCH_DB=/tmp/fomo-1m.sqlite3 python -m benchmarks.services --dataset 1m --reuse
+
+Dla każdego przypadku: p50/p95 czasu wywołania oraz szczyt pamięci zaalokowanej w trakcie
+wywołania (tracemalloc, osobny krótszy przebieg – śledzenie spowalnia pomiar czasu).
+Wyniki są porównywane z benchmarks/baseline.json; wzrost p50, p95 (luźniejszy próg) albo
+pamięci ponad --tolerance kończy program kodem 1. Baseline zależy od maszyny – po zmianie sprzętu nagraj go od nowa.
+"""
+import argparse
+import gc
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from benchmarks import standin
+
+DATASETS = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+# Taski rozkładamy na użytkowników – lista jednego użytkownika nie rośnie w nieskończoność.
+TASKS_PER_USER = 10_000
+UPLOAD_SIZE = 64 * 1024
+BASELINE = Path(__file__).with_name("baseline.json")
+
+# (metryka, mnożnik tolerancji, minimalna różnica bezwzględna) – mniejsze różnice to szum.
+# Ogon (p95) skacze bardziej niż mediana (np. checkpoint WAL w SQLite), więc ma luźniejszy próg.
+CHECKS = (
+    ("p50_ms", 1, 0.05),
+    ("p95_ms", 2, 1.0),
+    ("peak_kb", 1, 16),
+)
+
+
+def _percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def measure(call, *, iterations: int, memory_iterations: int, inner: int = 1, rounds: int = 3) -> dict:
+    """
+    Wywołuje call(i) dla kolejnych i: `rounds` rund po `iterations` razy na czas,
+    potem `memory_iterations` razy pod tracemalloc. `inner` > 1 uśrednia bardzo krótkie wywołania.
+    Z rund bierzemy tę o najniższej medianie (jak timeit) – reszta to zakłócenia z zewnątrz.
+    """
+    best = None
+    gc.disable()
+    try:
+        for r in range(rounds):
+            timings = []
+            for i in range(iterations):
+                started = time.perf_counter()
+                for j in range(inner):
+                    call((r * iterations + i) * inner + j)
+                timings.append((time.perf_counter() - started) / inner)
+            if best is None or statistics.median(timings) < statistics.median(best):
+                best = timings
+    finally:
+        gc.enable()
+
+    peaks = []
+    tracemalloc.start()
+    offset = rounds * iterations * inner
+    for i in range(memory_iterations):
+        tracemalloc.reset_peak()
+        current, _ = tracemalloc.get_traced_memory()
+        call(offset + i)
+        peaks.append(tracemalloc.get_traced_memory()[1] - current)
+    tracemalloc.stop()
+
+    return {
+        "p50_ms": round(statistics.median(best) * 1000, 4),
+        "p95_ms": round(_percentile(best, 0.95) * 1000, 4),
+        "peak_kb": round(statistics.median(peaks) / 1024, 1),
+    }
+
+
+def _wait_for_uploads(timeout: float = 60) -> None:
+    from todo.services import attachment_uploads
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        stats = attachment_uploads.upload_stats()
+        if stats["queued"] == stats["completed"] + stats["failed"]:
+            return
+        time.sleep(0.01)
+
+
+def run(*, user_id: int, iterations: int, memory_iterations: int, rounds: int) -> dict:
+    from django.core.files.uploadedfile import SimpleUploadedFile
+
+    from todo.services.mysql_pool import connection
+    from todo.services.oss import safe_object_key
+    from todo.services.task_read_sql_service import list_tasks_with_attachments
+    from todo.services.task_sql_service import bulk_delete_sql, create_task_sql, delete_task_sql, update_task_sql
+
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT id, created_at FROM tasks WHERE user_id=%s ORDER BY created_at DESC, id DESC",
+                (user_id,),
+            )
+            existing = cur.fetchall()
+    middle = existing[len(existing) // 2]
+    payload = b"x" * UPLOAD_SIZE
+    created = []
+
+    def create(i):
+        created.append(
+            create_task_sql(user_id=user_id, title=f"Bench {i}", description="opis", group="Praca", status="todo")
+        )
+
+    def create_with_upload(i):
+        upload = SimpleUploadedFile(f"plik_{i}.bin", payload, content_type="application/octet-stream")
+        created.append(
+            create_task_sql(
+                user_id=user_id, title=f"Bench {i}", description="opis", group="Praca", status="todo", upload=upload
+            )
+        )
+
+    def update(i):
+        task = existing[i % len(existing)]
+        update_task_sql(
+            user_id=user_id, task_id=task["id"], title=f"Zadanie {i}", description="opis", group="Praca", status="todo"
+        )
+
+    def delete(i):
+        delete_task_sql(user_id=user_id, task_id=created[i])
+
+    cases = [
+        ("list_first_page", lambda i: list_tasks_with_attachments(user_id=user_id, limit=51), 1),
+        (
+            "list_deep_page",
+            lambda i: list_tasks_with_attachments(user_id=user_id, after=(middle["created_at"], middle["id"]), limit=51),
+            1,
+        ),
+        ("create_task", create, 1),
+        ("create_task_with_upload", create_with_upload, 1),
+        ("update_task", update, 1),
+        ("delete_task", delete, 1),
+        ("safe_object_key", lambda i: safe_object_key(user_id=user_id, task_id=i, filename="Raport końcowy (v2).pdf"), 100),
+    ]
+
+    results = {}
+    for name, call, inner in cases:
+        results[name] = measure(
+            call, iterations=iterations, memory_iterations=memory_iterations, inner=inner, rounds=rounds
+        )
+        # Wysyłki z create_task_with_upload w tle nie mogą zabierać CPU kolejnym przypadkom.
+        _wait_for_uploads()
+
+    # Reszta tasków z benchmarków create – zbiór wraca do stanu wyjściowego (ważne przy --reuse).
+    bulk_delete_sql(user_id=user_id, task_ids=created[rounds * iterations + memory_iterations:])
+    return results
+
+
+def compare(results: dict, baseline: dict, *, tolerance: float) -> list[str]:
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for key, factor, floor in CHECKS:
+            if current[key] > base[key] * (1 + tolerance * factor) and current[key] - base[key] > floor:
+                regressions.append(f"{name}: {key} {base[key]} -> {current[key]}")
+    return regressions
+
+
+def _user_ids() -> list[int]:
+    from todo.services.mysql_pool import connection
+
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT id FROM users ORDER BY id")
+            return [r["id"] for r in cur.fetchall()]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", choices=DATASETS, default="1k")
+    parser.add_argument("--attachments", type=int, default=1, help="załączników na task w zbiorze")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--memory-iterations", type=int, default=20)
+    parser.add_argument("--tolerance", type=float, default=0.5, help="dopuszczalny względny wzrost względem baseline")
+    parser.add_argument("--reuse", action="store_true", help="użyj istniejącej bazy FOMO_BENCH_DB zamiast siać od nowa")
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    standin.setup_django()
+    standin.install(fresh=not args.reuse)
+    standin.install_fake_s3()
+
+    user_ids = _user_ids() if args.reuse else []
+    if not user_ids:
+        total = DATASETS[args.dataset]
+        started = time.perf_counter()
+        user_ids = standin.seed(
+            users=max(1, total // TASKS_PER_USER),
+            tasks_per_user=min(total, TASKS_PER_USER),
+            attachments_per_task=args.attachments,
+        )
+        print(f"Zbiór {args.dataset}: {total} tasków zasiany w {time.perf_counter() - started:.1f} s")
+
+    results = run(
+        user_id=user_ids[0], iterations=args.iterations, memory_iterations=args.memory_iterations, rounds=args.rounds
+    )
+
+    baseline_all = json.loads(BASELINE.read_text()) if BASELINE.exists() else {}
+    baseline = baseline_all.get(args.dataset, {})
+
+    print(f"{'przypadek':<26} {'p50 ms':>9} {'p95 ms':>9} {'peak KB':>9} {'baseline p50':>13}")
+    for name, r in results.items():
+        base = baseline.get(name, {}).get("p50_ms", "-")
+        print(f"{name:<26} {r['p50_ms']:>9.3f} {r['p95_ms']:>9.3f} {r['peak_kb']:>9.1f} {base:>13}")
+
+    if args.save_baseline:
+        baseline_all[args.dataset] = results
+        BASELINE.write_text(json.dumps(baseline_all, indent=2, sort_keys=True) + "\n")
+        print(f"Zapisano baseline dla {args.dataset} w {BASELINE}")
+        return 0
+
+    regressions = compare(results, baseline, tolerance=args.tolerance)
+    for line in regressions:
+        print(f"REGRESJA {line}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
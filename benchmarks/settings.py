@@ -0,0 +1,13 @@
+import os
+import tempfile
+from pathlib import Path
+
+from fomo.settings import *  # noqa: F401,F403
+
+# Benchmarki nigdy nie dotykają OVH – schemat z modeli Django w lokalnym pliku SQLite.
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": os.getenv("FOMO_BENCH_DB", str(Path(tempfile.gettempdir()) / "fomo-bench.sqlite3")),
+    }
+}
@@ -0,0 +1,279 @@
+"""
+Lokalny zamiennik OVH MySQL dla benchmarków.
+
+Schemat powstaje z modeli Django (migrate na SQLite), a serwisy raw-SQL dostają
+pulę połączeń sqlite3 udających pymysql: placeholdery %s, DictCursor, lastrowid.
+Zamiast OVH S3 – FakeS3Client trzymający obiekty w pamięci procesu.
+"""
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+import django
+
+from todo.services.instrumentation import record_query
+
+
+def setup_django() -> None:
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "benchmarks.settings")
+    os.environ.setdefault("S3_ENDPOINT", "http://s3.invalid")
+    os.environ.setdefault("S3_BUCKET", "fomo-bench")
+    django.setup()
+
+
+class Stats:
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.queries = 0
+        self.rows = 0
+        self.bytes = 0
+
+
+stats = Stats()
+
+
+def _adapt_datetime(value: datetime) -> str:
+    # Jak pymysql: strefa czasowa jest pomijana, zawsze z mikrosekundami (stałe porządkowanie stringów).
+    return value.replace(tzinfo=None).strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+def _convert_datetime(raw: bytes) -> datetime:
+    return datetime.fromisoformat(raw.decode())
+
+
+def _count(row: dict) -> dict:
+    stats.rows += 1
+    stats.bytes += sum(len(str(v)) for v in row.values() if v is not None)
+    return row
+
+
+class SQLiteCursor:
+    def __init__(self, db: sqlite3.Connection):
+        self._cur = db.cursor()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cur.close()
+
+    @property
+    def lastrowid(self):
+        return self._cur.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cur.rowcount
+
+    def execute(self, sql: str, params=()):
+        stats.queries += 1
+        started = time.perf_counter()
+        self._cur.execute(sql.replace("%s", "?"), tuple(params or ()))
+        record_query(sql, time.perf_counter() - started, params=params)
+        return self._cur.rowcount
+
+    def executemany(self, sql: str, seq):
+        stats.queries += 1
+        started = time.perf_counter()
+        self._cur.executemany(sql.replace("%s", "?"), [tuple(p) for p in seq])
+        record_query(sql, time.perf_counter() - started)
+        return self._cur.rowcount
+
+    def fetchone(self):
+        row = self._cur.fetchone()
+        return _count(dict(row)) if row is not None else None
+
+    def fetchall(self):
+        return [_count(dict(row)) for row in self._cur.fetchall()]
+
+    def fetchmany(self, size: int = 1):
+        return [_count(dict(row)) for row in self._cur.fetchmany(size)]
+
+    def __iter__(self):
+        for row in self._cur:
+            yield _count(dict(row))
+
+
+class SQLiteConnection:
+    # Serwisy rozpoznają po tym składnię (np. FTS5 zamiast MATCH ... AGAINST).
+    vendor = "sqlite"
+
+    def __init__(self, path: str):
+        self._db = sqlite3.connect(
+            path,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA foreign_keys = ON")
+        self._db.execute("PRAGMA journal_mode = WAL")
+        self.open = True
+
+    def cursor(self, *args):
+        return SQLiteCursor(self._db)
+
+    def begin(self) -> None:
+        # IMMEDIATE: transakcja zaczynająca od SELECT-a nie może w WAL podnieść blokady do zapisu,
+        # gdy ktoś inny właśnie pisze (database is locked bez czekania); MySQL tylko czeka na wiersz.
+        self._db.execute("BEGIN IMMEDIATE")
+
+    def commit(self) -> None:
+        if self._db.in_transaction:
+            self._db.execute("COMMIT")
+
+    def rollback(self) -> None:
+        if self._db.in_transaction:
+            self._db.execute("ROLLBACK")
+
+    def get_autocommit(self) -> bool:
+        return not self._db.in_transaction
+
+    def ping(self, reconnect: bool = False) -> None:
+        self._db.execute("SELECT 1")
+
+    def close(self) -> None:
+        self.open = False
+        self._db.close()
+
+
+def install(*, pool_size: int = 4, fresh: bool = True):
+    """
+    Tworzy świeży plik SQLite ze schematem aplikacji i podpina go jako globalną pulę MySQL.
+    fresh=False zostawia istniejący plik (np. zasiany wcześniej duży zbiór), jeśli jest.
+    Zwraca ścieżkę do bazy.
+    """
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db import connections
+
+    from todo.services.mysql_pool import ConnectionPool, install_pool
+
+    path = str(settings.DATABASES["default"]["NAME"])
+    connections.close_all()
+    if fresh or not os.path.exists(path):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        call_command("migrate", run_syncdb=True, verbosity=0, interactive=False)
+        connections.close_all()
+
+    # Rejestrujemy po migrate – backend Django nadpisuje globalne adaptery sqlite3.
+    sqlite3.register_adapter(datetime, _adapt_datetime)
+    sqlite3.register_converter("datetime", _convert_datetime)
+
+    install_pool(ConnectionPool(lambda: SQLiteConnection(path), max_size=pool_size, ping_after=3600))
+    return path
+
+
+def seed(*, users: int = 1, tasks_per_user: int = 1000, attachments_per_task: int = 0, description_size: int = 200) -> list[int]:
+    """
+    Wypełnia bazę danymi testowymi (executemany w jednej transakcji).
+    Zwraca id użytkowników.
+    """
+    from todo.models import User
+    from todo.services.mysql_pool import connection
+
+    # Użytkowników zakładamy przez ORM – kolumny tabeli users zna tylko model.
+    user_ids = [User.objects.create(mail=f"bench{u}@fomo.local", password="!").id for u in range(users)]
+
+    groups = ["Ważne", "Sprzątanie", "Praca", "Znajomi", "Rodzina"]
+    statuses = ["todo", "in_progress", "done"]
+    start = datetime(2025, 1, 1)
+    description = ("Opis zadania " * (description_size // 13 + 1))[:description_size]
+
+    with connection() as conn:
+        conn.begin()
+        with conn.cursor() as cur:
+            for user_id in user_ids:
+                cur.executemany(
+                    """
+                    INSERT INTO tasks (user_id, `group`, title, description, status, created_at, updated_at)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                    """,
+                    (
+                        (user_id, groups[i % len(groups)], f"Zadanie {i}", description, statuses[i % 3], *[start + timedelta(seconds=i)] * 2)
+                        for i in range(tasks_per_user)
+                    ),
+                )
+
+            if attachments_per_task:
+                cur.execute("SELECT id FROM tasks")
+                task_ids = [r["id"] for r in cur.fetchall()]
+                cur.executemany(
+                    """
+                    INSERT INTO attachments (task_id, filename, object_key, file_url, status, created_at)
+                    VALUES (%s, %s, %s, %s, 'ready', %s)
+                    """,
+                    (
+                        (
+                            task_id,
+                            f"plik_{n}.pdf",
+                            f"uploads/task_{task_id}/plik_{n}.pdf",
+                            f"https://fomo-bench.s3.invalid/uploads/task_{task_id}/plik_{n}.pdf",
+                            start + timedelta(seconds=n),
+                        )
+                        for task_id in task_ids
+                        for n in range(attachments_per_task)
+                    ),
+                )
+        conn.commit()
+
+    stats.reset()
+    return user_ids
+
+
+class FakeS3Client:
+    """
+    Klient S3 w pamięci z podzbiorem API boto3 używanym przez todo.services.oss.
+    Obiekty: {key: bytes}. Nie liczy multipartów ani ACL – tylko zapis/odczyt treści.
+    """
+
+    def __init__(self):
+        self.objects = {}
+        self._lock = threading.Lock()
+
+    def upload_fileobj(self, fileobj, bucket, key, ExtraArgs=None, Config=None):
+        data = fileobj.read()
+        with self._lock:
+            self.objects[key] = data
+
+    def upload_file(self, filename, bucket, key, ExtraArgs=None, Config=None):
+        with open(filename, "rb") as f:
+            self.upload_fileobj(f, bucket, key)
+
+    def put_object(self, Bucket, Key, Body=b"", **kwargs):
+        with self._lock:
+            self.objects[Key] = Body if isinstance(Body, bytes) else Body.read()
+        return {}
+
+    def head_object(self, Bucket, Key):
+        from botocore.exceptions import ClientError
+
+        with self._lock:
+            if Key not in self.objects:
+                raise ClientError({"Error": {"Code": "404"}}, "HeadObject")
+            return {"ContentLength": len(self.objects[Key])}
+
+    def delete_object(self, Bucket, Key):
+        with self._lock:
+            self.objects.pop(Key, None)
+        return {}
+
+    def generate_presigned_post(self, Bucket, Key, Fields=None, Conditions=None, ExpiresIn=600):
+        return {"url": f"https://{Bucket}.s3.invalid/", "fields": {"key": Key, **(Fields or {})}}
+
+
+def install_fake_s3() -> FakeS3Client:
+    """
+    Podmienia wspólnego klienta z oss.get_client() na FakeS3Client i go zwraca.
+    """
+    from todo.services import oss
+
+    client = FakeS3Client()
+    oss._s3_client = client
+    return client
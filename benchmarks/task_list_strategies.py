@@ -0,0 +1,61 @@
+"""
+Porównanie strategii pobierania listy tasków: LEFT JOIN vs taski + IN (...) na załączniki.
+
+    python -m benchmarks.task_list_strategies --tasks 5000 --attachments 5
+"""
+import argparse
+import statistics
+import time
+
+from benchmarks import standin
+
+
+def walk_all_pages(*, user_id: int, page_size: int, strategy: str) -> list[float]:
+    from todo.services.task_read_sql_service import list_tasks_page
+
+    timings = []
+    cursor = None
+    while True:
+        started = time.perf_counter()
+        page = list_tasks_page(user_id=user_id, after=cursor, page_size=page_size, strategy=strategy)
+        timings.append(time.perf_counter() - started)
+        cursor = page["next_cursor"]
+        if not cursor:
+            return timings
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tasks", type=int, default=5000)
+    parser.add_argument("--attachments", type=int, default=5, help="załączników na task")
+    parser.add_argument("--description-size", type=int, default=500)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    standin.setup_django()
+    standin.install()
+    (user_id,) = standin.seed(
+        tasks_per_user=args.tasks,
+        attachments_per_task=args.attachments,
+        description_size=args.description_size,
+    )
+
+    print(f"{args.tasks} tasków x {args.attachments} załączników, strona {args.page_size}")
+    print(f"{'strategia':<10} {'p50 ms':>9} {'p95 ms':>9} {'zapytań':>9} {'wierszy':>10} {'bajtów':>12}")
+    for strategy in ("join", "batched"):
+        timings = []
+        standin.stats.reset()
+        for _ in range(args.repeat):
+            timings += walk_all_pages(user_id=user_id, page_size=args.page_size, strategy=strategy)
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        print(
+            f"{strategy:<10} {statistics.median(timings) * 1000:>9.2f} {p95 * 1000:>9.2f} "
+            f"{standin.stats.queries // args.repeat:>9} {standin.stats.rows // args.repeat:>10} "
+            f"{standin.stats.bytes // args.repeat:>12}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -28,21 +28,32 @@ LOGIN_REDIRECT_URL = "task_list"
 LOGOUT_REDIRECT_URL = "login"
 
 SESSION_COOKIE_HTTPONLY = True
+
+# Sesje i zalogowany użytkownik z cache (todo/auth_backends.py) – typowy request nie pyta bazy
+# ani o sesję, ani o użytkownika. cached_db zapisuje też do bazy, więc sesja przeżywa restart cache;
+# "django.contrib.sessions.backends.signed_cookies" nie potrzebuje bazy wcale, ale nie da się go
+# unieważnić po stronie serwera.
+SESSION_ENGINE = os.getenv("SESSION_ENGINE", "django.contrib.sessions.backends.cached_db")
+AUTHENTICATION_BACKENDS = ["todo.auth_backends.CachedUserBackend"]
+AUTH_USER_CACHE_ALIAS = os.getenv("AUTH_USER_CACHE_ALIAS", "default")
+AUTH_USER_CACHE_TIMEOUT = int(os.getenv("AUTH_USER_CACHE_TIMEOUT", "60"))
 CSRF_COOKIE_HTTPONLY = False
 
 MIDDLEWARE = [
+    "todo.middleware.RequestInstrumentationMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "todo.middleware.ReplicaPinningMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "todo.services.instrumentation.InstrumentedDjangoTemplates",
         "DIRS": [],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -65,6 +76,152 @@ OVH_MYSQL_USER = os.getenv("OVH_MYSQL_USER")
 OVH_MYSQL_PASSWORD = os.getenv("OVH_MYSQL_PASSWORD")
 OVH_MYSQL_DB = os.getenv("OVH_MYSQL_DB")
 
+# Pula połączeń dla serwisów raw-SQL (todo/services/mysql_pool.py)
+OVH_MYSQL_POOL_SIZE = int(os.getenv("OVH_MYSQL_POOL_SIZE", "10"))
+OVH_MYSQL_POOL_MAX_LIFETIME = int(os.getenv("OVH_MYSQL_POOL_MAX_LIFETIME", "1800"))
+OVH_MYSQL_POOL_MAX_IDLE = int(os.getenv("OVH_MYSQL_POOL_MAX_IDLE", "300"))
+OVH_MYSQL_POOL_PING_AFTER = int(os.getenv("OVH_MYSQL_POOL_PING_AFTER", "5"))
+OVH_MYSQL_POOL_TIMEOUT = int(os.getenv("OVH_MYSQL_POOL_TIMEOUT", "10"))
+
+# Repliki do odczytu (todo/services/replicas.py, todo/db_router.py): hosty po przecinku,
+# użytkownik/hasło/baza jak primary. Po własnym zapisie użytkownik czyta z primary
+# przez READ_REPLICA_STICKY_SECONDS (opóźnienie replikacji).
+OVH_MYSQL_REPLICA_HOSTS = [h.strip() for h in os.getenv("OVH_MYSQL_REPLICA_HOSTS", "").split(",") if h.strip()]
+OVH_MYSQL_REPLICA_PORT = os.getenv("OVH_MYSQL_REPLICA_PORT", OVH_MYSQL_PORT)
+READ_REPLICA_STICKY_SECONDS = int(os.getenv("READ_REPLICA_STICKY_SECONDS", "5"))
+# Replika, do której nie udało się połączyć, jest pomijana przez tyle sekund (odczyty idą na pozostałe).
+READ_REPLICA_RETRY_SECONDS = int(os.getenv("READ_REPLICA_RETRY_SECONDS", "30"))
+
+# Asynchroniczne widoki tasków (todo/async_views.py) – domyślnie włączone przez fomo/asgi.py.
+# Blokujące wywołania SQL/S3 idą do puli ASYNC_VIEW_WORKERS wątków (nie więcej niż połączeń w puli).
+ASYNC_VIEWS = os.getenv("ASYNC_VIEWS", "0") == "1"
+ASYNC_VIEW_WORKERS = int(os.getenv("ASYNC_VIEW_WORKERS", str(OVH_MYSQL_POOL_SIZE)))
+
+# Sposób pobierania listy tasków: "batched" (taski + jedno IN na załączniki) albo "join"
+TASK_LIST_FETCH_STRATEGY = os.getenv("TASK_LIST_FETCH_STRATEGY", "batched")
+
+# Wyszukiwanie pełnotekstowe na liście tasków: najwyżej tyle najlepiej dopasowanych wyników
+# (kolejne strony to przesunięcie w tym rankingu, więc głęboki OFFSET nie rośnie bez końca).
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", "1000"))
+
+# Synchronizacja przyrostowa (GET /tasks/changes/, todo/services/task_sync_service.py):
+# zmiany z ostatnich TASK_SYNC_SETTLE_SECONDS czekają na kolejne odpytanie (transakcje w locie),
+# ślady usunięć żyją TASK_SYNC_TOMBSTONE_DAYS – starszy kursor dostaje reset.
+TASK_SYNC_PAGE_SIZE = int(os.getenv("TASK_SYNC_PAGE_SIZE", "200"))
+TASK_SYNC_SETTLE_SECONDS = int(os.getenv("TASK_SYNC_SETTLE_SECONDS", "2"))
+TASK_SYNC_TOMBSTONE_DAYS = int(os.getenv("TASK_SYNC_TOMBSTONE_DAYS", "30"))
+
+# Eksport (GET /tasks/export/) i import (manage.py import_tasks) tasków – todo/services/task_transfer.py:
+# ile tasków na zapytanie eksportu i na jeden INSERT/transakcję importu.
+TASK_EXPORT_BATCH_SIZE = int(os.getenv("TASK_EXPORT_BATCH_SIZE", "500"))
+TASK_IMPORT_BATCH_SIZE = int(os.getenv("TASK_IMPORT_BATCH_SIZE", "500"))
+
+# Zmiany tasków na żywo (GET /tasks/events/, tylko pod ASGI; todo/services/task_events.py):
+# kolejka zdarzeń na strumień, heartbeat i maksymalny czas strumienia (potem przeglądarka łączy się ponownie).
+TASK_EVENTS_QUEUE_SIZE = int(os.getenv("TASK_EVENTS_QUEUE_SIZE", "100"))
+TASK_EVENTS_HEARTBEAT_SECONDS = int(os.getenv("TASK_EVENTS_HEARTBEAT_SECONDS", "15"))
+TASK_EVENTS_MAX_SECONDS = int(os.getenv("TASK_EVENTS_MAX_SECONDS", "300"))
+
+# Cache Django (domyślnie lokalna pamięć procesu). Przy kilku workerach gunicorna
+# unieważnienia z jednego procesu nie docierają do innych – wtedy ustaw wspólny backend,
+# np. DJANGO_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache.
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("DJANGO_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("DJANGO_CACHE_LOCATION", "fomo"),
+    }
+}
+
+# Cache listy tasków (todo/services/task_cache.py)
+TASK_LIST_CACHE_ALIAS = os.getenv("TASK_LIST_CACHE_ALIAS", "default")
+TASK_LIST_CACHE_TIMEOUT = int(os.getenv("TASK_LIST_CACHE_TIMEOUT", "60"))
+
+# Limit rozmiaru załącznika
+ATTACHMENT_MAX_SIZE = 100 * 1024 * 1024
+
+# Wysyłka załączników z przeglądarki prosto do bucketu (presigned POST).
+# Wymaga reguły CORS w buckecie zezwalającej na POST z domeny aplikacji.
+ATTACHMENT_DIRECT_UPLOAD = os.getenv("ATTACHMENT_DIRECT_UPLOAD", "0") == "1"
+ATTACHMENT_DIRECT_UPLOAD_EXPIRES = int(os.getenv("ATTACHMENT_DIRECT_UPLOAD_EXPIRES", "600"))
+
+# Wysyłka załączników do S3 w tle (todo/services/attachment_uploads.py)
+ATTACHMENT_UPLOAD_WORKERS = int(os.getenv("ATTACHMENT_UPLOAD_WORKERS", "4"))
+ATTACHMENT_SPOOL_DIR = os.getenv("ATTACHMENT_SPOOL_DIR") or None
+# manage.py recover_uploads (po restarcie workera): wysyła ponownie wiszące dłużej niż
+# ATTACHMENT_RETRY_AFTER_MINUTES, a bez pliku w spoolu po ATTACHMENT_FAIL_AFTER_HOURS oznacza failed.
+ATTACHMENT_RETRY_AFTER_MINUTES = int(os.getenv("ATTACHMENT_RETRY_AFTER_MINUTES", "15"))
+ATTACHMENT_FAIL_AFTER_HOURS = int(os.getenv("ATTACHMENT_FAIL_AFTER_HOURS", "24"))
+
+# Odbiór uploadów (todo/upload_handlers.py): limit ATTACHMENT_MAX_SIZE sprawdzany w trakcie
+# odbioru, sha256 liczone w locie. ATTACHMENT_STREAM_TO_S3=1 – plik idzie kawałkami prosto
+# do multipart uploadu S3, bez pliku tymczasowego (request trwa wtedy do końca wysyłki).
+# Bucket powinien mieć regułę lifecycle AbortIncompleteMultipartUpload na zerwane wysyłki.
+FILE_UPLOAD_HANDLERS = ["todo.upload_handlers.AttachmentUploadHandler"]
+ATTACHMENT_STREAM_TO_S3 = os.getenv("ATTACHMENT_STREAM_TO_S3", "0") == "1"
+
+# Duże uploady Django zapisuje w tym samym katalogu co spool – przejęcie pliku
+# to wtedy rename, a nie druga kopia na dysku.
+FILE_UPLOAD_TEMP_DIR = ATTACHMENT_SPOOL_DIR
+
+# Multipart upload do S3 (boto3 TransferConfig)
+S3_MULTIPART_THRESHOLD = int(os.getenv("S3_MULTIPART_THRESHOLD", str(8 * 1024 * 1024)))
+S3_MULTIPART_CHUNKSIZE = int(os.getenv("S3_MULTIPART_CHUNKSIZE", str(16 * 1024 * 1024)))
+S3_MAX_CONCURRENCY = int(os.getenv("S3_MAX_CONCURRENCY", "8"))
+# Pula połączeń HTTP wspólnego klienta S3 – co najmniej workery uploadu x współbieżność.
+S3_MAX_POOL_CONNECTIONS = int(
+    os.getenv("S3_MAX_POOL_CONNECTIONS", str(max(10, ATTACHMENT_UPLOAD_WORKERS * S3_MAX_CONCURRENCY)))
+)
+
+# Sprzątanie obiektów S3 bez załącznika (manage.py collect_orphan_objects): młodsze niż
+# ORPHAN_GRACE_HOURS mogą jeszcze czekać na INSERT (wysyłka w trakcie, bezpośredni upload
+# przed potwierdzeniem). ORPHAN_CHECKPOINT – plik z ostatnim sprawdzonym kluczem (wznawianie).
+ORPHAN_GRACE_HOURS = int(os.getenv("ORPHAN_GRACE_HOURS", "24"))
+ORPHAN_CHECKPOINT = os.getenv("ORPHAN_CHECKPOINT") or None
+
+# Poczta (OVH SMTP, STARTTLS) – przypomnienia o zadaniach
+EMAIL_BACKEND = os.getenv("EMAIL_BACKEND", "django.core.mail.backends.smtp.EmailBackend")
+EMAIL_HOST = os.getenv("EMAIL_HOST", "smtp.mail.ovh.net")
+EMAIL_PORT = int(os.getenv("EMAIL_PORT", "587"))
+EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER", "")
+EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD", "")
+EMAIL_USE_TLS = True
+EMAIL_TIMEOUT = 20
+DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", EMAIL_HOST_USER or "no-reply@fomo-projekt.tech")
+
+# Worker przypomnień (manage.py send_reminders)
+REMINDER_BATCH_SIZE = int(os.getenv("REMINDER_BATCH_SIZE", "100"))
+REMINDER_POLL_INTERVAL = float(os.getenv("REMINDER_POLL_INTERVAL", "15"))
+# Po tylu sekundach rezerwacja workera wygasa (np. po awarii) i inny może przejąć przypomnienie.
+REMINDER_CLAIM_TTL = int(os.getenv("REMINDER_CLAIM_TTL", "300"))
+# Tyle razy rezerwujemy jedno przypomnienie; stale odrzucany adres nie wraca co REMINDER_CLAIM_TTL.
+REMINDER_MAX_ATTEMPTS = int(os.getenv("REMINDER_MAX_ATTEMPTS", "5"))
+
+# Relay outboxa (manage.py relay_outbox, todo/services/outbox.py) – np. konta OVH po rejestracji.
+# Nieudana wiadomość wraca po 2, 4, 8... s, najwyżej co OUTBOX_RETRY_MAX_SECONDS; po
+# OUTBOX_MAX_ATTEMPTS próbach zostaje w tabeli jako porzucona (dead_at).
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "1"))
+OUTBOX_CLAIM_TTL = int(os.getenv("OUTBOX_CLAIM_TTL", "300"))
+OUTBOX_RETRY_MAX_SECONDS = int(os.getenv("OUTBOX_RETRY_MAX_SECONDS", "3600"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "15"))
+
+# Pomiary per request (todo/middleware.py): log JSON z liczbą/czasem zapytań, S3 i szablonów.
+# Server-Timing pokazuje te czasy w DevTools przeglądarki – domyślnie tylko przy DEBUG.
+INSTRUMENTATION_ENABLED = os.getenv("INSTRUMENTATION_ENABLED", "1") == "1"
+INSTRUMENTATION_SERVER_TIMING = os.getenv("INSTRUMENTATION_SERVER_TIMING", "1" if DEBUG else "0") == "1"
+# Tyle zapytań o tym samym kształcie w jednym requeście = podejrzenie N+1.
+INSTRUMENTATION_N_PLUS_ONE_THRESHOLD = int(os.getenv("INSTRUMENTATION_N_PLUS_ONE_THRESHOLD", "5"))
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {"todo": {"handlers": ["console"], "level": os.getenv("LOG_LEVEL", "INFO")}},
+}
+
+# Token dla scrapera metryk (/metrics/); bez tokena metryki widzi tylko staff.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
 if OVH_MYSQL_HOST and OVH_MYSQL_USER and OVH_MYSQL_PASSWORD and OVH_MYSQL_DB:
     DATABASES = {
         "default": {
@@ -77,6 +234,13 @@ if OVH_MYSQL_HOST and OVH_MYSQL_USER and OVH_MYSQL_PASSWORD and OVH_MYSQL_DB:
             "OPTIONS": {"charset": "utf8mb4"},
         }
     }
+    for i, host in enumerate(OVH_MYSQL_REPLICA_HOSTS):
+        DATABASES[f"replica_{i}"] = {
+            **DATABASES["default"],
+            "HOST": host,
+            "PORT": OVH_MYSQL_REPLICA_PORT,
+            "TEST": {"MIRROR": "default"},
+        }
 else:
     DATABASES = {
         "default": {
@@ -91,4 +255,5 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 # (opcjonalnie, ale polecam w dev)
 STATICFILES_DIRS = []
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+DATABASE_ROUTERS = ["todo.db_router.ReplicaRouter"]
 
@@ -1,24 +1,87 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+from django.utils.functional import cached_property
+
+from todo import search_index
 from .models import Task, TaskGroup, Attachment
 
 
+class EstimatedCountPaginator(Paginator):
+    """
+    Liczba wierszy bez pełnego COUNT(*) na dużych tabelach: cała tabela – statystyka MySQL
+    (information_schema, przybliżona), lista zawężona filtrem – COUNT(*) najwyżej do count_limit.
+    """
+
+    count_limit = 10_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == "mysql" and not queryset.query.where:
+            with connection.cursor() as cur:
+                cur.execute(
+                    "SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+                    [queryset.model._meta.db_table],
+                )
+                row = cur.fetchone()
+            if row and row[0]:
+                return int(row[0])
+        return queryset[: self.count_limit].count()
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Changelist dla tabel z milionami wierszy: sortowanie tylko po kluczu głównym,
+    liczniki z EstimatedCountPaginator, klucze obce jako pole id zamiast <select> z całą tabelą.
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    ordering = ("-id",)
+    sortable_by = ("id",)
+
+
 @admin.register(TaskGroup)
 class TaskGroupAdmin(admin.ModelAdmin):
     list_display = ("id", "user", "name", "color", "order", "created_at")
-    search_fields = ("name", "user__mail")
+    list_select_related = ("user",)
+    raw_id_fields = ("user",)
+    search_fields = ("=user__mail",)
+    search_help_text = "Dokładny adres e-mail użytkownika."
     ordering = ("order", "id")
 
 
 @admin.register(Task)
-class TaskAdmin(admin.ModelAdmin):
+class TaskAdmin(LargeTableAdmin):
     list_display = ("id", "user", "title", "group", "status", "remind_at", "created_at")
     list_filter = ("status", "group", "created_at")
-    search_fields = ("title", "description", "user__mail")
-    ordering = ("-created_at",)
+    list_select_related = ("user",)
+    raw_id_fields = ("user",)
+    search_fields = ("=id", "=user__mail")
+    search_help_text = "Id taska, dokładny e-mail użytkownika albo słowa z tytułu/opisu (indeks pełnotekstowy)."
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term or term.isdigit() or "@" in term:
+            return super().get_search_results(request, queryset, term)
+
+        # Słowa szukamy w indeksie pełnotekstowym (search_index) zamiast LIKE '%...%' po całej tabeli.
+        terms = search_index.search_terms(term)
+        if not terms:
+            return queryset.none(), False
+        condition, params = search_index.match_condition(connections[queryset.db].vendor, terms)
+        matched = queryset.annotate(search_match=RawSQL(condition, params, output_field=FloatField()))
+        return matched.filter(search_match__gt=0), False
 
 
 @admin.register(Attachment)
-class AttachmentAdmin(admin.ModelAdmin):
-    list_display = ("id", "task", "filename", "object_key", "created_at")
-    search_fields = ("filename", "object_key", "task__title")
-    ordering = ("-created_at",)
+class AttachmentAdmin(LargeTableAdmin):
+    list_display = ("id", "task", "filename", "object_key", "status", "created_at")
+    list_select_related = ("task",)
+    raw_id_fields = ("task",)
+    search_fields = ("=id", "=task__id")
+    search_help_text = "Id załącznika albo id taska."
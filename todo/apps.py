@@ -1,6 +1,57 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_migrate, post_save
+
+
+def _ensure_search_index(using, **kwargs):
+    from django.db import connections
+
+    from todo import search_index
+
+    search_index.ensure_sqlite_triggers(connections[using])
+
+
+def _instrument_orm(connection, **kwargs):
+    # Na stałe na każdym połączeniu ORM (także w wątkach sync_to_async);
+    # poza requestem wrapper tylko przepuszcza zapytanie.
+    from todo.services.instrumentation import orm_execute_wrapper
+
+    if orm_execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(orm_execute_wrapper)
+
+
+def _record_tombstone(sender, instance, using, **kwargs):
+    # Usunięcia przez ORM (admin, kaskada z użytkownika) – raw SQL zapisuje ślady sam.
+    from todo.models import TaskTombstone
+
+    TaskTombstone.objects.using(using).create(user_id=instance.user_id, task_id=instance.pk)
+
+
+def _release_stored_object(sender, instance, using, **kwargs):
+    # Usunięcia załączników przez ORM; raw SQL odejmuje referencje sam (attachment_store.release_tasks).
+    # Obiekt bez referencji kasuje z S3 najbliższe usunięcie przez serwis.
+    from django.db.models import F
+
+    from todo.models import StoredObject
+
+    if instance.content_hash:
+        StoredObject.objects.using(using).filter(
+            content_hash=instance.content_hash, object_key=instance.object_key
+        ).update(ref_count=F("ref_count") - 1)
 
 
 class TodoConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'todo'
+
+    def ready(self):
+        post_migrate.connect(_ensure_search_index, sender=self)
+        connection_created.connect(_instrument_orm)
+        post_delete.connect(_record_tombstone, sender="todo.Task")
+        post_delete.connect(_release_stored_object, sender="todo.Attachment")
+
+        from todo.auth_backends import invalidate_cached_user
+
+        post_save.connect(invalidate_cached_user, sender=settings.AUTH_USER_MODEL)
+        post_delete.connect(invalidate_cached_user, sender=settings.AUTH_USER_MODEL)
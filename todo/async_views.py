@@ -0,0 +1,193 @@
+"""
+Asynchroniczne wersje widoków tasków dla wejścia ASGI (fomo/asgi.py).
+
+pymysql i boto3 są blokujące, więc każde wywołanie serwisu idzie do osobnej,
+ograniczonej puli wątków (ASYNC_VIEW_WORKERS, domyślnie rozmiar puli MySQL).
+Pętla zdarzeń obsługuje w tym czasie kolejne requesty, a liczba równoległych
+operacji na bazie/S3 nie przekracza liczby połączeń – nadmiar czeka w kolejce
+executora, zamiast blokować wątki na PoolTimeout.
+"""
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse, StreamingHttpResponse
+from django.shortcuts import redirect, render
+from django.urls import reverse
+from django.views.decorators.http import require_GET, require_POST
+
+from todo.services import direct_uploads, task_events, task_transfer
+from todo.services.task_sql_service import create_task_sql, delete_task_sql, update_task_sql
+from todo.upload_handlers import upload_too_large
+from todo.views import (
+    _bulk_request,
+    _direct_upload_request,
+    _export_format,
+    _export_response,
+    _load_task_page,
+    _page_params,
+    _run_bulk,
+    _task_changes_response,
+    _task_fields,
+    _task_list_context,
+)
+
+_lock = threading.Lock()
+_executor = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "ASYNC_VIEW_WORKERS", 10),
+                thread_name_prefix="async-view-io",
+            )
+        return _executor
+
+
+async def run_blocking(fn, /, *args, **kwargs):
+    """
+    Wykonuje blokującą funkcję (SQL przez pulę, S3) w puli wątków widoków.
+    Kontekst (contextvars) requestu jest przenoszony do wątku.
+    Funkcja nie może używać ORM – wątki executora nie zamykają połączeń Django.
+    """
+    loop = asyncio.get_running_loop()
+    call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+    return await loop.run_in_executor(_get_executor(), call)
+
+
+async def _user(request):
+    # Użytkownik raz, asynchronicznie; podmiana request.user oszczędza drugie
+    # zapytanie, gdy szablon (context processor auth) sięgnie po niego ponownie.
+    user = await request.auser()
+    request.user = user
+    return user
+
+
+@login_required
+async def task_list(request):
+    user = await _user(request)
+    params = _page_params(request)
+    page = await run_blocking(_load_task_page, user_id=user.id, params=params)
+    return await sync_to_async(render)(request, "todo/task_list.html", _task_list_context(page=page, params=params))
+
+
+@require_GET
+@login_required
+async def task_changes(request):
+    user = await _user(request)
+    return await run_blocking(_task_changes_response, user_id=user.id, params=request.GET)
+
+
+async def _event_stream(user_id: int):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + getattr(settings, "TASK_EVENTS_MAX_SECONDS", 300)
+    heartbeat = getattr(settings, "TASK_EVENTS_HEARTBEAT_SECONDS", 15)
+    with task_events.subscribe(user_id) as sub:
+        # Czas ponownego połączenia (ms) dla EventSource; po każdym połączeniu klient dociąga /tasks/changes/.
+        yield "retry: 3000\n\n"
+        while (remaining := deadline - loop.time()) > 0:
+            event = await sub.get(min(heartbeat, remaining))
+            # Komentarz co heartbeat podtrzymuje połączenie przez proxy i wykrywa zerwane.
+            yield task_events.format_sse(event) if event else ": ping\n\n"
+
+
+@require_GET
+@login_required
+async def task_events_stream(request):
+    # Strumień kończy się po TASK_EVENTS_MAX_SECONDS – przeglądarka łączy się ponownie (np. z nowym workerem po deployu).
+    user = await _user(request)
+    response = StreamingHttpResponse(_event_stream(user.id), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+async def _export_stream(user_id: int, fmt: str):
+    # Iterator synchroniczny Django pod ASGI buforuje w całości – tu każda paczka idzie do executora osobno.
+    after, header = None, True
+    while True:
+        tasks, after = await run_blocking(task_transfer.fetch_batch, user_id=user_id, after=after)
+        yield task_transfer.render(fmt, tasks, header=header)
+        header = False
+        if after is None:
+            return
+
+
+@require_GET
+@login_required
+async def export_tasks(request):
+    user = await _user(request)
+    fmt = _export_format(request)
+    if fmt is None:
+        return JsonResponse({"error": "Nieznany format eksportu."}, status=400)
+    return _export_response(_export_stream(user.id, fmt), fmt)
+
+
+@require_POST
+@login_required
+async def update_task(request, task_id: int):
+    user = await _user(request)
+    await run_blocking(update_task_sql, user_id=user.id, task_id=task_id, **_task_fields(request))
+    return redirect("task_list")
+
+
+@require_POST
+@login_required
+async def create_task(request):
+    user = await _user(request)
+    fields = _task_fields(request)
+    upload = request.FILES.get("file")
+
+    if upload_too_large(request) or (upload and upload.size > settings.ATTACHMENT_MAX_SIZE):
+        messages.error(request, "Plik jest za duży. Maksymalny rozmiar to 100 MB.")
+        return redirect("task_list")
+
+    if fields["status"] not in ("todo", "in_progress", "done"):
+        fields["status"] = "todo"
+
+    direct = _direct_upload_request(request)
+    if direct:
+        if direct["size"] > settings.ATTACHMENT_MAX_SIZE:
+            return JsonResponse({"error": "Plik jest za duży. Maksymalny rozmiar to 100 MB."}, status=400)
+
+        task_id = await run_blocking(create_task_sql, user_id=user.id, **fields)
+        direct_upload = await run_blocking(
+            direct_uploads.start,
+            user_id=user.id,
+            task_id=task_id,
+            filename=direct["filename"],
+            content_type=direct["content_type"],
+        )
+        direct_upload["confirm_url"] = reverse("confirm_attachment", args=[task_id])
+        return JsonResponse({"task_id": task_id, "upload": direct_upload})
+
+    # Spool pliku i INSERT w wątku; sama wysyłka do S3 i tak leci w tle po commicie.
+    await run_blocking(create_task_sql, user_id=user.id, upload=upload, **fields)
+    return redirect("task_list")
+
+
+@require_POST
+@login_required
+async def delete_task(request, task_id: int):
+    user = await _user(request)
+    await run_blocking(delete_task_sql, user_id=user.id, task_id=task_id)
+    return redirect("task_list")
+
+
+@require_POST
+@login_required
+async def bulk_tasks(request):
+    user = await _user(request)
+    bulk = _bulk_request(request)
+    if bulk:
+        await run_blocking(_run_bulk, user_id=user.id, **bulk)
+    return redirect("task_list")
@@ -0,0 +1,78 @@
+import threading
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+
+from todo.services import metrics
+
+_lock = threading.Lock()
+_counters = {"hits": 0, "misses": 0, "invalidations": 0}
+
+
+def _count(name: str) -> None:
+    with _lock:
+        _counters[name] += 1
+
+
+def _cache():
+    return caches[getattr(settings, "AUTH_USER_CACHE_ALIAS", "default")]
+
+
+def _key(user_id) -> str:
+    return f"authuser:{user_id}"
+
+
+def _timeout() -> int:
+    return getattr(settings, "AUTH_USER_CACHE_TIMEOUT", 60)
+
+
+class CachedUserBackend(ModelBackend):
+    """
+    ModelBackend, który zalogowanego użytkownika (request.user) bierze z cache zamiast z bazy.
+
+    Zapis albo usunięcie użytkownika (zmiana hasła, is_active) kasuje wpis – sygnały w apps.py.
+    Przy lokalnym cache (locmem) inne procesy widzą zmianę dopiero po AUTH_USER_CACHE_TIMEOUT;
+    natychmiastowe unieważnienie wszędzie wymaga współdzielonego backendu cache.
+    """
+
+    def get_user(self, user_id):
+        cache = _cache()
+        user = cache.get(_key(user_id))
+        if user is not None:
+            _count("hits")
+            return user
+
+        _count("misses")
+        user = super().get_user(user_id)
+        if user is not None:
+            cache.set(_key(user_id), user, timeout=_timeout())
+        return user
+
+    async def aget_user(self, user_id):
+        cache = _cache()
+        user = await cache.aget(_key(user_id))
+        if user is not None:
+            _count("hits")
+            return user
+
+        _count("misses")
+        user = await super().aget_user(user_id)
+        if user is not None:
+            await cache.aset(_key(user_id), user, timeout=_timeout())
+        return user
+
+
+def invalidate_cached_user(sender, instance, **kwargs):
+    # post_save/post_delete modelu użytkownika. QuerySet.update() omija sygnały –
+    # wtedy zmiana dociera po AUTH_USER_CACHE_TIMEOUT.
+    _cache().delete(_key(instance.pk))
+    _count("invalidations")
+
+
+def user_cache_stats() -> dict:
+    with _lock:
+        return dict(_counters)
+
+
+metrics.register("auth_user_cache", user_cache_stats)
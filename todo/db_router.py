@@ -0,0 +1,28 @@
+from django.conf import settings
+
+from todo.services import replicas
+
+
+class ReplicaRouter:
+    """
+    Router ORM: odczyty na repliki (replica_N w DATABASES), zapisy i migracje na default.
+
+    Sesje i użytkownicy zawsze z primary – logowanie zapisuje je i czyta w następnym requeście,
+    zanim wiadomo, czyj to request. Pozostałe odczyty wracają na primary, gdy request jest
+    przypięty (ReplicaPinningMiddleware: zapis albo świeży zapis użytkownika).
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == "sessions" or model._meta.label == settings.AUTH_USER_MODEL:
+            return "default"
+        return replicas.orm_alias()
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Repliki mają te same dane co primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from todo.services import query_plans
+
+
+class Command(BaseCommand):
+    help = (
+        "Puszcza EXPLAIN na zapytaniach serwisów tasków i przypomnień; kończy się błędem przy pełnym skanie "
+        "albo sortowaniu poza indeksem. Tymczasowe dane powstają w transakcji, która zawsze jest cofana. "
+        "Miarodajne na bazie z realistyczną ilością danych (na prawie pustych tabelach MySQL woli pełny skan)."
+    )
+
+    def handle(self, *args, **options):
+        failures = query_plans.check()
+
+        for sql, problems in failures.items():
+            self.stdout.write(f"{', '.join(sorted(problems))}: {sql}")
+        if failures:
+            raise CommandError(f"Zapytania z problemami planu: {len(failures)}")
+        self.stdout.write("Plany zapytań OK")
@@ -0,0 +1,56 @@
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from todo.services.orphan_objects import collect_orphans
+
+
+class Command(BaseCommand):
+    help = (
+        "Kasuje z bucketu obiekty pod uploads/ bez załącznika w bazie (paczkami po 1000 kluczy). "
+        "Z --checkpoint przerwany przebieg rusza od ostatniej sprawdzonej strony."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--grace-hours", type=int, default=settings.ORPHAN_GRACE_HOURS,
+                            help="Młodszych obiektów nie ruszamy (upload jeszcze bez wiersza w bazie).")
+        parser.add_argument("--checkpoint", default=settings.ORPHAN_CHECKPOINT,
+                            help="Plik z ostatnim sprawdzonym kluczem; usuwany po pełnym przebiegu.")
+        parser.add_argument("--start-after", default=None, help="Zacznij za tym kluczem (zamiast checkpointu).")
+        parser.add_argument("--page-size", type=int, default=1000)
+        parser.add_argument("--max-pages", type=int, default=None, help="Zakończ po tylu stronach listingu.")
+        parser.add_argument("--dry-run", action="store_true", help="Tylko policz sieroty.")
+
+    def handle(self, *args, grace_hours, checkpoint, start_after, page_size, max_pages, dry_run, **options):
+        if start_after is None and checkpoint and os.path.exists(checkpoint):
+            with open(checkpoint) as f:
+                start_after = f.read().strip() or None
+        if start_after:
+            self.stdout.write(f"Wznawiam za kluczem {start_after}")
+
+        def save(key):
+            # Zapis przez rename – przerwanie w trakcie nie zostawia uciętego klucza.
+            tmp = f"{checkpoint}.tmp"
+            with open(tmp, "w") as f:
+                f.write(key)
+            os.replace(tmp, checkpoint)
+
+        stats = collect_orphans(
+            grace=timedelta(hours=grace_hours),
+            start_after=start_after,
+            dry_run=dry_run,
+            page_size=page_size,
+            max_pages=max_pages,
+            on_page=save if checkpoint and not dry_run else None,
+        )
+
+        finished = not max_pages or stats["pages"] < max_pages
+        if checkpoint and finished and not dry_run and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        self.stdout.write(
+            f"Strony {stats['pages']}, klucze {stats['scanned']} (pominięte {stats['skipped']}), "
+            f"sieroty {stats['orphans']}, skasowane {stats['deleted']}, błędy {stats['failed']}"
+            + ("" if finished else f"; ostatni klucz {stats['last_key']}")
+        )
@@ -0,0 +1,52 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from todo.models import User
+from todo.services.task_transfer import FORMATS, import_tasks
+
+
+class Command(BaseCommand):
+    help = (
+        "Wczytuje taski z pliku eksportu (CSV albo JSONL, jak z /tasks/export/) na konto użytkownika – "
+        "wieloelementowymi INSERT-ami, paczka na transakcję. Załączniki nie są odtwarzane."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--user", required=True, help="E-mail właściciela importowanych tasków.")
+        parser.add_argument("--format", choices=sorted(FORMATS), default=None,
+                            help="Domyślnie z rozszerzenia pliku.")
+        parser.add_argument("--batch-size", type=int, default=settings.TASK_IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, path, user, format, batch_size, **options):
+        fmt = format or os.path.splitext(path)[1].lstrip(".").lower()
+        if fmt not in FORMATS:
+            raise CommandError(f"Nieznany format pliku {path} – podaj --format ({', '.join(sorted(FORMATS))}).")
+        owner = self._owner(user.strip())
+
+        def progress(stats):
+            self.stdout.write(f"zapisane {stats['imported']}, pominięte {stats['skipped']}")
+
+        # utf-8-sig: plik zapisany w Excelu zaczyna się od BOM.
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            stats = import_tasks(user_id=owner.id, fileobj=f, fmt=fmt, batch_size=batch_size, on_progress=progress)
+
+        for error in stats["errors"]:
+            self.stderr.write(error)
+        self.stdout.write(f"Zaimportowane taski: {stats['imported']}, pominięte wiersze: {stats['skipped']}")
+
+    def _owner(self, mail: str) -> User:
+        # Adresy są zapisane jak przy rejestracji (małe litery tylko w domenie), więc dokładny
+        # adres ma pierwszeństwo, a bez niego szukamy bez względu na wielkość liter.
+        try:
+            return User.objects.get(mail=mail)
+        except User.DoesNotExist:
+            pass
+        try:
+            return User.objects.get(mail__iexact=mail)
+        except User.DoesNotExist:
+            raise CommandError(f"Nie ma użytkownika {mail}")
+        except User.MultipleObjectsReturned:
+            raise CommandError(f"Kilku użytkowników pasuje do {mail} – podaj adres z dokładną wielkością liter.")
@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from todo.services.task_sync_service import prune_tombstones
+
+
+class Command(BaseCommand):
+    help = (
+        "Usuwa ślady usuniętych tasków starsze niż TASK_SYNC_TOMBSTONE_DAYS "
+        "(klienci z tak starym kursorem i tak dostają reset synchronizacji)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=settings.TASK_SYNC_TOMBSTONE_DAYS)
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, days, batch_size, **options):
+        deleted = prune_tombstones(older_than=timezone.now() - timedelta(days=days), batch_size=batch_size)
+        self.stdout.write(f"Usunięte ślady: {deleted}")
@@ -0,0 +1,25 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from todo.services.attachment_uploads import recover_pending
+
+
+class Command(BaseCommand):
+    help = (
+        "Dokańcza wysyłki załączników przerwane restartem workera: pliki ze spoolu tego hosta "
+        "wysyła ponownie, a załączniki bez pliku po --fail-after-hours oznacza jako failed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--retry-after-minutes", type=int, default=settings.ATTACHMENT_RETRY_AFTER_MINUTES,
+                            help="Młodszych wysyłek nie ruszamy (mogą jeszcze trwać).")
+        parser.add_argument("--fail-after-hours", type=int, default=settings.ATTACHMENT_FAIL_AFTER_HOURS)
+
+    def handle(self, *args, retry_after_minutes, fail_after_hours, **options):
+        stats = recover_pending(
+            retry_after=timedelta(minutes=retry_after_minutes),
+            fail_after=timedelta(hours=fail_after_hours),
+        )
+        self.stdout.write(f"Wysłane ponownie {stats['retried']}, oznaczone failed {stats['failed']}")
@@ -0,0 +1,60 @@
+import logging
+import os
+import signal
+import socket
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from todo.services import outbox
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Wykonuje zlecenia z outboxa (np. konta OVH nowych użytkowników). Można uruchomić kilka workerów naraz."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=settings.OUTBOX_BATCH_SIZE)
+        parser.add_argument("--interval", type=float, default=settings.OUTBOX_POLL_INTERVAL,
+                            help="Przerwa (s) między skanami, gdy outbox jest pusty.")
+        parser.add_argument("--once", action="store_true", help="Opróżnij outbox i zakończ.")
+
+    def handle(self, *args, batch_size, interval, once, **options):
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+        self._stop = False
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+
+        self.stdout.write(f"Relay outboxa {worker} (paczka {batch_size}, co {interval} s)")
+        while not self._stop:
+            try:
+                claimed = outbox.run_once(worker=worker, batch_size=batch_size)
+            except Exception:
+                # Np. baza niedostępna przy rezerwacji – relay czeka i próbuje dalej zamiast kończyć proces.
+                logger.exception("Paczka outboxa nie powiodła się")
+                if once:
+                    raise
+                self._sleep(interval)
+                continue
+            if claimed:
+                stats = outbox.outbox_stats()
+                self.stdout.write(
+                    f"obsłużone {stats['delivered']}, do ponowienia {stats['failed']}, porzucone {stats['dead']}"
+                )
+            # Pełna paczka = pewnie jest więcej, skanujemy od razu.
+            if claimed >= batch_size:
+                continue
+            if once:
+                break
+            self._sleep(interval)
+
+    def _request_stop(self, signum, frame):
+        # Bieżąca paczka jest dokańczana; zarezerwowane wiadomości zwolni wygaśnięcie claimu.
+        self._stop = True
+
+    def _sleep(self, seconds: float) -> None:
+        deadline = time.monotonic() + seconds
+        while not self._stop and time.monotonic() < deadline:
+            time.sleep(min(0.5, deadline - time.monotonic()))
@@ -0,0 +1,61 @@
+import logging
+import os
+import signal
+import socket
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from todo.services import reminders
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Wysyła maile z przypomnieniami o zadaniach (remind_at). Można uruchomić kilka workerów naraz."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=settings.REMINDER_BATCH_SIZE)
+        parser.add_argument("--interval", type=float, default=settings.REMINDER_POLL_INTERVAL,
+                            help="Przerwa (s) między skanami, gdy nie ma zaległych przypomnień.")
+        parser.add_argument("--once", action="store_true", help="Opróżnij kolejkę i zakończ.")
+
+    def handle(self, *args, batch_size, interval, once, **options):
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+        self._stop = False
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+
+        self.stdout.write(f"Worker przypomnień {worker} (paczka {batch_size}, co {interval} s)")
+        while not self._stop:
+            try:
+                claimed = reminders.run_once(worker=worker, batch_size=batch_size)
+            except Exception:
+                # Baza albo SMTP niedostępne – worker czeka i próbuje dalej zamiast kończyć proces.
+                logger.exception("Paczka przypomnień nie powiodła się")
+                if once:
+                    raise
+                self._sleep(interval)
+                continue
+            if claimed:
+                stats = reminders.reminder_stats()
+                self.stdout.write(
+                    f"wysłane {stats['sent']}, błędy {stats['failed']}, "
+                    f"{stats['last_messages_per_second']:.1f} maili/s, opóźnienie {stats['last_lag_seconds']:.0f} s"
+                )
+            # Pełna paczka = pewnie jest więcej zaległych, skanujemy od razu.
+            if claimed >= batch_size:
+                continue
+            if once:
+                break
+            self._sleep(interval)
+
+    def _request_stop(self, signum, frame):
+        # Bieżąca paczka jest dokańczana; niewysłane przypomnienia zwolni wygaśnięcie claimu.
+        self._stop = True
+
+    def _sleep(self, seconds: float) -> None:
+        deadline = time.monotonic() + seconds
+        while not self._stop and time.monotonic() < deadline:
+            time.sleep(min(0.5, deadline - time.monotonic()))
@@ -0,0 +1,138 @@
+import json
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from todo.services import instrumentation, replicas
+
+logger = logging.getLogger("todo.requests")
+
+
+class RequestInstrumentationMiddleware:
+    """
+    Zbiera per request: zapytania raw SQL i ORM, wywołania S3, czas renderowania szablonów.
+    Wynik idzie do logu (jedna linia JSON na request), opcjonalnie do nagłówka Server-Timing,
+    a powtarzające się zapytania o tym samym kształcie są logowane jako podejrzenie N+1.
+    Powinien być pierwszy w MIDDLEWARE, żeby objąć sesje i auth.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "INSTRUMENTATION_ENABLED", True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        stats, token = instrumentation.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            instrumentation.stop(token)
+        return self._finish(request, response, stats)
+
+    async def __acall__(self, request):
+        stats, token = instrumentation.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            instrumentation.stop(token)
+        return self._finish(request, response, stats)
+
+    def _finish(self, request, response, stats):
+        total_ms = (time.perf_counter() - stats.started) * 1000
+        repeated = stats.repeated_queries(getattr(settings, "INSTRUMENTATION_N_PLUS_ONE_THRESHOLD", 5))
+
+        if getattr(settings, "INSTRUMENTATION_SERVER_TIMING", False):
+            response["Server-Timing"] = ", ".join(
+                [
+                    f'sql;dur={stats.sql_seconds * 1000:.1f};desc="SQL x{stats.sql_queries}"',
+                    f'orm;dur={stats.orm_seconds * 1000:.1f};desc="ORM x{stats.orm_queries}"',
+                    f's3;dur={stats.s3_seconds * 1000:.1f};desc="S3 x{stats.s3_calls}, {stats.s3_bytes} B"',
+                    f"tpl;dur={stats.template_seconds * 1000:.1f}",
+                    f"total;dur={total_ms:.1f}",
+                ]
+            )
+
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "duration_ms": round(total_ms, 1),
+            "sql_queries": stats.sql_queries,
+            "sql_ms": round(stats.sql_seconds * 1000, 1),
+            "orm_queries": stats.orm_queries,
+            "orm_ms": round(stats.orm_seconds * 1000, 1),
+            "s3_calls": stats.s3_calls,
+            "s3_bytes": stats.s3_bytes,
+            "s3_ms": round(stats.s3_seconds * 1000, 1),
+            "template_ms": round(stats.template_seconds * 1000, 1),
+        }
+        if repeated:
+            record["n_plus_one"] = [{"sql": sql, "count": count} for sql, count in repeated]
+            logger.warning(json.dumps(record, ensure_ascii=False))
+        else:
+            logger.info(json.dumps(record, ensure_ascii=False))
+        return response
+
+
+class ReplicaPinningMiddleware:
+    """
+    Przypina request do primary (router ORM i read_connection), gdy request zapisuje
+    (metoda inna niż GET/HEAD/OPTIONS) albo zalogowany użytkownik zapisywał przed chwilą.
+    Po zapisie zalogowanego użytkownika zaczyna się jego okno read-your-writes.
+    Musi stać po AuthenticationMiddleware. Bez replik nie jest używany.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not replicas.enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        user = getattr(request, "user", None)
+        token = replicas.pin(self._pin(request, user))
+        try:
+            return self.get_response(request)
+        finally:
+            replicas.unpin(token)
+            self._finish(request, user)
+
+    async def __acall__(self, request):
+        user = await request.auser() if hasattr(request, "auser") else None
+        token = replicas.pin(self._pin(request, user))
+        try:
+            return await self.get_response(request)
+        finally:
+            replicas.unpin(token)
+            self._finish(request, user)
+
+    @staticmethod
+    def _writes(request) -> bool:
+        return request.method not in ("GET", "HEAD", "OPTIONS")
+
+    def _pin(self, request, user) -> bool:
+        if self._writes(request):
+            return True
+        return bool(user and user.is_authenticated and replicas.is_sticky(user.id))
+
+    def _finish(self, request, user) -> None:
+        if self._writes(request) and user and user.is_authenticated:
+            replicas.mark_write(user.id)
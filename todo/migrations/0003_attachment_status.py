@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 20:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo', '0002_sync_user_model_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attachment',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Wysyłanie'), ('ready', 'Gotowy'), ('failed', 'Błąd wysyłania')], default='ready', max_length=20),
+        ),
+    ]
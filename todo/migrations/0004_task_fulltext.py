@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from todo import search_index
+
+
+def create_index(apps, schema_editor):
+    search_index.create(schema_editor)
+
+
+def drop_index(apps, schema_editor):
+    search_index.drop(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo', '0003_attachment_status'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
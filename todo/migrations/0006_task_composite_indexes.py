@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-18 21:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo', '0005_task_reminder_state'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='task',
+            name='idx_tasks_reminder_due',
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='idx_tasks_user_created'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['user', 'group', 'created_at', 'id'], name='idx_tasks_user_group_created'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['reminder_sent_at', 'remind_at', 'status', 'reminder_claimed_at'], name='idx_tasks_reminder_due'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['reminder_claimed_by', 'remind_at'], name='idx_tasks_reminder_claim'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.8 on 2026-10-18 21:46
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo', '0009_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredObject',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64)),
+                ('object_key', models.CharField(max_length=1024)),
+                ('size', models.BigIntegerField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('pending', 'Wysyłanie'), ('ready', 'Gotowy')], default='pending', max_length=20)),
+                ('ref_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'stored_objects',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='attachment',
+            index=models.Index(fields=['content_hash'], name='idx_attachments_content_hash'),
+        ),
+        migrations.AddField(
+            model_name='storedobject',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stored_objects', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='storedobject',
+            index=models.Index(fields=['user', 'ref_count'], name='idx_stored_objects_refs'),
+        ),
+        migrations.AddConstraint(
+            model_name='storedobject',
+            constraint=models.UniqueConstraint(fields=('user', 'content_hash'), name='uq_stored_objects_user_hash'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.8 on 2026-10-18 22:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo', '0010_stored_objects'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attachment',
+            name='spool_path',
+            field=models.CharField(blank=True, max_length=1024, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='attachment',
+            index=models.Index(fields=['status', 'created_at'], name='idx_attachments_pending'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from todo import search_index
+
+
+def add_owner(apps, schema_editor):
+    search_index.add_owner(schema_editor)
+
+
+def drop_owner(apps, schema_editor):
+    search_index.drop_owner(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo', '0011_attachment_spool_path'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_owner, drop_owner),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 22:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo', '0012_task_search_owner'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='reminder_attempts',
+            field=models.PositiveSmallIntegerField(db_default=0),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-18 22:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo', '0013_task_reminder_attempts'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='outboxmessage',
+            name='idx_outbox_available',
+        ),
+        migrations.AddField(
+            model_name='outboxmessage',
+            name='dead_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='outboxmessage',
+            index=models.Index(fields=['dead_at', 'available_at', 'claimed_at'], name='idx_outbox_available'),
+        ),
+    ]
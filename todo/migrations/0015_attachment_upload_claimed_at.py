@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 23:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo', '0014_outbox_dead_letter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attachment',
+            name='upload_claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
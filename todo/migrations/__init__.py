@@ -1 +0,0 @@
-from .task_service import create_task_with_optional_attachment
\ No newline at end of file
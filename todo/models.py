@@ -89,25 +89,147 @@ class Task(models.Model):
 
     remind_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(default=timezone.now)
+    # Ostatnia zmiana widoczna dla klienta (też załączników) – ustawiają ją ścieżki zapisu raw SQL.
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Stan wysyłki przypomnienia (manage.py send_reminders)
+    reminder_sent_at = models.DateTimeField(null=True, blank=True)
+    reminder_claimed_by = models.CharField(max_length=64, null=True, blank=True)
+    reminder_claimed_at = models.DateTimeField(null=True, blank=True)
+    # liczba rezerwacji; po REMINDER_MAX_ATTEMPTS nieudanych wysyłkach przypomnienie jest porzucane
+    # (domyślna wartość w bazie – raw SQL INSERT-y tasków jej nie podają)
+    reminder_attempts = models.PositiveSmallIntegerField(db_default=0)
 
     class Meta:
         db_table = "tasks"
         ordering = ["-created_at", "-id"]
+        indexes = [
+            # Lista: WHERE user_id [AND `group`] ORDER BY created_at DESC, id DESC – zakres po indeksie, bez sortowania.
+            models.Index(fields=["user", "created_at", "id"], name="idx_tasks_user_created"),
+            models.Index(fields=["user", "group", "created_at", "id"], name="idx_tasks_user_group_created"),
+            # Synchronizacja przyrostowa: WHERE user_id AND (updated_at, id) > kursor ORDER BY updated_at, id.
+            models.Index(fields=["user", "updated_at", "id"], name="idx_tasks_user_updated"),
+            # Worker przypomnień: wybór kandydatów w całości z indeksu + odczyt po tokenie claimu.
+            models.Index(
+                fields=["reminder_sent_at", "remind_at", "status", "reminder_claimed_at"],
+                name="idx_tasks_reminder_due",
+            ),
+            models.Index(fields=["reminder_claimed_by", "remind_at"], name="idx_tasks_reminder_claim"),
+        ]
 
     def __str__(self):
         return self.title
 
 
+class TaskTombstone(models.Model):
+    """
+    Ślad po usuniętym tasku dla synchronizacji przyrostowej (/tasks/changes/).
+    user_id bez klucza obcego – ślady przeżywają kaskadowe usuwanie i są czyszczone po czasie.
+    """
+
+    user_id = models.BigIntegerField()
+    task_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = "task_tombstones"
+        indexes = [
+            models.Index(fields=["user_id", "id"], name="idx_tombstones_user"),
+            models.Index(fields=["deleted_at"], name="idx_tombstones_deleted"),
+        ]
+
+    def __str__(self):
+        return f"{self.task_id} ({self.deleted_at})"
+
+
 class Attachment(models.Model):
+    class Status(models.TextChoices):
+        PENDING = "pending", "Wysyłanie"
+        READY = "ready", "Gotowy"
+        FAILED = "failed", "Błąd wysyłania"
+
     task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name="attachments")
     filename = models.CharField(max_length=255)
     object_key = models.CharField(max_length=1024)
     file_url = models.TextField()
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.READY)
+    # sha256 treści (hex), liczone przy odbiorze uploadu; puste dla starszych załączników
+    content_hash = models.CharField(max_length=64, null=True, blank=True)
+    # plik czekający na wysyłkę w tle (spool na dysku workera); po restarcie wysyła go recover_uploads
+    spool_path = models.CharField(max_length=1024, null=True, blank=True)
+    # kiedy przebieg wysyłki (wątek w tle albo recover_uploads) przejął załącznik; ważne ATTACHMENT_RETRY_AFTER_MINUTES
+    upload_claimed_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
         db_table = "attachments"
         ordering = ["-created_at", "-id"]
+        indexes = [
+            # Koniec wysyłki współdzielonego obiektu oznacza wszystkie załączniki z tą treścią.
+            models.Index(fields=["content_hash"], name="idx_attachments_content_hash"),
+            # recover_uploads szuka starych wysyłek w toku.
+            models.Index(fields=["status", "created_at"], name="idx_attachments_pending"),
+        ]
 
     def __str__(self):
         return self.filename
+
+
+class StoredObject(models.Model):
+    """
+    Obiekt w S3 współdzielony przez załączniki użytkownika o tej samej treści (sha256).
+    ref_count – liczba załączników; przy zerze obiekt jest kasowany (todo/services/attachment_store.py).
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "Wysyłanie"
+        READY = "ready", "Gotowy"
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="stored_objects")
+    content_hash = models.CharField(max_length=64)
+    object_key = models.CharField(max_length=1024)
+    size = models.BigIntegerField(null=True, blank=True)
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
+    ref_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = "stored_objects"
+        constraints = [
+            models.UniqueConstraint(fields=["user", "content_hash"], name="uq_stored_objects_user_hash"),
+        ]
+        indexes = [
+            models.Index(fields=["user", "ref_count"], name="idx_stored_objects_refs"),
+        ]
+
+    def __str__(self):
+        return self.object_key
+
+
+class OutboxMessage(models.Model):
+    """
+    Zlecenie efektu ubocznego zapisane w tej samej transakcji co zmiana (todo/services/outbox.py).
+    Wykonuje je w tle manage.py relay_outbox; po sukcesie wiersz jest usuwany.
+    """
+
+    topic = models.CharField(max_length=64)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(default=timezone.now)
+    # Najwcześniejsza (kolejna) próba – po błędzie przesuwana z wykładniczym odstępem.
+    available_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(null=True, blank=True)
+    claimed_by = models.CharField(max_length=64, null=True, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    # Porzucona po OUTBOX_MAX_ATTEMPTS próbach (dead letter) – relay jej nie bierze, zostaje do wglądu.
+    dead_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "outbox"
+        indexes = [
+            # Relay: WHERE dead_at IS NULL AND available_at <= now AND claim wolny/wygasły ORDER BY available_at.
+            models.Index(fields=["dead_at", "available_at", "claimed_at"], name="idx_outbox_available"),
+        ]
+
+    def __str__(self):
+        return f"{self.topic} #{self.id}"
@@ -0,0 +1,157 @@
+"""
+Indeks pełnotekstowy tasków (title, description).
+
+MySQL: FULLTEXT INDEX na tabeli tasks – InnoDB aktualizuje go przy każdym zapisie. Obok
+title i description indeks ma kolumnę search_owner z tokenem właściciela (owner_token), więc
+wyszukiwanie użytkownika przecina listy trafień z jego taskami już w indeksie, zamiast oceniać
+trafienia z całej tabeli i dopiero potem odrzucać cudze wiersze.
+SQLite (lokalny fallback z settings): tabela FTS5 tasks_fts z treścią brana z tasks
+(content=) i triggery utrzymujące ją przy INSERT/UPDATE/DELETE, także tych z raw SQL.
+"""
+import re
+
+MYSQL_INDEX = "tasks_title_description_ft"
+MYSQL_OWNER_INDEX = "tasks_owner_title_description_ft"
+# Lista kolumn w MATCH musi być identyczna z listą kolumn indeksu.
+MYSQL_COLUMNS = "search_owner, title, description"
+
+SQLITE_TABLE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5("
+    "title, description, content='tasks', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')"
+)
+
+SQLITE_TRIGGERS = {
+    "tasks_fts_ai": """
+        CREATE TRIGGER IF NOT EXISTS tasks_fts_ai AFTER INSERT ON tasks BEGIN
+          INSERT INTO tasks_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+        END
+    """,
+    "tasks_fts_ad": """
+        CREATE TRIGGER IF NOT EXISTS tasks_fts_ad AFTER DELETE ON tasks BEGIN
+          INSERT INTO tasks_fts(tasks_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+        END
+    """,
+    "tasks_fts_au": """
+        CREATE TRIGGER IF NOT EXISTS tasks_fts_au AFTER UPDATE OF title, description ON tasks BEGIN
+          INSERT INTO tasks_fts(tasks_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+          INSERT INTO tasks_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+        END
+    """,
+}
+
+
+# Najwyżej tyle słów z zapytania trafia do MATCH.
+MAX_TERMS = 8
+_TERM = re.compile(r"\w+")
+
+
+def search_terms(query: str) -> list[str]:
+    """
+    Słowa zapytania użytkownika (małymi literami, bez interpunkcji i operatorów) dla match_query/match_condition.
+    """
+    return _TERM.findall((query or "").lower())[:MAX_TERMS]
+
+
+def owner_token(user_id: int) -> str:
+    """
+    Słowo w search_owner wiersza (jedno na użytkownika, bez znaków dzielących słowa w parserze InnoDB).
+    """
+    return f"fomouser{int(user_id)}"
+
+
+def match_query(vendor: str, terms: list[str], *, user_id: int | None = None) -> str:
+    """
+    Zapytanie dla MATCH (FTS5 albo BOOLEAN MODE): każde słowo musi wystąpić, także jako początek dłuższego.
+    user_id (MySQL) zawęża trafienia do tasków użytkownika w samym indeksie.
+    """
+    if vendor == "sqlite":
+        return " AND ".join(f'"{t}"*' for t in terms)
+    owner = [f"+{owner_token(user_id)}"] if user_id is not None else []
+    return " ".join(owner + [f"+{t}*" for t in terms])
+
+
+def match_condition(vendor: str, terms: list[str]) -> tuple[str, list]:
+    """
+    Wyrażenie na tabeli tasks (kolumny z nazwą tabeli, np. dla ORM z JOIN-ami) korzystające z indeksu:
+    > 0 dla pasujących wierszy (MySQL: trafność MATCH, SQLite: 0/1). Dla RawSQL w annotate/filter.
+    """
+    if vendor == "sqlite":
+        return "tasks.id IN (SELECT rowid FROM tasks_fts WHERE tasks_fts MATCH %s)", [match_query(vendor, terms)]
+    return (
+        "MATCH(tasks.search_owner, tasks.title, tasks.description) AGAINST (%s IN BOOLEAN MODE)",
+        [match_query(vendor, terms)],
+    )
+
+
+def create(schema_editor) -> None:
+    vendor = schema_editor.connection.vendor
+    if vendor == "mysql":
+        # Pierwszy FULLTEXT na tabeli InnoDB przebudowuje ją (kolumna FTS_DOC_ID) – na dużej bazie
+        # migrację warto puścić poza godzinami ruchu.
+        schema_editor.execute(f"ALTER TABLE tasks ADD FULLTEXT INDEX {MYSQL_INDEX} (title, description)")
+    elif vendor == "sqlite":
+        schema_editor.execute(SQLITE_TABLE)
+        for sql in SQLITE_TRIGGERS.values():
+            schema_editor.execute(sql)
+        schema_editor.execute("INSERT INTO tasks_fts(tasks_fts) VALUES ('rebuild')")
+
+
+def drop(schema_editor) -> None:
+    vendor = schema_editor.connection.vendor
+    if vendor == "mysql":
+        schema_editor.execute(f"ALTER TABLE tasks DROP INDEX {MYSQL_INDEX}")
+    elif vendor == "sqlite":
+        for name in SQLITE_TRIGGERS:
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        schema_editor.execute("DROP TABLE IF EXISTS tasks_fts")
+
+
+def add_owner(schema_editor) -> None:
+    """
+    MySQL: kolumna search_owner (generowana z user_id) i indeks FULLTEXT z nią zamiast samego
+    (title, description). Przebudowa indeksu blokuje zapisy do tasks – migracja poza godzinami ruchu.
+    SQLite (lokalny fallback) zostaje przy tasks_fts z JOIN-em po user_id.
+    """
+    if schema_editor.connection.vendor != "mysql":
+        return
+    schema_editor.execute(
+        "ALTER TABLE tasks ADD COLUMN search_owner VARCHAR(32) "
+        "GENERATED ALWAYS AS (CONCAT('fomouser', user_id)) STORED"
+    )
+    schema_editor.execute(
+        f"ALTER TABLE tasks DROP INDEX {MYSQL_INDEX}, "
+        f"ADD FULLTEXT INDEX {MYSQL_OWNER_INDEX} ({MYSQL_COLUMNS})"
+    )
+
+
+def drop_owner(schema_editor) -> None:
+    if schema_editor.connection.vendor != "mysql":
+        return
+    schema_editor.execute(
+        f"ALTER TABLE tasks DROP INDEX {MYSQL_OWNER_INDEX}, "
+        f"ADD FULLTEXT INDEX {MYSQL_INDEX} (title, description)"
+    )
+    schema_editor.execute("ALTER TABLE tasks DROP COLUMN search_owner")
+
+
+def ensure_sqlite_triggers(connection) -> None:
+    """
+    Na SQLite Django przy części zmian kolumn przebudowuje tabelę (nowa tabela + rename),
+    co kasuje jej triggery. Po migracjach odtwarzamy brakujące i przebudowujemy indeks.
+    """
+    if connection.vendor != "sqlite":
+        return
+
+    with connection.cursor() as cur:
+        cur.execute("SELECT name FROM sqlite_master WHERE name = 'tasks_fts'")
+        if cur.fetchone() is None:
+            return
+        cur.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'tasks'")
+        existing = {row[0] for row in cur.fetchall()}
+        missing = [sql for name, sql in SQLITE_TRIGGERS.items() if name not in existing]
+        if not missing:
+            return
+        for sql in missing:
+            cur.execute(sql)
+        cur.execute("INSERT INTO tasks_fts(tasks_fts) VALUES ('rebuild')")
@@ -0,0 +1,141 @@
+"""
+Deduplikacja załączników po treści (stored_objects).
+
+Plik o tej samej sumie sha256 (liczonej w locie przez upload_handlers) trafia do S3 raz na
+użytkownika: kolejne załączniki dostają object_key istniejącego obiektu, a ref_count liczy,
+ile załączników go używa. Obiekt znika z S3 dopiero, gdy licznik spadnie do zera (collect()).
+
+Deduplikujemy w obrębie użytkownika – wspólny obiekt dla wszystkich zdradzałby szybszą
+odpowiedzią, że ktoś inny ma już taki plik. Klucz obiektu pozostaje losowy (safe_object_key):
+nowy obiekt po skasowaniu starego o tej samej treści nie może trafić pod zwalniany klucz.
+"""
+import logging
+import threading
+
+from todo.services import metrics
+from todo.services.mysql_pool import connection
+from todo.services.oss import delete_object
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_counters = {"stored": 0, "reused": 0, "collected": 0}
+
+
+def _count(name: str, n: int = 1) -> None:
+    with _lock:
+        _counters[name] += n
+
+
+def _upsert_sql(vendor: str) -> str:
+    if vendor == "mysql":
+        conflict = "ON DUPLICATE KEY UPDATE ref_count = ref_count + 1"
+    else:
+        conflict = "ON CONFLICT (user_id, content_hash) DO UPDATE SET ref_count = ref_count + 1"
+    return (
+        "INSERT INTO stored_objects (user_id, content_hash, object_key, size, status, ref_count, created_at) "
+        f"VALUES (%s, %s, %s, %s, %s, 1, %s) {conflict}"
+    )
+
+
+def acquire(cur, *, vendor: str, user_id: int, content_hash: str, object_key: str, size: int | None, status: str, now) -> dict:
+    """
+    Dolicza referencję do obiektu o treści content_hash, a gdy go nie ma – zakłada go pod
+    object_key ze statusem `status`. W transakcji wołającego (jeden atomowy upsert, bez wyścigu
+    dwóch równoległych wysyłek). Zwraca {object_key, status, created}; created=False znaczy,
+    że treść już jest w S3 pod zwróconym object_key i nie trzeba jej wysyłać.
+    """
+    cur.execute(_upsert_sql(vendor), (user_id, content_hash, object_key, size, status, now))
+    cur.execute(
+        "SELECT object_key, status FROM stored_objects WHERE user_id=%s AND content_hash=%s",
+        (user_id, content_hash),
+    )
+    row = cur.fetchone()
+    created = row["object_key"] == object_key
+    _count("stored" if created else "reused")
+    return {"object_key": row["object_key"], "status": row["status"], "created": created}
+
+
+def settle(cur, *, content_hash: str, object_key: str, status: str) -> None:
+    """
+    Koniec wysyłki obiektu: status trafia do wszystkich załączników czekających na te bajty.
+    Po błędzie obiekt wypada ze stored_objects – następny upload tej treści wyśle ją od nowa.
+    """
+    cur.execute(
+        "UPDATE attachments SET status=%s WHERE content_hash=%s AND object_key=%s AND status='pending'",
+        (status, content_hash, object_key),
+    )
+    if status == "ready":
+        cur.execute(
+            "UPDATE stored_objects SET status='ready' WHERE content_hash=%s AND object_key=%s",
+            (content_hash, object_key),
+        )
+    else:
+        cur.execute("DELETE FROM stored_objects WHERE content_hash=%s AND object_key=%s", (content_hash, object_key))
+
+
+def release_tasks(cur, *, user_id: int, task_ids, placeholders: str) -> int:
+    """
+    Odejmuje referencje załączników kasowanych tasków (przed DELETE FROM attachments, w tej samej
+    transakcji). Liczą się tylko załączniki wskazujące object_key obiektu – starsze, sprzed
+    deduplikacji, mają własne klucze. Zwraca liczbę obiektów, którym spadł licznik.
+    """
+    cur.execute(
+        f"""
+        SELECT a.content_hash, a.object_key, COUNT(*) AS refs
+        FROM attachments a
+        JOIN tasks t ON t.id = a.task_id
+        WHERE t.user_id=%s AND t.id IN ({placeholders}) AND a.content_hash IS NOT NULL
+        GROUP BY a.content_hash, a.object_key
+        """,
+        (user_id, *task_ids),
+    )
+    released = 0
+    for row in cur.fetchall():
+        cur.execute(
+            "UPDATE stored_objects SET ref_count = ref_count - %s WHERE user_id=%s AND content_hash=%s AND object_key=%s",
+            (row["refs"], user_id, row["content_hash"], row["object_key"]),
+        )
+        released += max(cur.rowcount, 0)
+    return released
+
+
+def collect(*, user_id: int) -> int:
+    """
+    Kasuje z S3 obiekty użytkownika bez referencji (po commicie usunięcia). Wiersz znika warunkowo
+    (ref_count <= 0), więc upload tej samej treści w międzyczasie zachowuje obiekt. Błąd S3
+    tylko logujemy – obiekt bez wiersza sprząta potem manage.py collect_orphan_objects.
+    Zwraca liczbę skasowanych obiektów.
+    """
+    keys = []
+    with connection() as conn:
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT id, object_key FROM stored_objects WHERE user_id=%s AND ref_count <= 0",
+                    (user_id,),
+                )
+                for row in cur.fetchall():
+                    cur.execute("DELETE FROM stored_objects WHERE id=%s AND ref_count <= 0", (row["id"],))
+                    if cur.rowcount:
+                        keys.append(row["object_key"])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    for key in keys:
+        try:
+            delete_object(key)
+        except Exception:
+            logger.exception("Nie udało się skasować obiektu %s", key)
+    _count("collected", len(keys))
+    return len(keys)
+
+
+def store_stats() -> dict:
+    with _lock:
+        return dict(_counters)
+
+
+metrics.register("attachment_store", store_stats)
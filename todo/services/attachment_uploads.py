@@ -0,0 +1,272 @@
+import atexit
+import logging
+import mimetypes
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.utils import timezone
+
+from todo.services import attachment_store, metrics, task_cache, task_events
+from todo.services.mysql_pool import connection
+from todo.services.oss import upload_file
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_executor = None
+_counters = {"queued": 0, "in_flight": 0, "completed": 0, "failed": 0, "bytes": 0}
+
+
+def _count(name: str, delta: int = 1) -> None:
+    with _lock:
+        _counters[name] += delta
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "ATTACHMENT_UPLOAD_WORKERS", 4),
+                thread_name_prefix="attachment-upload",
+            )
+        return _executor
+
+
+def _shutdown() -> None:
+    # Przy łagodnym zatrzymaniu workera dokańczamy rozpoczęte wysyłki.
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+
+
+atexit.register(_shutdown)
+
+
+def spool(upload) -> str:
+    """
+    Przejmuje plik z requestu na własność i zwraca ścieżkę do niego.
+    Django zamyka (i kasuje) pliki uploadu po zakończeniu requestu, a wysyłka
+    do S3 trwa dłużej. TemporaryUploadedFile przenosimy (rename), resztę kopiujemy.
+    """
+    spool_dir = getattr(settings, "ATTACHMENT_SPOOL_DIR", None) or tempfile.gettempdir()
+    path = os.path.join(spool_dir, f"fomo-upload-{uuid.uuid4().hex}")
+
+    if hasattr(upload, "temporary_file_path"):
+        file_move_safe(upload.temporary_file_path(), path)
+        return path
+
+    upload.seek(0)
+    with open(path, "wb") as out:
+        if hasattr(upload, "chunks"):
+            for chunk in upload.chunks():
+                out.write(chunk)
+        else:
+            shutil.copyfileobj(upload, out)
+    return path
+
+
+def _set_status(attachment_id: int, status: str) -> bool:
+    with connection() as conn:
+        try:
+            conn.begin()
+            with conn.cursor() as cur:
+                cur.execute("SELECT object_key, content_hash, status FROM attachments WHERE id=%s", (attachment_id,))
+                row = cur.fetchone()
+                if row is None or row["status"] != "pending":
+                    # Wysyłkę dokończył już inny przebieg (np. recover_uploads po restarcie).
+                    task_ids = []
+                elif row["content_hash"]:
+                    # Na ten sam obiekt mogą czekać też inne załączniki (attachment_store).
+                    cur.execute(
+                        "SELECT task_id FROM attachments WHERE content_hash=%s AND object_key=%s AND status='pending'",
+                        (row["content_hash"], row["object_key"]),
+                    )
+                    task_ids = [r["task_id"] for r in cur.fetchall()]
+                    attachment_store.settle(cur, content_hash=row["content_hash"], object_key=row["object_key"], status=status)
+                else:
+                    cur.execute("SELECT task_id FROM attachments WHERE id=%s", (attachment_id,))
+                    task_ids = [r["task_id"] for r in cur.fetchall()]
+                    cur.execute("UPDATE attachments SET status=%s WHERE id=%s", (status, attachment_id))
+                # Zmiana załącznika to zmiana taska dla klientów synchronizacji przyrostowej.
+                if task_ids:
+                    placeholders = ", ".join(["%s"] * len(task_ids))
+                    cur.execute(
+                        f"UPDATE tasks SET updated_at=%s WHERE id IN ({placeholders})",
+                        (timezone.now(), *task_ids),
+                    )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return bool(task_ids)
+
+
+def _claim_ttl() -> timedelta:
+    return timedelta(minutes=getattr(settings, "ATTACHMENT_RETRY_AFTER_MINUTES", 15))
+
+
+def _claim(attachment_id: int, *, ttl: timedelta) -> bool:
+    """
+    Przejmuje wysyłkę załącznika pending, o ile nikt nie przejął jej w ciągu ostatnich `ttl`.
+    Warunkowy UPDATE – z dwóch przebiegów (wątek w tle, recover_uploads) wygrywa jeden.
+    """
+    now = timezone.now()
+    with connection() as conn:
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    UPDATE attachments SET upload_claimed_at=%s
+                    WHERE id=%s AND status='pending' AND (upload_claimed_at IS NULL OR upload_claimed_at < %s)
+                    """,
+                    (now, attachment_id, now - ttl),
+                )
+                claimed = cur.rowcount == 1
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return claimed
+
+
+def _upload(
+    *, user_id: int, attachment_id: int, path: str, object_key: str, content_type: str | None, task_id: int | None = None
+) -> None:
+    # Wywołujący przejął już załącznik (_claim).
+    _count("in_flight")
+    settled = True
+    try:
+        size = os.path.getsize(path)
+        upload_file(path=path, object_key=object_key, content_type=content_type)
+    except Exception:
+        logger.exception("Wysyłka załącznika %s (%s) nie powiodła się", attachment_id, object_key)
+        _count("failed")
+        try:
+            _set_status(attachment_id, "failed")
+        except Exception:
+            logger.exception("Nie udało się oznaczyć załącznika %s jako failed", attachment_id)
+    else:
+        try:
+            _set_status(attachment_id, "ready")
+            _count("completed")
+            _count("bytes", size)
+        except Exception:
+            # Plik jest już w S3 – załącznik zostaje pending z plikiem w spoolu, recover_uploads go dokończy.
+            logger.exception("Załącznik %s wysłany, ale nie udało się zapisać statusu", attachment_id)
+            settled = False
+    finally:
+        _count("in_flight", -1)
+        if settled:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        task_cache.invalidate(user_id)
+        if task_id is not None:
+            task_events.publish(user_id, "updated", [task_id])
+
+
+def _run(
+    *, user_id: int, attachment_id: int, path: str, object_key: str, content_type: str | None, task_id: int | None = None
+) -> None:
+    if not _claim(attachment_id, ttl=_claim_ttl()):
+        # Wysyłkę przejął już recover_uploads (kolejka wątków stała dłużej niż ATTACHMENT_RETRY_AFTER_MINUTES).
+        logger.info("Załącznik %s wysyła już inny przebieg", attachment_id)
+        return
+    _upload(
+        user_id=user_id,
+        attachment_id=attachment_id,
+        path=path,
+        object_key=object_key,
+        content_type=content_type,
+        task_id=task_id,
+    )
+
+
+def enqueue(
+    *,
+    user_id: int,
+    attachment_id: int,
+    path: str,
+    object_key: str,
+    content_type: str | None = None,
+    task_id: int | None = None,
+):
+    """
+    Zleca wysyłkę pliku spod `path` w tle. Po zakończeniu załącznik dostaje
+    status ready (albo failed), a plik tymczasowy jest usuwany.
+    """
+    _count("queued")
+    return _get_executor().submit(
+        _run,
+        user_id=user_id,
+        attachment_id=attachment_id,
+        path=path,
+        object_key=object_key,
+        content_type=content_type,
+        task_id=task_id,
+    )
+
+
+def recover_pending(*, retry_after: timedelta, fail_after: timedelta) -> dict:
+    """
+    Załączniki pending, których wysyłka zginęła z pulą wątków (restart, awaria workera).
+    Starsze niż retry_after z plikiem w spoolu tego hosta wysyła od nowa (synchronicznie),
+    starsze niż fail_after bez pliku oznacza jako failed. Każdy załącznik najpierw przejmuje (_claim),
+    więc wysyłki przejętej przez wątek w tle albo inny przebieg w ciągu retry_after nie rusza.
+    Zwraca {retried, failed}.
+    """
+    now = timezone.now()
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT a.id, a.task_id, a.filename, a.object_key, a.spool_path, t.user_id,
+                       CASE WHEN a.created_at < %s THEN 1 ELSE 0 END AS expired
+                FROM attachments a
+                JOIN tasks t ON t.id = a.task_id
+                WHERE a.status = 'pending' AND a.created_at < %s
+                  AND (a.upload_claimed_at IS NULL OR a.upload_claimed_at < %s)
+                ORDER BY a.id
+                """,
+                (now - fail_after, now - retry_after, now - retry_after),
+            )
+            rows = cur.fetchall()
+
+    stats = {"retried": 0, "failed": 0}
+    for row in rows:
+        spooled = bool(row["spool_path"]) and os.path.exists(row["spool_path"])
+        if not (spooled or row["expired"]) or not _claim(row["id"], ttl=retry_after):
+            continue
+        if spooled:
+            _count("queued")
+            _upload(
+                user_id=row["user_id"],
+                attachment_id=row["id"],
+                path=row["spool_path"],
+                object_key=row["object_key"],
+                content_type=mimetypes.guess_type(row["filename"])[0],
+                task_id=row["task_id"],
+            )
+            stats["retried"] += 1
+        # _set_status zwraca False, gdy załącznik czekał na obiekt rozstrzygnięty już wcześniej w pętli.
+        elif row["expired"] and _set_status(row["id"], "failed"):
+            task_cache.invalidate(row["user_id"])
+            task_events.publish(row["user_id"], "updated", [row["task_id"]])
+            stats["failed"] += 1
+    return stats
+
+
+def upload_stats() -> dict:
+    with _lock:
+        return dict(_counters)
+
+
+metrics.register("attachment_uploads", upload_stats)
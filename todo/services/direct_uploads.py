@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.core import signing
+
+from todo.services import oss
+from todo.services.task_sql_service import add_attachment_sql
+
+SALT = "todo.direct_upload"
+
+
+class DirectUploadError(Exception):
+    pass
+
+
+def start(*, user_id: int, task_id: int, filename: str, content_type: str) -> dict:
+    """
+    Przygotowuje wysyłkę pliku z przeglądarki prosto do bucketu (bez workera Django).
+    Zwraca presigned POST + podpisany token, który potem przyjmuje confirm().
+    """
+    object_key = oss.safe_object_key(user_id=user_id, task_id=task_id, filename=filename)
+    post = oss.presigned_post(
+        object_key=object_key,
+        content_type=content_type,
+        max_size=settings.ATTACHMENT_MAX_SIZE,
+        expires=settings.ATTACHMENT_DIRECT_UPLOAD_EXPIRES,
+    )
+    token = signing.dumps(
+        {"user_id": user_id, "task_id": task_id, "object_key": object_key, "filename": filename},
+        salt=SALT,
+    )
+    return {"url": post["url"], "fields": post["fields"], "token": token}
+
+
+def confirm(*, user_id: int, task_id: int, token: str) -> dict:
+    """
+    Zapisuje załącznik po wysyłce z przeglądarki. Obiekt musi istnieć w buckecie (HEAD)
+    i mieścić się w limicie rozmiaru. Rzuca DirectUploadError.
+    """
+    try:
+        data = signing.loads(token, salt=SALT, max_age=settings.ATTACHMENT_DIRECT_UPLOAD_EXPIRES * 2)
+    except signing.BadSignature:
+        raise DirectUploadError("Nieprawidłowy lub przeterminowany token wysyłki.")
+
+    if data["user_id"] != user_id or data["task_id"] != task_id:
+        raise DirectUploadError("Token nie dotyczy tego zadania.")
+
+    object_key = data["object_key"]
+    head = oss.head_object(object_key)
+    if head is None:
+        raise DirectUploadError("Plik nie dotarł do magazynu.")
+    if head["ContentLength"] > settings.ATTACHMENT_MAX_SIZE:
+        oss.delete_object(object_key)
+        raise DirectUploadError("Plik jest za duży.")
+
+    file_url = oss.public_url(object_key)
+    attachment_id = add_attachment_sql(
+        user_id=user_id,
+        task_id=task_id,
+        filename=data["filename"],
+        object_key=object_key,
+        file_url=file_url,
+    )
+    if attachment_id is None:
+        oss.delete_object(object_key)
+        raise DirectUploadError("Zadanie nie istnieje.")
+
+    return {"id": attachment_id, "filename": data["filename"], "file_url": file_url}
@@ -0,0 +1,204 @@
+"""
+Pomiary per request: zapytania SQL (raw pymysql i ORM), wywołania S3, renderowanie szablonów.
+
+Dane zbiera RequestStats zapisany w contextvar – ustawia go RequestInstrumentationMiddleware
+(todo/middleware.py). Poza requestem (worker przypomnień, wysyłki w tle) record_* nic nie robią.
+"""
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import pymysql
+from django.template.backends.django import DjangoTemplates, Template
+
+_current: ContextVar["RequestStats | None"] = ContextVar("fomo_request_stats", default=None)
+_captured: ContextVar["list | None"] = ContextVar("fomo_captured_queries", default=None)
+
+
+class RequestStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.sql_queries = 0
+        self.sql_seconds = 0.0
+        self.orm_queries = 0
+        self.orm_seconds = 0.0
+        self.s3_calls = 0
+        self.s3_bytes = 0
+        self.s3_seconds = 0.0
+        self.template_seconds = 0.0
+        self.fingerprints = Counter()
+
+    def add_query(self, sql: str, seconds: float, *, orm: bool) -> None:
+        fingerprint = sql_fingerprint(sql)
+        with self._lock:
+            if orm:
+                self.orm_queries += 1
+                self.orm_seconds += seconds
+            else:
+                self.sql_queries += 1
+                self.sql_seconds += seconds
+            self.fingerprints[fingerprint] += 1
+
+    def add_s3(self, size: int, seconds: float) -> None:
+        with self._lock:
+            self.s3_calls += 1
+            self.s3_bytes += size
+            self.s3_seconds += seconds
+
+    def add_template(self, seconds: float) -> None:
+        with self._lock:
+            self.template_seconds += seconds
+
+    def repeated_queries(self, threshold: int) -> list[tuple[str, int]]:
+        """
+        Zapytania o tym samym kształcie wykonane co najmniej `threshold` razy – typowy objaw N+1.
+        """
+        with self._lock:
+            return [(sql, n) for sql, n in self.fingerprints.most_common() if n >= threshold]
+
+
+def start() -> tuple[RequestStats, object]:
+    stats = RequestStats()
+    return stats, _current.set(stats)
+
+
+def stop(token) -> None:
+    _current.reset(token)
+
+
+def current() -> RequestStats | None:
+    return _current.get()
+
+
+_LITERALS = re.compile(r"'(?:[^'\\]|\\.)*'|\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r"\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+def sql_fingerprint(sql: str) -> str:
+    """
+    Kształt zapytania bez wartości: literały -> ?, listy IN (...) dowolnej długości -> (...).
+    """
+    sql = _LITERALS.sub("?", sql)
+    sql = sql.replace("%s", "?")
+    sql = _IN_LISTS.sub("(...)", sql)
+    return _SPACES.sub(" ", sql).strip()
+
+
+def record_query(sql: str, seconds: float, *, orm: bool = False, params=None) -> None:
+    stats = _current.get()
+    if stats is not None:
+        stats.add_query(sql, seconds, orm=orm)
+    captured = _captured.get()
+    if captured is not None and not orm:
+        captured.append((sql, tuple(params or ())))
+
+
+@contextmanager
+def capture_queries():
+    """
+    Zbiera (sql, params) zapytań raw SQL wykonanych w bloku w tym kontekście
+    (np. do EXPLAIN w todo.services.query_plans).
+    """
+    queries = []
+    token = _captured.set(queries)
+    try:
+        yield queries
+    finally:
+        _captured.reset(token)
+
+
+class InstrumentedCursor(pymysql.cursors.DictCursor):
+    """
+    DictCursor dla połączeń z puli, który mierzy każde zapytanie bieżącego requestu.
+    """
+
+    def execute(self, query, args=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, args)
+        finally:
+            record_query(query, time.perf_counter() - started, params=args)
+
+    def executemany(self, query, args):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, args)
+        finally:
+            record_query(query, time.perf_counter() - started)
+
+
+def orm_execute_wrapper(execute, sql, params, many, context):
+    # connection.execute_wrapper() dla zapytań ORM (auth, sesje, formularze).
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        record_query(sql, time.perf_counter() - started, orm=True)
+
+
+def _body_size(body) -> int:
+    # bytes albo czytnik fragmentu pliku z s3transfer – oba mają len().
+    try:
+        return len(body) if body is not None else 0
+    except TypeError:
+        return 0
+
+
+def _before_s3_call(params, context, **kwargs):
+    # provide-client-params: parametry API (z Body) przed serializacją – start pomiaru.
+    if _current.get() is not None:
+        context["fomo_started"] = time.perf_counter()
+        context["fomo_sent"] = _body_size(params.get("Body"))
+
+
+def _after_s3_call(context, http_response=None, **kwargs):
+    stats = _current.get()
+    started = context.get("fomo_started")
+    if stats is None or started is None:
+        return
+    size = context.get("fomo_sent", 0)
+    if http_response is not None:
+        size += int(http_response.headers.get("content-length") or 0)
+    stats.add_s3(size, time.perf_counter() - started)
+
+
+def instrument_s3_client(client) -> None:
+    """
+    Podpina liczenie wywołań, bajtów i czasu do zdarzeń botocore klienta S3.
+    """
+    client.meta.events.register("provide-client-params.s3", _before_s3_call)
+    client.meta.events.register("after-call.s3", _after_s3_call)
+    client.meta.events.register("after-call-error.s3", _after_s3_call)
+
+
+class InstrumentedTemplate:
+    def __init__(self, template: Template):
+        self._template = template
+        self.template = template.template
+        self.backend = template.backend
+
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return self._template.render(context, request)
+        finally:
+            stats = _current.get()
+            if stats is not None:
+                stats.add_template(time.perf_counter() - started)
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """
+    Backend DjangoTemplates mierzący czas render() szablonów w bieżącym requeście.
+    """
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return InstrumentedTemplate(super().get_template(template_name))
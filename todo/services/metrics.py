@@ -0,0 +1,32 @@
+import threading
+
+_lock = threading.Lock()
+_sources = {}
+
+
+def register(name: str, collect) -> None:
+    """
+    Rejestruje źródło metryk. `collect()` zwraca płaski dict {nazwa: liczba}.
+    """
+    with _lock:
+        _sources[name] = collect
+
+
+def collect_all() -> dict:
+    with _lock:
+        sources = dict(_sources)
+    return {name: dict(collect()) for name, collect in sorted(sources.items())}
+
+
+def render_prometheus(prefix: str = "fomo") -> str:
+    """
+    Zwraca metryki w formacie tekstowym Prometheusa:
+    fomo_<źródło>_<nazwa> <wartość>
+    """
+    lines = []
+    for source, values in collect_all().items():
+        for key, value in sorted(values.items()):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            lines.append(f"{prefix}_{source}_{key} {value}")
+    return "\n".join(lines) + "\n"
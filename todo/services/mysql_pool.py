@@ -0,0 +1,353 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+import pymysql
+from django.conf import settings
+
+from todo.services import metrics
+from todo.services.instrumentation import InstrumentedCursor
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+# Błędy po których połączenie nie nadaje się do ponownego użycia.
+_BROKEN_ERRORS = (pymysql.err.OperationalError, pymysql.err.InterfaceError)
+
+
+def _connect(*, host: str | None = None, port: int | None = None):
+    # host/port podaje pula replik; domyślnie primary z env.
+    return pymysql.connect(
+        host=host or os.environ["OVH_MYSQL_HOST"],
+        port=port or int(os.environ.get("OVH_MYSQL_PORT", "20184")),
+        user=os.environ["OVH_MYSQL_USER"],
+        password=os.environ["OVH_MYSQL_PASSWORD"],
+        db=os.environ["OVH_MYSQL_DB"],
+        charset="utf8mb4",
+        cursorclass=InstrumentedCursor,
+        ssl={"ssl-mode": "REQUIRED"},
+        autocommit=True,
+        connect_timeout=5,
+        read_timeout=10,
+        write_timeout=10,
+    )
+
+
+class _Entry:
+    __slots__ = ("conn", "created_at", "last_used")
+
+    def __init__(self, conn, now: float):
+        self.conn = conn
+        self.created_at = now
+        self.last_used = now
+
+
+class ConnectionPool:
+    """
+    Ograniczona, thread-safe pula połączeń pymysql.
+
+    - max_size: maksymalna liczba otwartych połączeń (wolne + wypożyczone),
+    - max_lifetime: po tylu sekundach połączenie jest zamykane i otwierane od nowa,
+    - max_idle: wolne połączenia nieużywane dłużej są zamykane (reaping),
+    - ping_after: połączenie bezczynne dłużej niż tyle sekund jest pingowane przy wypożyczeniu,
+    - timeout: ile sekund czekamy na wolne połączenie, gdy pula jest pełna.
+    """
+
+    def __init__(
+        self,
+        connect=_connect,
+        *,
+        max_size: int = 10,
+        max_lifetime: float = 1800,
+        max_idle: float = 300,
+        ping_after: float = 5,
+        timeout: float = 10,
+    ):
+        self._connect = connect
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.ping_after = ping_after
+        self.timeout = timeout
+
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._size = 0
+        self._pid = os.getpid()
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_seconds": 0.0,
+            "timeouts": 0,
+            "handshakes": 0,
+            "handshakes_avoided": 0,
+            "health_check_failures": 0,
+            "expired": 0,
+            "reaped": 0,
+            "discarded": 0,
+        }
+
+    def _check_fork(self) -> None:
+        # Po forku (np. gunicorn --preload) nie wolno dzielić gniazd z rodzicem.
+        if self._pid != os.getpid():
+            self._idle.clear()
+            self._size = 0
+            self._pid = os.getpid()
+
+    def _reap_locked(self, now: float) -> list:
+        stale = []
+        while self._idle and now - self._idle[0].last_used > self.max_idle:
+            stale.append(self._idle.popleft())
+            self._size -= 1
+            self._stats["reaped"] += 1
+        return stale
+
+    def _open(self) -> _Entry:
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._stats["handshakes"] += 1
+        return _Entry(conn, time.monotonic())
+
+    def _healthy(self, entry: _Entry, now: float) -> bool:
+        if now - entry.created_at > self.max_lifetime:
+            with self._cond:
+                self._stats["expired"] += 1
+            return False
+        if now - entry.last_used > self.ping_after:
+            try:
+                entry.conn.ping(reconnect=False)
+            except Exception:
+                with self._cond:
+                    self._stats["health_check_failures"] += 1
+                return False
+        return True
+
+    def acquire(self) -> _Entry:
+        deadline = time.monotonic() + self.timeout
+        waited_from = None
+
+        with self._cond:
+            self._check_fork()
+            self._stats["checkouts"] += 1
+            while True:
+                now = time.monotonic()
+                stale = self._reap_locked(now)
+                if stale:
+                    self._cond.notify(len(stale))
+                    break
+                if self._idle or self._size < self.max_size:
+                    break
+                if waited_from is None:
+                    waited_from = now
+                    self._stats["waits"] += 1
+                remaining = deadline - now
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    if not self._idle and self._size >= self.max_size:
+                        self._stats["timeouts"] += 1
+                        self._stats["wait_seconds"] += time.monotonic() - waited_from
+                        raise PoolTimeout(f"Brak wolnego połączenia MySQL po {self.timeout}s")
+
+            if waited_from is not None:
+                self._stats["wait_seconds"] += time.monotonic() - waited_from
+
+            entry = self._idle.pop() if self._idle else None
+            if entry is None:
+                self._size += 1
+
+        for old in stale:
+            _close_quietly(old.conn)
+
+        if entry is not None:
+            if self._healthy(entry, time.monotonic()):
+                with self._cond:
+                    self._stats["handshakes_avoided"] += 1
+                return entry
+            _close_quietly(entry.conn)
+
+        # Rezerwacja miejsca (_size) przechodzi na nowe połączenie.
+        return self._open()
+
+    def release(self, entry: _Entry, *, discard: bool = False) -> None:
+        now = time.monotonic()
+        if not discard and entry.conn.open:
+            try:
+                # Nie zostawiamy niezatwierdzonej transakcji dla następnego użytkownika.
+                if not entry.conn.get_autocommit():
+                    entry.conn.rollback()
+            except Exception:
+                discard = True
+        else:
+            discard = True
+
+        with self._cond:
+            if self._pid != os.getpid():
+                discard = True
+            elif discard:
+                self._size -= 1
+                self._stats["discarded"] += 1
+            else:
+                entry.last_used = now
+                self._idle.append(entry)
+            self._cond.notify()
+
+        if discard:
+            _close_quietly(entry.conn)
+
+    @contextmanager
+    def connection(self):
+        with self.lease(self.acquire()) as conn:
+            yield conn
+
+    @contextmanager
+    def lease(self, entry: _Entry):
+        """
+        Oddaje wypożyczone już (acquire) połączenie po wyjściu z bloku; zerwane są zamykane.
+        """
+        try:
+            yield entry.conn
+        except _BROKEN_ERRORS:
+            self.release(entry, discard=True)
+            raise
+        except BaseException:
+            self.release(entry)
+            raise
+        else:
+            self.release(entry)
+
+    def close(self) -> None:
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+        for entry in idle:
+            _close_quietly(entry.conn)
+
+    def stats(self) -> dict:
+        with self._cond:
+            data = dict(self._stats)
+            data["size"] = self._size
+            data["idle"] = len(self._idle)
+            data["in_use"] = self._size - len(self._idle)
+            data["max_size"] = self.max_size
+        return data
+
+
+def _close_quietly(conn) -> None:
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    max_size=getattr(settings, "OVH_MYSQL_POOL_SIZE", 10),
+                    max_lifetime=getattr(settings, "OVH_MYSQL_POOL_MAX_LIFETIME", 1800),
+                    max_idle=getattr(settings, "OVH_MYSQL_POOL_MAX_IDLE", 300),
+                    ping_after=getattr(settings, "OVH_MYSQL_POOL_PING_AFTER", 5),
+                    timeout=getattr(settings, "OVH_MYSQL_POOL_TIMEOUT", 10),
+                )
+    return _pool
+
+
+def install_pool(pool: ConnectionPool | None) -> ConnectionPool | None:
+    """
+    Podmienia globalną pulę (testy, benchmarki). Zwraca poprzednią.
+    """
+    global _pool
+    with _pool_lock:
+        previous, _pool = _pool, pool
+    return previous
+
+
+# Połączenie w transakcji rolled_back(), które dostają wszystkie connection() w tym kontekście.
+_shared: ContextVar = ContextVar("fomo_rolled_back_connection", default=None)
+
+
+class _NoCommit:
+    """
+    Połączenie wewnątrz rolled_back(): begin/commit/rollback serwisów nic nie robią,
+    transakcję zamyka dopiero rolled_back().
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def begin(self):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+@contextmanager
+def rolled_back():
+    """
+    with rolled_back() as conn: ...
+    Wszystkie connection() w bloku (także read_connection – kontekst jest przypięty do primary)
+    dostają jedno połączenie w jednej transakcji, cofanej po wyjściu z bloku – również po sukcesie.
+    Dla diagnostyki, która przechodzi ścieżki zapisu, ale nie może nic zapisać (query_plans).
+    """
+    from todo.services import replicas
+
+    shared = _shared.get()
+    if shared is not None:
+        yield shared
+        return
+
+    with get_pool().connection() as conn:
+        conn.begin()
+        shared = _NoCommit(conn)
+        token, pin = _shared.set(shared), replicas.pin()
+        try:
+            yield shared
+        finally:
+            replicas.unpin(pin)
+            _shared.reset(token)
+            conn.rollback()
+
+
+def connection():
+    """
+    with connection() as conn: ...
+    Wypożycza połączenie z globalnej puli i oddaje je po wyjściu z bloku
+    (w bloku rolled_back() – jego wspólne połączenie).
+    """
+    shared = _shared.get()
+    if shared is not None:
+        return nullcontext(shared)
+    return get_pool().connection()
+
+
+def pool_stats() -> dict:
+    if _pool is None:
+        return {}
+    return _pool.stats()
+
+
+metrics.register("mysql_pool", pool_stats)
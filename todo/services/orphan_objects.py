@@ -0,0 +1,109 @@
+"""
+Obiekty S3 bez załącznika (sieroty): pliki tasków usuniętych przez raw SQL przed deduplikacją
+(attachment_store), wysyłki przerwane po uploadzie, bezpośrednie uploady bez potwierdzenia.
+
+collect_orphans() idzie po buckecie stronami list_objects_v2 (rosnąco po kluczu), każdą stronę
+porównuje zbiorowo z bazą (jedno zapytanie na użytkownika w stronie) i kasuje sieroty jednym
+delete_objects. W pamięci jest najwyżej jedna strona, a ostatni sprawdzony klucz pozwala
+przerwać przebieg i wznowić go później.
+"""
+import logging
+import re
+from datetime import timedelta
+
+from django.utils import timezone
+
+from todo.services import oss
+from todo.services.mysql_pool import connection
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "uploads/"
+# Klucze z oss.safe_object_key; innych obiektów w buckecie nie ruszamy.
+_KEY_RE = re.compile(r"^uploads/user_(\d+)/(?:task_(\d+)/)?[^/]+$")
+
+
+def _referenced(cur, *, user_id: int, keys: list[str], task_ids: set[int]) -> set[str]:
+    """
+    Klucze wskazywane przez załączniki tasków użytkownika, jego stored_objects (obiekt po
+    deduplikacji ma w kluczu task pierwszego uploadu, a używają go też inne taski) albo przez
+    załączniki tasków z klucza (task przepięty do innego użytkownika w adminie).
+    """
+    placeholders = ", ".join(["%s"] * len(keys))
+    sql = f"""
+        SELECT a.object_key FROM attachments a
+        JOIN tasks t ON t.id = a.task_id
+        WHERE t.user_id=%s AND a.object_key IN ({placeholders})
+        UNION
+        SELECT object_key FROM stored_objects
+        WHERE user_id=%s AND object_key IN ({placeholders})
+    """
+    params = [user_id, *keys, user_id, *keys]
+    if task_ids:
+        sql += f"""
+        UNION
+        SELECT object_key FROM attachments
+        WHERE task_id IN ({", ".join(["%s"] * len(task_ids))}) AND object_key IN ({placeholders})
+        """
+        params += [*sorted(task_ids), *keys]
+    cur.execute(sql, params)
+    return {row["object_key"] for row in cur.fetchall()}
+
+
+def collect_orphans(
+    *,
+    grace: timedelta,
+    start_after: str | None = None,
+    dry_run: bool = False,
+    page_size: int = oss.DELETE_BATCH_SIZE,
+    max_pages: int | None = None,
+    on_page=None,
+) -> dict:
+    """
+    Kasuje obiekty pod uploads/ bez załącznika, starsze niż `grace`. start_after wznawia
+    przebieg za tym kluczem; on_page(klucz) dostaje ostatni sprawdzony klucz po każdej stronie
+    (checkpoint). dry_run tylko liczy. Zwraca statystyki przebiegu z last_key.
+    """
+    page_size = max(1, min(page_size, oss.DELETE_BATCH_SIZE))
+    cutoff = timezone.now() - grace
+    stats = {"pages": 0, "scanned": 0, "skipped": 0, "orphans": 0, "deleted": 0, "failed": 0, "last_key": start_after}
+
+    for page in oss.list_objects(prefix=PREFIX, start_after=start_after, page_size=page_size):
+        if not page:
+            continue
+
+        candidates = {}
+        for obj in page:
+            match = _KEY_RE.match(obj["Key"])
+            if match is None or obj["LastModified"] > cutoff:
+                stats["skipped"] += 1
+                continue
+            keys, task_ids = candidates.setdefault(int(match[1]), ([], set()))
+            keys.append(obj["Key"])
+            if match[2]:
+                task_ids.add(int(match[2]))
+
+        orphans = []
+        if candidates:
+            with connection() as conn:
+                with conn.cursor() as cur:
+                    for user_id, (keys, task_ids) in candidates.items():
+                        referenced = _referenced(cur, user_id=user_id, keys=keys, task_ids=task_ids)
+                        orphans += [key for key in keys if key not in referenced]
+
+        if orphans and not dry_run:
+            failed = oss.delete_objects(orphans)
+            stats["deleted"] += len(orphans) - len(failed)
+            stats["failed"] += len(failed)
+
+        stats["pages"] += 1
+        stats["scanned"] += len(page)
+        stats["orphans"] += len(orphans)
+        stats["last_key"] = page[-1]["Key"]
+        logger.info("Sieroty S3: strona %s, %s z %s kluczy do %s", stats["pages"], len(orphans), len(page), stats["last_key"])
+        if on_page is not None:
+            on_page(stats["last_key"])
+        if max_pages and stats["pages"] >= max_pages:
+            break
+
+    return stats
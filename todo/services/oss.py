@@ -1,44 +1,264 @@
+import logging
 import os
+import threading
+import time
 import uuid
 import re
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.client import Config
+from botocore.exceptions import ClientError
+from django.conf import settings
+
+from todo.services import metrics
+from todo.services.instrumentation import instrument_s3_client
+
+logger = logging.getLogger(__name__)
 
 S3_ENDPOINT = os.environ["S3_ENDPOINT"]
 S3_BUCKET = os.environ["S3_BUCKET"]
 
-def safe_object_key(*, user_id: int, task_id: int, filename: str) -> str:
+def safe_object_key(*, user_id: int, task_id: int | None, filename: str) -> str:
     name = filename or "file"
     name = name.replace("\\", "/").split("/")[-1]
     name = re.sub(r"[^a-zA-Z0-9._-]+", "_", name)
     token = uuid.uuid4().hex[:10]
+    # Bez task_id (plik wysyłany do S3 jeszcze w trakcie odbioru requestu, przed INSERT-em taska).
+    if task_id is None:
+        return f"uploads/user_{user_id}/{token}_{name}"
     return f"uploads/user_{user_id}/task_{task_id}/{token}_{name}"
 
-def _client():
-    return boto3.client(
-        "s3",
-        endpoint_url=S3_ENDPOINT,
-        aws_access_key_id=os.environ["S3_ACCESS_KEY"],
-        aws_secret_access_key=os.environ["S3_SECRET_KEY"],
-        config=Config(signature_version="s3v4"),
-    )
+_client_lock = threading.Lock()
+_s3_client = None
+
+def get_client():
+    """
+    Jeden klient S3 na proces, tworzony leniwie. Budowa klienta (parsowanie modelu
+    usługi botocore) kosztuje dziesiątki ms i kilka MB, a wspólny klient trzyma
+    pulę połączeń keep-alive do endpointu OVH. Klienty boto3 są thread-safe,
+    sesje nie – dlatego sesję tworzymy pod lockiem.
+    """
+    global _s3_client
+    if _s3_client is None:
+        with _client_lock:
+            if _s3_client is None:
+                session = boto3.session.Session()
+                _s3_client = session.client(
+                    "s3",
+                    endpoint_url=S3_ENDPOINT,
+                    aws_access_key_id=os.environ["S3_ACCESS_KEY"],
+                    aws_secret_access_key=os.environ["S3_SECRET_KEY"],
+                    config=Config(
+                        signature_version="s3v4",
+                        max_pool_connections=getattr(settings, "S3_MAX_POOL_CONNECTIONS", 32),
+                    ),
+                )
+                instrument_s3_client(_s3_client)
+    return _s3_client
 
 def make_bucket_public_read() -> None:
     """
     Jednorazowo – ustawia bucket ACL na public-read.
     """
-    s3 = _client()
+    s3 = get_client()
     s3.put_bucket_acl(Bucket=S3_BUCKET, ACL="public-read")
 
-def upload_fileobj(*, fileobj, object_key: str, content_type: str | None = None) -> str:
-    s3 = _client()
+def public_url(object_key: str) -> str:
+    return f"https://{S3_BUCKET}.s3.waw.io.cloud.ovh.net/{object_key}"
+
+def transfer_config() -> TransferConfig:
+    """
+    Parametry multipart uploadu z settings (S3_MULTIPART_*, S3_MAX_CONCURRENCY).
+    """
+    return TransferConfig(
+        multipart_threshold=getattr(settings, "S3_MULTIPART_THRESHOLD", 8 * 1024 * 1024),
+        multipart_chunksize=getattr(settings, "S3_MULTIPART_CHUNKSIZE", 16 * 1024 * 1024),
+        max_concurrency=getattr(settings, "S3_MAX_CONCURRENCY", 8),
+        use_threads=True,
+    )
+
+_stats_lock = threading.Lock()
+_upload_stats = {"uploads": 0, "bytes": 0, "seconds": 0.0, "last_bytes_per_second": 0.0}
 
+def _record_upload(object_key: str, size: int | None, seconds: float) -> None:
+    rate = size / seconds if size and seconds > 0 else 0.0
+    with _stats_lock:
+        _upload_stats["uploads"] += 1
+        _upload_stats["bytes"] += size or 0
+        _upload_stats["seconds"] += seconds
+        _upload_stats["last_bytes_per_second"] = rate
+    logger.info("S3 upload %s: %s B w %.2f s (%.1f MB/s)", object_key, size, seconds, rate / 1024 / 1024)
+
+def upload_stats() -> dict:
+    with _stats_lock:
+        return dict(_upload_stats)
+
+metrics.register("s3_uploads", upload_stats)
+
+def _extra_args(content_type: str | None) -> dict:
     extra = {
         "ACL": "public-read",
     }
     if content_type:
         extra["ContentType"] = content_type
+    return extra
 
-    s3.upload_fileobj(fileobj, S3_BUCKET, object_key, ExtraArgs=extra)
+def upload_fileobj(*, fileobj, object_key: str, content_type: str | None = None) -> str:
+    s3 = get_client()
 
-    return f"https://{S3_BUCKET}.s3.waw.io.cloud.ovh.net/{object_key}"
+    size = getattr(fileobj, "size", None)
+    started = time.monotonic()
+    s3.upload_fileobj(fileobj, S3_BUCKET, object_key, ExtraArgs=_extra_args(content_type), Config=transfer_config())
+    _record_upload(object_key, size, time.monotonic() - started)
+
+    return public_url(object_key)
+
+def upload_file(*, path: str, object_key: str, content_type: str | None = None) -> str:
+    """
+    Wysyła plik z dysku. Przy multiparcie każdy wątek czyta swoją część pliku
+    niezależnie, więc części lecą równolegle bez buforowania całości w pamięci.
+    """
+    s3 = get_client()
+
+    size = os.path.getsize(path)
+    started = time.monotonic()
+    s3.upload_file(path, S3_BUCKET, object_key, ExtraArgs=_extra_args(content_type), Config=transfer_config())
+    _record_upload(object_key, size, time.monotonic() - started)
+
+    return public_url(object_key)
+
+# Minimalny rozmiar części multipart uploadu w S3 (poza ostatnią).
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+class StreamingUpload:
+    """
+    Wysyła plik do S3 kawałkami w miarę ich nadchodzenia (bez pliku tymczasowego).
+
+    Dane są buforowane do rozmiaru części (S3_MULTIPART_CHUNKSIZE); pierwsza pełna część
+    zaczyna multipart upload. Plik mniejszy niż jedna część idzie jednym PUT w complete().
+    W pamięci jest najwyżej jedna część. Po błędzie trzeba wywołać abort().
+    """
+
+    def __init__(self, *, object_key: str, content_type: str | None = None, part_size: int | None = None):
+        self.object_key = object_key
+        self.content_type = content_type
+        self.part_size = max(part_size or getattr(settings, "S3_MULTIPART_CHUNKSIZE", 16 * 1024 * 1024), MIN_PART_SIZE)
+        self.size = 0
+        self._buffer = bytearray()
+        self._upload_id = None
+        self._parts = []
+        self._started = time.monotonic()
+
+    def write(self, data: bytes) -> None:
+        self._buffer += data
+        self.size += len(data)
+        while len(self._buffer) >= self.part_size:
+            part = bytes(self._buffer[:self.part_size])
+            del self._buffer[:self.part_size]
+            self._upload_part(part)
+
+    def _upload_part(self, data: bytes) -> None:
+        s3 = get_client()
+        if self._upload_id is None:
+            self._upload_id = s3.create_multipart_upload(
+                Bucket=S3_BUCKET, Key=self.object_key, **_extra_args(self.content_type)
+            )["UploadId"]
+        number = len(self._parts) + 1
+        response = s3.upload_part(
+            Bucket=S3_BUCKET, Key=self.object_key, UploadId=self._upload_id, PartNumber=number, Body=data
+        )
+        self._parts.append({"ETag": response["ETag"], "PartNumber": number})
+
+    def complete(self) -> str:
+        s3 = get_client()
+        if self._upload_id is None:
+            s3.put_object(Bucket=S3_BUCKET, Key=self.object_key, Body=bytes(self._buffer), **_extra_args(self.content_type))
+        else:
+            if self._buffer:
+                self._upload_part(bytes(self._buffer))
+            s3.complete_multipart_upload(
+                Bucket=S3_BUCKET,
+                Key=self.object_key,
+                UploadId=self._upload_id,
+                MultipartUpload={"Parts": self._parts},
+            )
+        self._buffer = bytearray()
+        _record_upload(self.object_key, self.size, time.monotonic() - self._started)
+        return public_url(self.object_key)
+
+    def abort(self) -> None:
+        """
+        Porzuca wysyłkę. Niedokończony multipart upload jest kasowany (inaczej części zostają w buckecie).
+        """
+        self._buffer = bytearray()
+        if self._upload_id is None:
+            return
+        upload_id, self._upload_id = self._upload_id, None
+        try:
+            get_client().abort_multipart_upload(Bucket=S3_BUCKET, Key=self.object_key, UploadId=upload_id)
+        except Exception:
+            logger.exception("Nie udało się przerwać multipart uploadu %s", self.object_key)
+
+def presigned_post(*, object_key: str, content_type: str, max_size: int, expires: int = 600) -> dict:
+    """
+    Formularz POST do wysłania pliku prosto z przeglądarki do bucketu.
+    Zwraca {"url": ..., "fields": {...}} – pola trzeba wysłać przed plikiem.
+    """
+    s3 = get_client()
+    return s3.generate_presigned_post(
+        Bucket=S3_BUCKET,
+        Key=object_key,
+        Fields={"acl": "public-read", "Content-Type": content_type},
+        Conditions=[
+            {"acl": "public-read"},
+            {"Content-Type": content_type},
+            ["content-length-range", 1, max_size],
+        ],
+        ExpiresIn=expires,
+    )
+
+def head_object(object_key: str) -> dict | None:
+    """
+    Metadane obiektu (ContentLength, ContentType, ...) albo None, jeśli go nie ma.
+    """
+    s3 = get_client()
+    try:
+        return s3.head_object(Bucket=S3_BUCKET, Key=object_key)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise
+
+def delete_object(object_key: str) -> None:
+    s3 = get_client()
+    s3.delete_object(Bucket=S3_BUCKET, Key=object_key)
+
+# Limit S3 na liczbę kluczy w jednym delete_objects.
+DELETE_BATCH_SIZE = 1000
+
+def list_objects(*, prefix: str, start_after: str | None = None, page_size: int = 1000):
+    """
+    Strony listingu bucketu (list_objects_v2, rosnąco po kluczu) – generator list słowników
+    z Key, LastModified i Size. start_after wznawia listing za podanym kluczem.
+    """
+    params = {"Bucket": S3_BUCKET, "Prefix": prefix, "PaginationConfig": {"PageSize": page_size}}
+    if start_after:
+        params["StartAfter"] = start_after
+    for page in get_client().get_paginator("list_objects_v2").paginate(**params):
+        yield page.get("Contents", [])
+
+def delete_objects(object_keys: list[str]) -> list[str]:
+    """
+    Kasuje do DELETE_BATCH_SIZE obiektów jednym zapytaniem. Zwraca klucze, których nie udało się skasować.
+    """
+    if not object_keys:
+        return []
+    if len(object_keys) > DELETE_BATCH_SIZE:
+        raise ValueError(f"Najwyżej {DELETE_BATCH_SIZE} kluczy naraz")
+    response = get_client().delete_objects(
+        Bucket=S3_BUCKET,
+        Delete={"Objects": [{"Key": key} for key in object_keys], "Quiet": True},
+    )
+    for error in response.get("Errors", []):
+        logger.warning("S3 nie skasowało %s: %s", error.get("Key"), error.get("Message"))
+    return [error["Key"] for error in response.get("Errors", [])]
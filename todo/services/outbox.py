@@ -0,0 +1,195 @@
+"""
+Transakcyjny outbox: efekt uboczny zmiany (np. konto użytkownika w OVH) zapisany jako wiersz
+tabeli outbox w tej samej transakcji co sama zmiana i wykonany później przez relay
+(manage.py relay_outbox) – paczkami, z ponawianiem po błędzie. Gdy handler odrzuci paczkę,
+relay dzieli ją na połowy aż do pojedynczych wiadomości: jedna zła wiadomość nie blokuje reszty.
+Wiadomość po OUTBOX_MAX_ATTEMPTS nieudanych próbach dostaje dead_at i relay już jej nie bierze.
+
+Wiadomość może zostać obsłużona więcej niż raz (awaria relay między handlerem a usunięciem
+wiersza), więc handlery z HANDLERS muszą być idempotentne. Dostają listę payloadów jednego tematu.
+"""
+import json
+import logging
+import threading
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from todo.models import OutboxMessage
+from todo.services import metrics
+from todo.services.mysql_pool import connection
+
+logger = logging.getLogger(__name__)
+
+HANDLERS = {
+    "ovh_user": "todo.services.ovh_users.provision_users",
+}
+
+_lock = threading.Lock()
+_counters = {"batches": 0, "claimed": 0, "delivered": 0, "failed": 0, "dead": 0}
+
+
+def outbox_stats() -> dict:
+    with _lock:
+        return dict(_counters)
+
+
+metrics.register("outbox", outbox_stats)
+
+
+def enqueue(topic: str, payload: dict) -> OutboxMessage:
+    """
+    Dopisuje wiadomość do outboxa. Wywoływać wewnątrz transaction.atomic() razem ze zmianą,
+    której dotyczy – wtedy obie są zapisane albo żadna.
+    """
+    if topic not in HANDLERS:
+        raise ValueError(f"Nieznany temat outboxa: {topic}")
+    return OutboxMessage.objects.create(topic=topic, payload=payload)
+
+
+def claim(*, worker: str, limit: int, claim_ttl: int) -> list[dict]:
+    """
+    Rezerwuje do `limit` gotowych wiadomości dla tego workera (jak reminders.claim_due:
+    warunkowy UPDATE z tokenem, na MySQL dodatkowo FOR UPDATE SKIP LOCKED).
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=claim_ttl)
+    token = f"{worker}:{uuid.uuid4().hex[:12]}"
+
+    with connection() as conn:
+        skip_locked = "FOR UPDATE SKIP LOCKED" if getattr(conn, "vendor", "mysql") == "mysql" else ""
+        try:
+            conn.begin()
+            with conn.cursor() as cur:
+                cur.execute(
+                    f"""
+                    SELECT id FROM outbox
+                    WHERE dead_at IS NULL
+                      AND available_at <= %s
+                      AND (claimed_at IS NULL OR claimed_at < %s)
+                    ORDER BY available_at
+                    LIMIT %s
+                    {skip_locked}
+                    """,
+                    (now, stale, limit),
+                )
+                ids = [r["id"] for r in cur.fetchall()]
+                if not ids:
+                    conn.commit()
+                    return []
+
+                placeholders = ", ".join(["%s"] * len(ids))
+                cur.execute(
+                    f"""
+                    UPDATE outbox SET claimed_by=%s, claimed_at=%s
+                    WHERE id IN ({placeholders})
+                      AND (claimed_at IS NULL OR claimed_at < %s)
+                    """,
+                    (token, now, *ids, stale),
+                )
+                cur.execute(
+                    f"""
+                    SELECT id, topic, payload, attempts FROM outbox
+                    WHERE claimed_by=%s AND id IN ({placeholders})
+                    ORDER BY id
+                    """,
+                    (token, *ids),
+                )
+                rows = cur.fetchall()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    for row in rows:
+        if isinstance(row["payload"], (str, bytes)):
+            row["payload"] = json.loads(row["payload"])
+    return rows
+
+
+def _delete(ids: list[int]) -> None:
+    if not ids:
+        return
+    placeholders = ", ".join(["%s"] * len(ids))
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(f"DELETE FROM outbox WHERE id IN ({placeholders})", ids)
+        conn.commit()
+
+
+def _retry_later(row: dict, error: str) -> bool:
+    """
+    Odkłada nieudaną wiadomość: odstęp rośnie wykładniczo z liczbą prób, najwyżej
+    OUTBOX_RETRY_MAX_SECONDS. Zwraca True, gdy to była ostatnia próba (dead letter).
+    """
+    now = timezone.now()
+    attempts = row["attempts"] + 1
+    dead = attempts >= getattr(settings, "OUTBOX_MAX_ATTEMPTS", 15)
+    delay = min(2 ** min(attempts, 20), getattr(settings, "OUTBOX_RETRY_MAX_SECONDS", 3600))
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                UPDATE outbox
+                SET attempts=attempts + 1, available_at=%s, last_error=%s, dead_at=%s, claimed_by=NULL, claimed_at=NULL
+                WHERE id=%s
+                """,
+                (now + timedelta(seconds=delay), error[:2000], now if dead else None, row["id"]),
+            )
+        conn.commit()
+    if dead:
+        logger.error("Outbox: wiadomość %s #%s porzucona po %s próbach: %s", row["topic"], row["id"], attempts, error)
+    return dead
+
+
+def _deliver(handler, rows: list[dict]) -> tuple[list[int], list[tuple[dict, str]]]:
+    """
+    Handler na całej paczce; po błędzie osobno na każdej połowie, aż do pojedynczych wiadomości.
+    Zwraca (id obsłużonych, [(nieudana wiadomość, błąd)]).
+    """
+    try:
+        handler([row["payload"] for row in rows])
+    except Exception as e:
+        if len(rows) == 1:
+            logger.exception("Outbox: nie udało się obsłużyć wiadomości %s #%s", rows[0]["topic"], rows[0]["id"])
+            return [], [(rows[0], f"{type(e).__name__}: {e}")]
+        middle = len(rows) // 2
+        first, second = _deliver(handler, rows[:middle]), _deliver(handler, rows[middle:])
+        return first[0] + second[0], first[1] + second[1]
+    return [row["id"] for row in rows], []
+
+
+def run_once(*, worker: str, batch_size: int | None = None, claim_ttl: int | None = None) -> int:
+    """
+    Jedna paczka: rezerwacja, handler na temat (cała lista payloadów naraz, po błędzie połowami),
+    usunięcie obsłużonych, odłożenie nieudanych. Zwraca liczbę zarezerwowanych wiadomości.
+    """
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    claim_ttl = claim_ttl or settings.OUTBOX_CLAIM_TTL
+
+    rows = claim(worker=worker, limit=batch_size, claim_ttl=claim_ttl)
+    if not rows:
+        return 0
+
+    by_topic = {}
+    for row in rows:
+        by_topic.setdefault(row["topic"], []).append(row)
+
+    delivered, failed = [], []
+    for topic, topic_rows in by_topic.items():
+        topic_delivered, topic_failed = _deliver(import_string(HANDLERS[topic]), topic_rows)
+        delivered += topic_delivered
+        failed += topic_failed
+    _delete(delivered)
+    dead = sum(_retry_later(row, error) for row, error in failed)
+
+    with _lock:
+        _counters["batches"] += 1
+        _counters["claimed"] += len(rows)
+        _counters["delivered"] += len(delivered)
+        _counters["failed"] += len(failed)
+        _counters["dead"] += dead
+    return len(rows)
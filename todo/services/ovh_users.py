@@ -1,48 +1,49 @@
-import os
-import pymysql
-
-def _conn():
-    host = os.environ["OVH_MYSQL_HOST"]
-    port = int(os.environ.get("OVH_MYSQL_PORT", "20184"))
-    user = os.environ["OVH_MYSQL_USER"]
-    password = os.environ["OVH_MYSQL_PASSWORD"]
-    db = os.environ["OVH_MYSQL_DB"]
-
-    return pymysql.connect(
-        host=host,
-        port=port,
-        user=user,
-        password=password,
-        database=db,
-        charset="utf8mb4",
-        cursorclass=pymysql.cursors.DictCursor,
-        autocommit=True,
-        ssl={"ssl-mode": "REQUIRED"},
-        connect_timeout=5,
-        read_timeout=10,
-        write_timeout=10,
-    )
+from django.utils import timezone
 
+from todo.services import outbox
+from todo.services.mysql_pool import connection
 
-def ensure_ovh_user(django_user_id: int, email: str, password_hash: str):
+
+def enqueue_ovh_user(user) -> None:
+    """
+    Zleca założenie konta w OVH dla nowego użytkownika Django (outbox, manage.py relay_outbox).
+    Wywoływać w transakcji rejestracji – rejestracja nie czeka na drugą bazę.
+    """
+    outbox.enqueue("ovh_user", {"id": user.id, "mail": user.mail, "password_hash": user.password})
+
+
+def provision_users(payloads: list[dict]) -> None:
     """
     Zakładam, że w OVH masz tabelę `users` gdzie id jest INT.
     Chcemy żeby OVH users.id == Django user.id (żeby FK działał prosto).
+
+    Jeden wielowierszowy INSERT na paczkę; istniejące konta zostają bez zmian,
+    więc ponowne wykonanie tej samej paczki (relay po awarii) jest bezpieczne.
+    """
+    if not payloads:
+        return
+
+    now = timezone.now()
+    values = ", ".join(["(%s, %s, %s, %s)"] * len(payloads))
+    params = [v for p in payloads for v in (p["id"], p["mail"], p["password_hash"], now)]
+    with connection() as conn:
+        on_duplicate = (
+            "ON CONFLICT DO NOTHING" if getattr(conn, "vendor", "mysql") == "sqlite" else "ON DUPLICATE KEY UPDATE id = id"
+        )
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    f"INSERT INTO users (id, mail, password_hash, created_at) VALUES {values} {on_duplicate}",
+                    params,
+                )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+def ensure_ovh_user(django_user_id: int, email: str, password_hash: str):
+    """
+    Synchronicznie, jednym zapytaniem (np. z shella albo skryptów); rejestracja używa enqueue_ovh_user.
     """
-    conn = _conn()
-    try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT id FROM users WHERE id=%s LIMIT 1", (django_user_id,))
-            row = cur.fetchone()
-            if row:
-                return
-
-            cur.execute(
-                """
-                INSERT INTO users (id, mail, password_hash, created_at)
-                VALUES (%s, %s, %s, NOW())
-                """,
-                (django_user_id, email, password_hash),
-            )
-    finally:
-        conn.close()
+    provision_users([{"id": django_user_id, "mail": email, "password_hash": password_hash}])
@@ -0,0 +1,191 @@
+"""
+Kontrola planów zapytań serwisów tasków i przypomnień (manage.py check_query_plans, testy).
+
+run_workload() przechodzi każdą ścieżkę SQL z task_read_sql_service, task_sql_service,
+task_sync_service i reminders; wykonane zapytania zbiera instrumentation.capture_queries(), a check()
+puszcza na każdym EXPLAIN i zgłasza pełne skany tabel oraz sortowanie poza indeksem
+(MySQL: type ALL/index, "Using filesort"; SQLite: SCAN tabeli, TEMP B-TREE dla ORDER BY).
+Całość (tymczasowy użytkownik, jego taski i EXPLAIN-y) idzie w jednej transakcji mysql_pool.rolled_back(),
+więc kontrola nic w bazie nie zostawia.
+"""
+import re
+import uuid
+from datetime import datetime, timezone as dt_timezone
+
+from django.utils import timezone
+
+from todo.services import attachment_store, orphan_objects, reminders, task_sync_service, task_transfer
+from todo.services.instrumentation import capture_queries, sql_fingerprint
+from todo.services.mysql_pool import connection, rolled_back
+from todo.services.task_read_sql_service import _STRATEGIES, list_tasks_with_attachments, search_tasks_page
+from todo.services.task_sql_service import (
+    add_attachment_sql,
+    bulk_delete_sql,
+    bulk_move_sql,
+    bulk_set_status_sql,
+    create_task_sql,
+    delete_task_sql,
+    get_tasks_sql,
+    update_task_sql,
+)
+
+FULL_SCAN = "pełny skan"
+FILESORT = "sortowanie poza indeksem"
+
+# Świadome wyjątki: (fragment SQL, problem). Ranking trafności liczy silnik pełnotekstowy,
+# więc wyniki wyszukiwania (strona + 1 wiersz po LIMIT) są sortowane osobno. Strategia "join"
+# sortuje po złączeniu z załącznikami tylko ograniczoną już stronę tasków.
+ALLOWED = (
+    ("tasks_fts MATCH", FILESORT),
+    ("AGAINST (%s IN BOOLEAN MODE)", FILESORT),
+    ("LEFT JOIN attachments a ON a.task_id = t.id", FILESORT),
+)
+
+_SQLITE_SCAN = re.compile(r"^SCAN (\w+)(?: AS \w+)?(?: USING (?:COVERING )?INDEX \w+)?$")
+
+
+def _temporary_user(conn) -> int:
+    # Konto nieaktywne; i tak znika z rollbackiem rolled_back().
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO users (mail, password, created_at, is_active, is_staff, is_superuser)
+            VALUES (%s, '!', %s, 0, 0, 0)
+            """,
+            (f"explain-{uuid.uuid4().hex[:12]}@fomo.invalid", timezone.now()),
+        )
+        return cur.lastrowid
+
+
+def run_workload() -> None:
+    """
+    Tworzy tymczasowego użytkownika i kilka jego tasków, przechodzi na nich wszystkie zapytania
+    serwisów i je usuwa. Wszystko w transakcji rolled_back() – po wyjściu baza jest jak przed.
+    """
+    with rolled_back() as conn:
+        _workload(user_id=_temporary_user(conn))
+
+
+def _workload(*, user_id: int) -> None:
+    groups = ("Praca", "Praca", "Rodzina")
+    ids = [
+        create_task_sql(user_id=user_id, title=f"Plan {i}", description="explain", group=group, status="todo")
+        for i, group in enumerate(groups)
+    ]
+    get_tasks_sql(user_id)
+
+    for strategy in _STRATEGIES:
+        first = list_tasks_with_attachments(user_id=user_id, limit=2, strategy=strategy)
+        key = (first[-1]["created_at"], first[-1]["id"])
+        list_tasks_with_attachments(user_id=user_id, group="Praca", limit=2, strategy=strategy)
+        list_tasks_with_attachments(user_id=user_id, after=key, limit=2, strategy=strategy)
+        list_tasks_with_attachments(user_id=user_id, group="Praca", before=key, limit=2, strategy=strategy)
+
+    _, after = task_transfer.fetch_batch(user_id=user_id, limit=1)
+    task_transfer.fetch_batch(user_id=user_id, after=after, limit=1)
+
+    page = search_tasks_page(user_id=user_id, query="plan", page_size=1)
+    search_tasks_page(user_id=user_id, query="plan", group="Praca", after=page["next_cursor"], page_size=1)
+
+    update_task_sql(user_id=user_id, task_id=ids[0], title="Plan", description="", group="Praca", status="todo")
+    for _ in range(2):
+        # Drugie wywołanie idzie ścieżką "załącznik już jest".
+        add_attachment_sql(
+            user_id=user_id, task_id=ids[0], filename="plan.txt", object_key=f"explain/{ids[0]}", file_url=""
+        )
+    bulk_set_status_sql(user_id=user_id, task_ids=ids, status="in_progress")
+    bulk_move_sql(user_id=user_id, task_ids=ids, group="Ważne")
+
+    # Najwcześniejsze możliwe remind_at: claim_due (ORDER BY remind_at) bierze najpierw taski workloadu.
+    placeholders = ", ".join(["%s"] * len(ids))
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"UPDATE tasks SET remind_at=%s WHERE user_id=%s AND id IN ({placeholders})",
+                (datetime(1970, 1, 1, tzinfo=dt_timezone.utc), user_id, *ids),
+            )
+        conn.commit()
+    claimed = [r["id"] for r in reminders.claim_due(worker="explain", limit=len(ids), claim_ttl=60)]
+    reminders._mark_sent([task_id for task_id in claimed if task_id in ids])
+    with connection() as conn:
+        with conn.cursor() as cur:
+            orphan_objects._referenced(cur, user_id=user_id, keys=[f"explain/{ids[0]}", "explain/x"], task_ids={ids[0]})
+
+    delete_task_sql(user_id=user_id, task_id=ids[0])
+    bulk_delete_sql(user_id=user_id, task_ids=ids[1:])
+    attachment_store.collect(user_id=user_id)
+
+    task_sync_service.get_changes(user_id=user_id, limit=1)
+    since = task_sync_service.encode_sync_cursor(timezone.now(), timezone.now(), ids[0], 0)
+    task_sync_service.get_changes(user_id=user_id, since=since, limit=1)
+
+
+def collect() -> list[tuple[str, tuple]]:
+    """
+    Zapytania z run_workload() do sprawdzenia: bez powtórzeń (po odcisku) i bez INSERT ... VALUES.
+    Wołane w rolled_back() – EXPLAIN widzi wtedy jeszcze dane workloadu.
+    """
+    with capture_queries() as queries:
+        run_workload()
+
+    unique = {}
+    for sql, params in queries:
+        if re.match(r"\s*INSERT\b", sql, re.I) and not re.search(r"\bSELECT\b", sql, re.I):
+            continue
+        unique.setdefault(sql_fingerprint(sql), (sql, params))
+    return list(unique.values())
+
+
+def _mysql_problems(rows: list[dict]) -> set[str]:
+    problems = set()
+    for row in rows:
+        # <derivedN>, <subqueryN> – wynik podzapytania, już ograniczony LIMIT-em.
+        if (row.get("table") or "<").startswith("<"):
+            continue
+        if row.get("type") in ("ALL", "index"):
+            problems.add(FULL_SCAN)
+        if "Using filesort" in (row.get("Extra") or ""):
+            problems.add(FILESORT)
+    return problems
+
+
+def _sqlite_problems(rows: list[dict], tables: set[str]) -> set[str]:
+    problems = set()
+    for row in rows:
+        detail = row["detail"]
+        scan = _SQLITE_SCAN.match(detail)
+        # SCAN podzapytania (alias spoza listy tabel) to przejście po już ograniczonym wyniku.
+        if scan and scan.group(1) in tables:
+            problems.add(FULL_SCAN)
+        if detail == "USE TEMP B-TREE FOR ORDER BY":
+            problems.add(FILESORT)
+    return problems
+
+
+def explain(conn, sql: str, params: tuple) -> set[str]:
+    """
+    Problemy planu zapytania (FULL_SCAN, FILESORT) na danym połączeniu z puli.
+    """
+    with conn.cursor() as cur:
+        if getattr(conn, "vendor", "mysql") == "sqlite":
+            cur.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+            tables = {r["name"] for r in cur.fetchall()}
+            cur.execute("EXPLAIN QUERY PLAN " + sql, params)
+            return _sqlite_problems(cur.fetchall(), tables)
+        cur.execute("EXPLAIN " + sql, params)
+        return _mysql_problems(cur.fetchall())
+
+
+def check() -> dict[str, set[str]]:
+    """
+    Odcisk zapytania -> problemy planu, tylko dla zapytań z problemami (poza ALLOWED).
+    Niczego nie zapisuje (rolled_back()).
+    """
+    failures = {}
+    with rolled_back() as conn:
+        for sql, params in collect():
+            problems = explain(conn, sql, params)
+            problems -= {problem for fragment, problem in ALLOWED if fragment in sql}
+            if problems:
+                failures[sql_fingerprint(sql)] = problems
+    return failures
@@ -0,0 +1,198 @@
+import logging
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+
+from todo.services import metrics
+from todo.services.mysql_pool import connection
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_counters = {
+    "batches": 0,
+    "claimed": 0,
+    "sent": 0,
+    "failed": 0,
+    "abandoned": 0,
+    "last_batch_seconds": 0.0,
+    "last_messages_per_second": 0.0,
+    "last_lag_seconds": 0.0,
+    "max_lag_seconds": 0.0,
+}
+
+
+def reminder_stats() -> dict:
+    with _lock:
+        return dict(_counters)
+
+
+metrics.register("reminders", reminder_stats)
+
+
+def _naive(value):
+    # pymysql oddaje naiwne daty w UTC, Django daje świadome – porównujemy bez strefy.
+    return value.replace(tzinfo=None) if value is not None and value.tzinfo else value
+
+
+def claim_due(*, worker: str, limit: int, claim_ttl: int, max_attempts: int | None = None) -> list[dict]:
+    """
+    Rezerwuje do `limit` zaległych przypomnień dla tego workera i je zwraca.
+    Każda rezerwacja zwiększa reminder_attempts; przypomnień po max_attempts próbach nie bierzemy.
+
+    Skan idzie po indeksie (reminder_sent_at, remind_at): sent_at IS NULL + zakres remind_at <= now.
+    Rezerwacja to warunkowy UPDATE z unikalnym tokenem – wiersz zajęty przez inny
+    worker (claim młodszy niż claim_ttl) nie zostanie nadpisany, więc kilka workerów
+    może działać równolegle. Na MySQL dodatkowo FOR UPDATE SKIP LOCKED, żeby workery
+    nie czekały na siebie nawzajem przy wyborze kandydatów.
+    """
+    max_attempts = max_attempts or settings.REMINDER_MAX_ATTEMPTS
+    now = timezone.now()
+    stale = now - timedelta(seconds=claim_ttl)
+    token = f"{worker}:{uuid.uuid4().hex[:12]}"
+
+    with connection() as conn:
+        skip_locked = "FOR UPDATE SKIP LOCKED" if getattr(conn, "vendor", "mysql") == "mysql" else ""
+        try:
+            conn.begin()
+            with conn.cursor() as cur:
+                cur.execute(
+                    f"""
+                    SELECT id FROM tasks
+                    WHERE reminder_sent_at IS NULL
+                      AND remind_at <= %s
+                      AND status NOT IN ('done', 'archived')
+                      AND (reminder_claimed_at IS NULL OR reminder_claimed_at < %s)
+                      AND reminder_attempts < %s
+                    ORDER BY remind_at
+                    LIMIT %s
+                    {skip_locked}
+                    """,
+                    (now, stale, max_attempts, limit),
+                )
+                ids = [r["id"] for r in cur.fetchall()]
+                if not ids:
+                    conn.commit()
+                    return []
+
+                placeholders = ", ".join(["%s"] * len(ids))
+                cur.execute(
+                    f"""
+                    UPDATE tasks
+                    SET reminder_claimed_by=%s, reminder_claimed_at=%s, reminder_attempts=reminder_attempts + 1
+                    WHERE id IN ({placeholders})
+                      AND reminder_sent_at IS NULL
+                      AND (reminder_claimed_at IS NULL OR reminder_claimed_at < %s)
+                    """,
+                    (token, now, *ids, stale),
+                )
+                cur.execute(
+                    """
+                    SELECT t.id, t.title, t.description, t.`group`, t.remind_at, t.reminder_attempts, u.mail
+                    FROM tasks t
+                    JOIN users u ON u.id = t.user_id
+                    WHERE t.reminder_claimed_by=%s
+                    ORDER BY t.remind_at
+                    """,
+                    (token,),
+                )
+                rows = cur.fetchall()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    return rows
+
+
+def _message(row: dict) -> EmailMessage:
+    body = [f"Przypomnienie o zadaniu: {row['title']}", f"Grupa: {row['group']}"]
+    if row.get("description"):
+        body += ["", row["description"]]
+    return EmailMessage(
+        subject=f"Przypomnienie: {row['title']}",
+        body="\n".join(body),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[row["mail"]],
+    )
+
+
+def _mark_sent(task_ids: list[int]) -> None:
+    if not task_ids:
+        return
+    placeholders = ", ".join(["%s"] * len(task_ids))
+    with connection() as conn:
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    f"""
+                    UPDATE tasks
+                    SET reminder_sent_at=%s, reminder_claimed_by=NULL, reminder_claimed_at=NULL
+                    WHERE id IN ({placeholders})
+                    """,
+                    (timezone.now(), *task_ids),
+                )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+def send_batch(rows: list[dict]) -> tuple[int, int]:
+    """
+    Wysyła przypomnienia jednym połączeniem SMTP (login/STARTTLS raz na paczkę).
+    Nieudane zostają zarezerwowane – wrócą do kolejki po wygaśnięciu claimu, chyba że
+    była to ostatnia z REMINDER_MAX_ATTEMPTS prób. Zwraca (wysłane, nieudane).
+    """
+    sent_ids = []
+    failed = 0
+    with get_connection(fail_silently=False) as smtp:
+        for row in rows:
+            try:
+                smtp.send_messages([_message(row)])
+                sent_ids.append(row["id"])
+            except Exception:
+                failed += 1
+                logger.exception("Nie udało się wysłać przypomnienia dla taska %s", row["id"])
+                if row["reminder_attempts"] >= settings.REMINDER_MAX_ATTEMPTS:
+                    with _lock:
+                        _counters["abandoned"] += 1
+                    logger.error("Przypomnienie dla taska %s porzucone po %s próbach", row["id"], row["reminder_attempts"])
+
+    _mark_sent(sent_ids)
+    return len(sent_ids), failed
+
+
+def run_once(*, worker: str, batch_size: int | None = None, claim_ttl: int | None = None) -> int:
+    """
+    Jedna paczka: rezerwacja + wysyłka + metryki. Zwraca liczbę zarezerwowanych przypomnień.
+    """
+    batch_size = batch_size or settings.REMINDER_BATCH_SIZE
+    claim_ttl = claim_ttl or settings.REMINDER_CLAIM_TTL
+
+    started = time.monotonic()
+    rows = claim_due(worker=worker, limit=batch_size, claim_ttl=claim_ttl)
+    if not rows:
+        return 0
+
+    lag = (_naive(timezone.now()) - _naive(rows[0]["remind_at"])).total_seconds()
+    sent, failed = send_batch(rows)
+    seconds = time.monotonic() - started
+
+    with _lock:
+        _counters["batches"] += 1
+        _counters["claimed"] += len(rows)
+        _counters["sent"] += sent
+        _counters["failed"] += failed
+        _counters["last_batch_seconds"] = seconds
+        _counters["last_messages_per_second"] = sent / seconds if seconds > 0 else 0.0
+        _counters["last_lag_seconds"] = lag
+        _counters["max_lag_seconds"] = max(_counters["max_lag_seconds"], lag)
+
+    logger.info("Przypomnienia: %s wysłanych, %s błędów w %.2f s (opóźnienie %.0f s)", sent, failed, seconds, lag)
+    return len(rows)
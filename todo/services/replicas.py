@@ -0,0 +1,180 @@
+"""
+Repliki MySQL do odczytu (OVH_MYSQL_REPLICA_HOSTS) dla serwisów raw-SQL i ORM (todo/db_router.py).
+
+Odczyty idą na repliki po kolei. Po własnym zapisie użytkownik przez READ_REPLICA_STICKY_SECONDS
+czyta z primary (read-your-writes mimo opóźnienia replikacji) – znacznik leży w cache Django,
+więc przy współdzielonym cache działa też między procesami. Niedostępna replika -> odczyt z primary,
+a replika, do której nie da się połączyć, wypada z kolejki na READ_REPLICA_RETRY_SECONDS.
+Bez skonfigurowanych replik wszystko idzie na primary jak dotąd.
+"""
+import functools
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+
+from todo.services import metrics
+from todo.services.mysql_pool import _BROKEN_ERRORS, ConnectionPool, PoolTimeout, _connect, connection
+
+_lock = threading.Lock()
+_counters = {
+    "replica_reads": 0, "primary_reads": 0, "sticky_reads": 0, "fallbacks": 0, "writes_marked": 0, "marked_down": 0,
+}
+_pools = None
+_next = itertools.count()
+# id(puli) -> time.monotonic(), do kiedy replika jest pomijana po nieudanym połączeniu.
+_down_until: dict[int, float] = {}
+
+# Request przypięty do primary (zapis w tym requeście albo świeży zapis użytkownika) – dla routera ORM.
+_pinned: ContextVar[bool] = ContextVar("fomo_pinned_to_primary", default=False)
+
+
+def _count(name: str) -> None:
+    with _lock:
+        _counters[name] += 1
+
+
+def _replica_pools() -> list[ConnectionPool]:
+    global _pools
+    if _pools is None:
+        with _lock:
+            if _pools is None:
+                port = int(getattr(settings, "OVH_MYSQL_REPLICA_PORT", 3306))
+                _pools = [
+                    ConnectionPool(
+                        functools.partial(_connect, host=host, port=port),
+                        max_size=getattr(settings, "OVH_MYSQL_POOL_SIZE", 10),
+                        max_lifetime=getattr(settings, "OVH_MYSQL_POOL_MAX_LIFETIME", 1800),
+                        max_idle=getattr(settings, "OVH_MYSQL_POOL_MAX_IDLE", 300),
+                        ping_after=getattr(settings, "OVH_MYSQL_POOL_PING_AFTER", 5),
+                        # Na replikę nie czekamy długo – primary i tak jest pod ręką.
+                        timeout=1,
+                    )
+                    for host in getattr(settings, "OVH_MYSQL_REPLICA_HOSTS", [])
+                ]
+    return _pools
+
+
+def install_replica_pools(pools: list[ConnectionPool] | None) -> list[ConnectionPool] | None:
+    """
+    Podmienia pule replik (testy, benchmarki). None = odtwórz z settings przy następnym odczycie.
+    """
+    global _pools
+    with _lock:
+        previous, _pools = _pools, pools
+        _down_until.clear()
+    return previous
+
+
+def enabled() -> bool:
+    return bool(getattr(settings, "OVH_MYSQL_REPLICA_HOSTS", None)) or bool(_pools)
+
+
+def _sticky_key(user_id: int) -> str:
+    return f"replica:sticky:{user_id}"
+
+
+def mark_write(user_id: int) -> None:
+    """
+    Użytkownik właśnie zapisał – jego odczyty idą na primary przez READ_REPLICA_STICKY_SECONDS.
+    """
+    if not enabled():
+        return
+    caches["default"].set(_sticky_key(user_id), 1, timeout=getattr(settings, "READ_REPLICA_STICKY_SECONDS", 5))
+    _count("writes_marked")
+
+
+def is_sticky(user_id: int) -> bool:
+    return enabled() and caches["default"].get(_sticky_key(user_id)) is not None
+
+
+def pin(value: bool = True):
+    """
+    Przypina bieżący kontekst (request) do primary; zwraca token dla unpin().
+    """
+    return _pinned.set(value)
+
+
+def unpin(token) -> None:
+    _pinned.reset(token)
+
+
+def pinned() -> bool:
+    return _pinned.get()
+
+
+def orm_alias() -> str:
+    """
+    Alias bazy Django dla odczytu ORM: kolejna replika (replica_N w DATABASES) albo default.
+    """
+    aliases = [alias for alias in settings.DATABASES if alias.startswith("replica_")]
+    if not aliases or pinned():
+        return "default"
+    return aliases[next(_next) % len(aliases)]
+
+
+def _pick(pools: list[ConnectionPool]) -> ConnectionPool | None:
+    # Kolejna replika po kolei z pominięciem tych w przerwie; None – wszystkie w przerwie.
+    now = time.monotonic()
+    start = next(_next)
+    for i in range(len(pools)):
+        pool = pools[(start + i) % len(pools)]
+        if _down_until.get(id(pool), 0.0) <= now:
+            return pool
+    return None
+
+
+def _mark_down(pool: ConnectionPool) -> None:
+    with _lock:
+        _down_until[id(pool)] = time.monotonic() + getattr(settings, "READ_REPLICA_RETRY_SECONDS", 30)
+        _counters["marked_down"] += 1
+
+
+@contextmanager
+def read_connection(*, user_id: int | None = None):
+    """
+    with read_connection(user_id=...) as conn: ... – połączenie tylko do odczytu.
+    Replika, chyba że użytkownik niedawno zapisywał albo żadna replika nie odpowiada.
+    """
+    pools = _replica_pools()
+    if not pools or pinned() or (user_id is not None and is_sticky(user_id)):
+        _count("sticky_reads" if pools else "primary_reads")
+        with connection() as conn:
+            yield conn
+        return
+
+    pool = _pick(pools)
+    entry = None
+    if pool is not None:
+        try:
+            entry = pool.acquire()
+        except PoolTimeout:
+            pass
+        except _BROKEN_ERRORS:
+            # Padnięta replika: bez przerwy każdy odczyt czekałby na timeout połączenia.
+            _mark_down(pool)
+    if entry is None:
+        _count("fallbacks")
+        with connection() as conn:
+            yield conn
+        return
+
+    _count("replica_reads")
+    with pool.lease(entry) as conn:
+        yield conn
+
+
+def replica_stats() -> dict:
+    with _lock:
+        data = dict(_counters)
+        pools = list(_pools or [])
+    now = time.monotonic()
+    data["replicas"] = [{**pool.stats(), "down": _down_until.get(id(pool), 0.0) > now} for pool in pools]
+    return data
+
+
+metrics.register("read_replicas", replica_stats)
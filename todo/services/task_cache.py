@@ -0,0 +1,82 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from todo.services import metrics
+from todo.services.task_read_sql_service import DEFAULT_PAGE_SIZE, list_tasks_page
+
+_lock = threading.Lock()
+_counters = {"hits": 0, "misses": 0, "invalidations": 0}
+
+
+def _count(name: str) -> None:
+    with _lock:
+        _counters[name] += 1
+
+
+def _cache():
+    return caches[getattr(settings, "TASK_LIST_CACHE_ALIAS", "default")]
+
+
+def _version_key(user_id: int) -> str:
+    return f"tasklist:{user_id}:version"
+
+
+def _version(cache, user_id: int) -> int:
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # Start od znacznika czasu, nie od 1 – po wyrzuceniu klucza wersji z cache
+        # nie możemy wrócić do numeru, pod którym leżą jeszcze stare wpisy.
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate(user_id: int) -> None:
+    """
+    Unieważnia wszystkie zapamiętane strony listy użytkownika (podbija wersję).
+    Wołane przez ścieżki zapisu w task_sql_service po commicie.
+    """
+    cache = _cache()
+    try:
+        cache.incr(_version_key(user_id))
+    except ValueError:
+        cache.set(_version_key(user_id), time.time_ns(), timeout=None)
+    _count("invalidations")
+
+
+def get_task_page(
+    *,
+    user_id: int,
+    group: str | None = None,
+    after: str | None = None,
+    before: str | None = None,
+    page_size: int = DEFAULT_PAGE_SIZE,
+):
+    """
+    list_tasks_page z cache per użytkownik / grupa / kursor.
+    """
+    cache = _cache()
+    version = _version(cache, user_id)
+    key = f"tasklist:{user_id}:{version}:{group or ''}:{after or ''}:{before or ''}:{page_size}"
+
+    page = cache.get(key)
+    if page is not None:
+        _count("hits")
+        return page
+
+    _count("misses")
+    page = list_tasks_page(user_id=user_id, group=group, after=after, before=before, page_size=page_size)
+    cache.set(key, page, timeout=getattr(settings, "TASK_LIST_CACHE_TIMEOUT", 60))
+    return page
+
+
+def cache_stats() -> dict:
+    with _lock:
+        return dict(_counters)
+
+
+metrics.register("task_list_cache", cache_stats)
@@ -0,0 +1,131 @@
+"""
+Zmiany tasków na żywo (server-sent events: GET /tasks/events/, todo/async_views.py).
+
+Broker w pamięci procesu: serwisy zapisu publikują zdarzenie po commicie, a każdy otwarty
+strumień użytkownika ma własną, ograniczoną kolejkę asyncio na pętli zdarzeń ASGI. Zapisy
+z wątków (run_blocking, wysyłki w tle) przekazują zdarzenie do pętli przez call_soon_threadsafe.
+
+Zdarzenie niesie tylko akcję i id tasków – klient dociąga dane z /tasks/changes/. Dlatego trafia
+do strumienia dopiero po TASK_SYNC_SETTLE_SECONDS: wcześniej get_changes jeszcze wstrzymuje zapis.
+Nie ma powtórek: po (ponownym) połączeniu i po zdarzeniu "resync" (przepełniona kolejka)
+klient synchronizuje się od swojego kursora. Zdarzenia nie wychodzą poza proces – przy kilku
+workerach ASGI kart jednego użytkownika nie łączą, wtedy zostaje odpytywanie /tasks/changes/.
+"""
+import asyncio
+import itertools
+import json
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from todo.services import metrics
+
+_lock = threading.Lock()
+_counters = {"published": 0, "delivered": 0, "resyncs": 0}
+_subscribers: dict[int, set["Subscription"]] = {}
+_ids = itertools.count(1)
+
+RESYNC = "resync"
+
+
+def _count(name: str, n: int = 1) -> None:
+    with _lock:
+        _counters[name] += n
+
+
+class Subscription:
+    """
+    Kolejka zdarzeń jednego strumienia; get() tylko z pętli, w której powstała.
+    """
+
+    def __init__(self, user_id: int, *, max_queue: int):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.overflowed = False
+
+    def _schedule(self, event: dict, delay: float) -> None:
+        if delay > 0:
+            self.loop.call_later(delay, self._put, event)
+        else:
+            self._put(event)
+
+    def _put(self, event: dict) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Klient nie nadąża – zamiast gubić pojedyncze zdarzenia każemy mu zsynchronizować się od nowa.
+            self.overflowed = True
+
+    async def get(self, timeout: float) -> dict | None:
+        """
+        Następne zdarzenie albo None po `timeout` sekundach ciszy.
+        """
+        if self.overflowed:
+            self.overflowed = False
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            _count("resyncs")
+            return {"id": next(_ids), "action": RESYNC, "task_ids": []}
+        try:
+            event = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        _count("delivered")
+        return event
+
+
+@contextmanager
+def subscribe(user_id: int):
+    """
+    with subscribe(user_id) as sub: ... – rejestruje strumień na czas bloku (w pętli zdarzeń).
+    """
+    sub = Subscription(user_id, max_queue=getattr(settings, "TASK_EVENTS_QUEUE_SIZE", 100))
+    with _lock:
+        _subscribers.setdefault(user_id, set()).add(sub)
+    try:
+        yield sub
+    finally:
+        with _lock:
+            subs = _subscribers.get(user_id)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del _subscribers[user_id]
+
+
+def publish(user_id: int, action: str, task_ids=()) -> None:
+    """
+    Zdarzenie dla otwartych strumieni użytkownika (action: created/updated/deleted). Bezpieczne z każdego wątku.
+    Strumienie dostają je po oknie TASK_SYNC_SETTLE_SECONDS, kiedy zapis jest już widoczny w /tasks/changes/.
+    """
+    with _lock:
+        subs = list(_subscribers.get(user_id, ()))
+    if not subs:
+        return
+
+    event = {"id": next(_ids), "action": action, "task_ids": sorted({int(task_id) for task_id in task_ids})}
+    delay = getattr(settings, "TASK_SYNC_SETTLE_SECONDS", 2)
+    _count("published")
+    for sub in subs:
+        try:
+            sub.loop.call_soon_threadsafe(sub._schedule, event, delay)
+        except RuntimeError:
+            # Pętla strumienia już zamknięta (wyłączanie workera).
+            pass
+
+
+def format_sse(event: dict) -> str:
+    data = json.dumps({"action": event["action"], "task_ids": event["task_ids"]})
+    return f"id: {event['id']}\nevent: task\ndata: {data}\n\n"
+
+
+def event_stats() -> dict:
+    with _lock:
+        data = dict(_counters)
+        data["streams"] = sum(len(subs) for subs in _subscribers.values())
+    return data
+
+
+metrics.register("task_events", event_stats)
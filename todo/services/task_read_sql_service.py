@@ -1,22 +1,10 @@
-import os
-import pymysql
-
-
-def _conn():
-    return pymysql.connect(
-        host=os.environ["OVH_MYSQL_HOST"],
-        port=int(os.environ["OVH_MYSQL_PORT"]),
-        user=os.environ["OVH_MYSQL_USER"],
-        password=os.environ["OVH_MYSQL_PASSWORD"],
-        db=os.environ["OVH_MYSQL_DB"],
-        charset="utf8mb4",
-        cursorclass=pymysql.cursors.DictCursor,
-        ssl={"ssl-mode": "REQUIRED"},
-        autocommit=True,
-        connect_timeout=5,
-        read_timeout=10,
-        write_timeout=10,
-    )
+import base64
+from datetime import datetime
+
+from django.conf import settings
+
+from todo import search_index
+from todo.services.replicas import read_connection
 
 
 STATUS_LABELS = {
@@ -25,77 +13,327 @@ STATUS_LABELS = {
     "done": "Zrobione",
 }
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(created_at: datetime, task_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{task_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """
+    Odwrotność encode_cursor. Dla śmieci rzuca ValueError.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, task_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(task_id)
+    except (TypeError, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Nieprawidłowy kursor: {cursor!r}") from e
+
+
+def _task_dict(r) -> dict:
+    return {
+        "id": r["id"],
+        "user_id": r["user_id"],
+        "title": r["title"],
+        "description": r["description"],
+        "group": r["group"],
+        "status": r["status"],
+        "status_label": STATUS_LABELS.get(r["status"], r["status"]),
+        "created_at": r["created_at"],
+        "attachments": [],
+    }
+
+
+def _fetch_joined(cur, *, where: str, params: list, inner_order: str, limit_sql: str) -> list[dict]:
+    """
+    Jedno zapytanie z LEFT JOIN – dane taska powtarzają się w każdym wierszu załącznika.
+    """
+    cur.execute(
+        f"""
+        SELECT
+          t.id, t.user_id, t.title, t.description, t.`group`, t.status, t.created_at,
+          a.id AS att_id, a.filename AS att_filename, a.file_url AS att_file_url,
+          a.object_key AS att_object_key, a.status AS att_status, a.created_at AS att_created_at
+        FROM (
+          SELECT id, user_id, title, description, `group`, status, created_at
+          FROM tasks
+          WHERE {where}
+          ORDER BY {inner_order}
+          {limit_sql}
+        ) t
+        LEFT JOIN attachments a ON a.task_id = t.id
+        ORDER BY t.created_at DESC, t.id DESC, a.created_at DESC
+        """,
+        params,
+    )
+
+    rows = cur.fetchall()
+
+    tasks_by_id = {}
+    for r in rows:
+        tid = r["id"]
+        if tid not in tasks_by_id:
+            tasks_by_id[tid] = _task_dict(r)
+
+        if r.get("att_id"):
+            tasks_by_id[tid]["attachments"].append(
+                {
+                    "id": r["att_id"],
+                    "filename": r["att_filename"],
+                    "file_url": r["att_file_url"],
+                    "object_key": r["att_object_key"],
+                    "status": r["att_status"],
+                    "created_at": r["att_created_at"],
+                }
+            )
+
+    return list(tasks_by_id.values())
+
+
+def _fetch_batched(cur, *, where: str, params: list, inner_order: str, limit_sql: str) -> list[dict]:
+    """
+    Dwa zapytania: najpierw strona tasków, potem wszystkie ich załączniki
+    jednym WHERE task_id IN (...). Każdy task jest przesyłany raz.
+    """
+    cur.execute(
+        f"""
+        SELECT id, user_id, title, description, `group`, status, created_at
+        FROM tasks
+        WHERE {where}
+        ORDER BY {inner_order}
+        {limit_sql}
+        """,
+        params,
+    )
+    tasks = [_task_dict(r) for r in cur.fetchall()]
+    if inner_order.endswith("ASC"):
+        tasks.reverse()
+    return _load_attachments(cur, tasks)
+
+
+def _load_attachments(cur, tasks: list[dict]) -> list[dict]:
+    if not tasks:
+        return tasks
+
+    tasks_by_id = {t["id"]: t for t in tasks}
+    placeholders = ", ".join(["%s"] * len(tasks_by_id))
+    cur.execute(
+        f"""
+        SELECT id, task_id, filename, file_url, object_key, status, created_at
+        FROM attachments
+        WHERE task_id IN ({placeholders})
+        """,
+        list(tasks_by_id),
+    )
+    # Sortujemy tutaj: ORDER BY przy IN (...) i tak wymaga filesortu, a załączników jednej strony jest mało.
+    for a in sorted(cur.fetchall(), key=lambda a: (a["created_at"], a["id"]), reverse=True):
+        tasks_by_id[a.pop("task_id")]["attachments"].append(a)
+
+    return tasks
+
+
+_STRATEGIES = {
+    "join": _fetch_joined,
+    "batched": _fetch_batched,
+}
+
 
-def list_tasks_with_attachments(*, user_id: int, group: str | None = None):
+def list_tasks_with_attachments(
+    *,
+    user_id: int,
+    group: str | None = None,
+    after: tuple[datetime, int] | None = None,
+    before: tuple[datetime, int] | None = None,
+    limit: int | None = None,
+    strategy: str | None = None,
+):
     """
     Zwraca listę tasków jako dicty:
     {
       id, title, description, group, status, created_at,
       status_label,
-      attachments: [ {id, filename, file_url, object_key, created_at}, ... ]
+      attachments: [ {id, filename, file_url, object_key, status, created_at}, ... ]
     }
+
+    Kolejność: created_at DESC, id DESC.
+    after / before to klucz (created_at, id) – zwracamy taski starsze / nowsze od niego.
+    limit ogranicza liczbę tasków (nie wierszy JOIN-a), więc zapytanie jest ograniczone.
+    strategy: "batched" (taski + jedno IN na załączniki) albo "join" (LEFT JOIN);
+    domyślnie settings.TASK_LIST_FETCH_STRATEGY.
     """
-    conn = _conn()
-    try:
+    fetch = _STRATEGIES[strategy or getattr(settings, "TASK_LIST_FETCH_STRATEGY", "batched")]
+
+    where = ["user_id = %s"]
+    params = [user_id]
+    if group:
+        where.append("`group` = %s")
+        params.append(group)
+
+    # (created_at, id) < (x, y) rozpisane ręcznie – tak MySQL użyje range scan po indeksie.
+    if after:
+        where.append("(created_at < %s OR (created_at = %s AND id < %s))")
+        params += [after[0], after[0], after[1]]
+        inner_order = "created_at DESC, id DESC"
+    elif before:
+        where.append("(created_at > %s OR (created_at = %s AND id > %s))")
+        params += [before[0], before[0], before[1]]
+        inner_order = "created_at ASC, id ASC"
+    else:
+        inner_order = "created_at DESC, id DESC"
+
+    limit_sql = ""
+    if limit is not None:
+        limit_sql = "LIMIT %s"
+        params.append(limit)
+
+    with read_connection(user_id=user_id) as conn:
         with conn.cursor() as cur:
-            if group:
-                cur.execute(
-                    """
-                    SELECT
-                      t.id, t.user_id, t.title, t.description, t.`group`, t.status, t.created_at,
-                      a.id AS att_id, a.filename AS att_filename, a.file_url AS att_file_url,
-                      a.object_key AS att_object_key, a.created_at AS att_created_at
-                    FROM tasks t
-                    LEFT JOIN attachments a ON a.task_id = t.id
-                    WHERE t.user_id = %s AND t.`group` = %s
-                    ORDER BY t.created_at DESC, t.id DESC, a.created_at DESC
-                    """,
-                    (user_id, group),
-                )
-            else:
-                cur.execute(
-                    """
-                    SELECT
-                      t.id, t.user_id, t.title, t.description, t.`group`, t.status, t.created_at,
-                      a.id AS att_id, a.filename AS att_filename, a.file_url AS att_file_url,
-                      a.object_key AS att_object_key, a.created_at AS att_created_at
-                    FROM tasks t
-                    LEFT JOIN attachments a ON a.task_id = t.id
-                    WHERE t.user_id = %s
-                    ORDER BY t.created_at DESC, t.id DESC, a.created_at DESC
-                    """,
-                    (user_id,),
-                )
+            return fetch(cur, where=" AND ".join(where), params=params, inner_order=inner_order, limit_sql=limit_sql)
 
-            rows = cur.fetchall()
 
-        tasks_by_id = {}
-        for r in rows:
-            tid = r["id"]
-            if tid not in tasks_by_id:
-                tasks_by_id[tid] = {
-                    "id": r["id"],
-                    "user_id": r["user_id"],
-                    "title": r["title"],
-                    "description": r["description"],
-                    "group": r["group"],
-                    "status": r["status"],
-                    "status_label": STATUS_LABELS.get(r["status"], r["status"]),
-                    "created_at": r["created_at"],
-                    "attachments": [],
-                }
+def list_tasks_page(
+    *,
+    user_id: int,
+    group: str | None = None,
+    after: str | None = None,
+    before: str | None = None,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    strategy: str | None = None,
+):
+    """
+    Jedna strona listy tasków (keyset pagination po (created_at, id)).
+    Zwraca {tasks, next_cursor, prev_cursor}; kursory są nieprzezroczystymi stringami.
+    Rzuca ValueError dla uszkodzonego kursora.
+    """
+    page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+    after_key = decode_cursor(after) if after else None
+    before_key = decode_cursor(before) if before and not after_key else None
+
+    # Pobieramy o jeden task więcej, żeby wiedzieć czy istnieje kolejna strona.
+    tasks = list_tasks_with_attachments(
+        user_id=user_id,
+        group=group,
+        after=after_key,
+        before=before_key,
+        limit=page_size + 1,
+        strategy=strategy,
+    )
+
+    if before_key and not tasks:
+        # Nic nowszego od kursora (np. usunięte taski) – wracamy na pierwszą stronę.
+        return list_tasks_page(user_id=user_id, group=group, page_size=page_size, strategy=strategy)
+
+    if before_key:
+        has_prev = len(tasks) > page_size
+        tasks = tasks[-page_size:]
+        has_next = True
+    else:
+        has_next = len(tasks) > page_size
+        tasks = tasks[:page_size]
+        has_prev = after_key is not None
+
+    next_cursor = prev_cursor = None
+    if tasks:
+        if has_next:
+            next_cursor = encode_cursor(tasks[-1]["created_at"], tasks[-1]["id"])
+        if has_prev:
+            prev_cursor = encode_cursor(tasks[0]["created_at"], tasks[0]["id"])
+
+    return {"tasks": tasks, "next_cursor": next_cursor, "prev_cursor": prev_cursor}
+
+
+def encode_search_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(f"s{offset}".encode()).decode().rstrip("=")
+
+
+def decode_search_cursor(cursor: str) -> int:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        if not raw.startswith("s") or not raw[1:].isdigit():
+            raise ValueError(raw)
+        return int(raw[1:])
+    except (TypeError, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Nieprawidłowy kursor: {cursor!r}") from e
+
+
+def _search_source(vendor: str, terms: list[str], *, user_id: int) -> tuple[str, list]:
+    """
+    Podzapytanie z trafieniami użytkownika i kolumną score (większy = lepszy) dla danego silnika.
+    Każde słowo musi wystąpić – także jako początek dłuższego słowa. Parametry bez końcowego user_id.
+    """
+    match = search_index.match_query(vendor, terms, user_id=user_id)
+    if vendor == "sqlite":
+        sql = """
+            SELECT t.id, t.user_id, t.title, t.description, t.`group`, t.status, t.created_at,
+                   -bm25(tasks_fts) AS score
+            FROM tasks_fts JOIN tasks t ON t.id = tasks_fts.rowid
+            WHERE tasks_fts MATCH %s AND t.user_id = %s
+        """
+        return sql, [match]
+
+    # Token właściciela w zapytaniu: indeks zwraca tylko taski użytkownika i tylko je ocenia.
+    sql = f"""
+        SELECT id, user_id, title, description, `group`, status, created_at,
+               MATCH({search_index.MYSQL_COLUMNS}) AGAINST (%s IN BOOLEAN MODE) AS score
+        FROM tasks
+        WHERE MATCH({search_index.MYSQL_COLUMNS}) AGAINST (%s IN BOOLEAN MODE) AND user_id = %s
+    """
+    return sql, [match, match]
+
+
+def search_tasks_page(
+    *,
+    user_id: int,
+    query: str,
+    group: str | None = None,
+    after: str | None = None,
+    page_size: int = DEFAULT_PAGE_SIZE,
+):
+    """
+    Wyszukiwanie pełnotekstowe po title/description (MySQL FULLTEXT albo SQLite FTS5).
+    Wyniki od najlepiej dopasowanych, najwyżej SEARCH_MAX_RESULTS; kursor to przesunięcie w tym
+    rankingu. Score (float z statystyk całego indeksu) nie nadaje się na klucz kursora – porównanie
+    z wartością po zaokrągleniu i zmiany statystyk między stronami gubiłyby albo dublowały wyniki.
+    Zwraca {tasks, next_cursor, prev_cursor} jak list_tasks_page (prev_cursor zawsze None).
+    Rzuca ValueError dla uszkodzonego kursora.
+    """
+    page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+    offset = decode_search_cursor(after) if after else 0
+    max_results = getattr(settings, "SEARCH_MAX_RESULTS", 1000)
+    terms = search_index.search_terms(query)
+    if not terms or offset >= max_results:
+        return {"tasks": [], "next_cursor": None, "prev_cursor": None}
+    # Strona + 1 wiersz, ale nie poza limit wyników.
+    limit = min(page_size + 1, max_results - offset)
+
+    with read_connection(user_id=user_id) as conn:
+        source, params = _search_source(getattr(conn, "vendor", "mysql"), terms, user_id=user_id)
+        params.append(user_id)
+
+        where = []
+        if group:
+            where.append("`group` = %s")
+            params.append(group)
+        params += [limit, offset]
+
+        with conn.cursor() as cur:
+            cur.execute(
+                f"""
+                SELECT * FROM ({source}) s
+                {"WHERE " + " AND ".join(where) if where else ""}
+                ORDER BY score DESC, id DESC
+                LIMIT %s OFFSET %s
+                """,
+                params,
+            )
+            rows = cur.fetchall()
+            has_next = len(rows) > page_size
+            rows = rows[:page_size]
+            tasks = _load_attachments(cur, [_task_dict(r) for r in rows])
 
-            if r.get("att_id"):
-                tasks_by_id[tid]["attachments"].append(
-                    {
-                        "id": r["att_id"],
-                        "filename": r["att_filename"],
-                        "file_url": r["att_file_url"],
-                        "object_key": r["att_object_key"],
-                        "created_at": r["att_created_at"],
-                    }
-                )
-
-        return list(tasks_by_id.values())
-    finally:
-        conn.close()
+    next_cursor = encode_search_cursor(offset + page_size) if has_next else None
+    return {"tasks": tasks, "next_cursor": next_cursor, "prev_cursor": None}
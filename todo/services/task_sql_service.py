@@ -1,30 +1,23 @@
 import os
-import pymysql
 from datetime import datetime
 from django.utils import timezone
 
 
-from todo.services.oss import upload_fileobj, safe_object_key
-
-def _conn():
-    return pymysql.connect(
-        host=os.environ["OVH_MYSQL_HOST"],
-        port=int(os.environ["OVH_MYSQL_PORT"]),
-        user=os.environ["OVH_MYSQL_USER"],
-        password=os.environ["OVH_MYSQL_PASSWORD"],
-        db=os.environ["OVH_MYSQL_DB"],
-        charset="utf8mb4",
-        cursorclass=pymysql.cursors.DictCursor,
-        ssl={"ssl-mode": "REQUIRED"},
-        autocommit=True,
-        connect_timeout=5,
-        read_timeout=10,
-        write_timeout=10,
-    )
+from todo.services import attachment_store, attachment_uploads, replicas, task_cache, task_events
+from todo.services.mysql_pool import connection
+from todo.services.oss import delete_object, public_url, safe_object_key
+
+
+def _written(user_id: int, action: str, task_ids) -> None:
+    # Po commicie: stare strony listy z cache są nieważne, odczyty użytkownika idą
+    # przez chwilę na primary (replika może jeszcze nie mieć zapisu), a otwarte karty dostają zdarzenie.
+    task_cache.invalidate(user_id)
+    replicas.mark_write(user_id)
+    task_events.publish(user_id, action, task_ids)
+
 
 def get_tasks_sql(user_id: int):
-    conn = _conn()
-    try:
+    with connection() as conn:
         with conn.cursor() as cur:
             cur.execute(
                 """
@@ -37,55 +30,114 @@ def get_tasks_sql(user_id: int):
             )
             rows = cur.fetchall()
             return rows
-    finally:
-        conn.close()
 
 def create_task_sql(*, user_id: int, title: str, description: str, group: str, status: str, upload=None) -> int:
     """
     Tworzy taska w OVH MySQL.
-    Jeśli upload != None, wysyła plik do OVH S3 i zapisuje rekord w attachments.
+    Jeśli upload != None, zapisuje rekord w attachments ze statusem pending
+    i zleca wysyłkę pliku do OVH S3 w tle (po commicie – połączenie nie czeka na upload).
+    Upload już wysłany do S3 przy odbiorze (ma object_key) dostaje od razu status ready.
+    Plik o znanej sumie sha256 (upload.sha256), który użytkownik już ma w S3, nie jest wysyłany
+    ponownie – załącznik wskazuje istniejący obiekt (attachment_store).
     Zwraca task_id.
     """
     title = (title or "").strip()
     description = (description or "").strip() or None
 
-    now = timezone.now()
+    spooled_path = None
+    streamed = bool(getattr(upload, "object_key", None))
+    stored = None
+    if upload:
+        filename = getattr(upload, "name", "file")
+        content_type = getattr(upload, "content_type", None)
+        content_hash = getattr(upload, "sha256", None)
+        if not streamed:
+            spooled_path = attachment_uploads.spool(upload)
 
-    conn = _conn()
     try:
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                INSERT INTO tasks (user_id, `group`, title, description, status, created_at)
-                VALUES (%s, %s, %s, %s, %s, %s)
-                """,
-                (user_id, group, title, description, status, now),
-            )
-            task_id = cur.lastrowid
-
-            if upload:
-                filename = getattr(upload, "name", "file")
-                content_type = getattr(upload, "content_type", None)
-
-                object_key = safe_object_key(user_id=user_id, task_id=task_id, filename=filename)
+        with connection() as conn:
+            try:
+                conn.begin()
+                # Znacznik dopiero po zapisaniu pliku na dysk – updated_at ma być jak najbliżej commitu.
+                now = timezone.now()
+                with conn.cursor() as cur:
+                    cur.execute(
+                        """
+                        INSERT INTO tasks (user_id, `group`, title, description, status, created_at, updated_at)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s)
+                        """,
+                        (user_id, group, title, description, status, now, now),
+                    )
+                    task_id = cur.lastrowid
 
-                file_url = upload_fileobj(fileobj=upload, object_key=object_key, content_type=content_type)
+                    if upload:
+                        if streamed:
+                            object_key, attachment_status = upload.object_key, "ready"
+                        else:
+                            object_key = safe_object_key(user_id=user_id, task_id=task_id, filename=filename)
+                            attachment_status = "pending"
+                        if content_hash:
+                            stored = attachment_store.acquire(
+                                cur,
+                                vendor=getattr(conn, "vendor", "mysql"),
+                                user_id=user_id,
+                                content_hash=content_hash,
+                                object_key=object_key,
+                                size=getattr(upload, "size", None),
+                                status=attachment_status,
+                                now=now,
+                            )
+                            object_key, attachment_status = stored["object_key"], stored["status"]
+                        # Ścieżkę pliku zapisujemy tylko przy załączniku, który go wyśle (recover_uploads).
+                        owns_spool = spooled_path if stored is None or stored["created"] else None
 
-                cur.execute(
-                    """
-                    INSERT INTO attachments (task_id, filename, object_key, file_url, created_at)
-                    VALUES (%s, %s, %s, %s, %s)
-                    """,
-                    (task_id, filename, object_key, file_url, now),
-                )
+                        cur.execute(
+                            """
+                            INSERT INTO attachments
+                              (task_id, filename, object_key, file_url, status, content_hash, spool_path, created_at)
+                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                            """,
+                            (
+                                task_id, filename, object_key, public_url(object_key), attachment_status,
+                                content_hash, owns_spool, now,
+                            ),
+                        )
+                        attachment_id = cur.lastrowid
+                        if stored is not None:
+                            # acquire() mogło czekać na blokadę wiersza stored_objects – stemplujemy ponownie.
+                            cur.execute("UPDATE tasks SET updated_at=%s WHERE id=%s", (timezone.now(), task_id))
 
-        conn.commit()
-        return task_id
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
     except Exception:
-        conn.rollback()
+        if spooled_path:
+            os.remove(spooled_path)
+        if streamed:
+            delete_object(upload.object_key)
         raise
-    finally:
-        conn.close()
+
+    if stored is not None and not stored["created"]:
+        # Ta sama treść już jest (albo właśnie trafia) do S3 – świeża kopia jest zbędna.
+        if spooled_path:
+            os.remove(spooled_path)
+        if streamed:
+            delete_object(upload.object_key)
+    elif upload and not streamed:
+        attachment_uploads.enqueue(
+            user_id=user_id,
+            attachment_id=attachment_id,
+            path=spooled_path,
+            object_key=object_key,
+            content_type=content_type,
+            task_id=task_id,
+        )
+
+    _written(user_id, "created", [task_id])
+    return task_id
+
+
 def update_task_sql(*, user_id: int, task_id: int, title: str, description: str, group: str, status: str) -> None:
     title = (title or "").strip()
     description = (description or "").strip() or None
@@ -96,34 +148,174 @@ def update_task_sql(*, user_id: int, task_id: int, title: str, description: str,
     if status not in allowed:
         status = "todo"
 
-    conn = _conn()
-    try:
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                UPDATE tasks
-                SET title=%s, description=%s, `group`=%s, status=%s
-                WHERE id=%s AND user_id=%s
-                """,
-                (title, description, group, status, task_id, user_id),
-            )
-        conn.commit()
-    except Exception:
-        conn.rollback()
-        raise
-    finally:
-        conn.close()
+    with connection() as conn:
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    UPDATE tasks
+                    SET title=%s, description=%s, `group`=%s, status=%s, updated_at=%s
+                    WHERE id=%s AND user_id=%s
+                    """,
+                    (title, description, group, status, timezone.now(), task_id, user_id),
+                )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    _written(user_id, "updated", [task_id])
+
+
+# Schemat z migracji Django nie ma ON DELETE CASCADE na attachments.task_id
+# (kaskadę robi ORM), więc przy raw SQL kasujemy załączniki jawnie, w tej samej transakcji.
+_DELETE_ATTACHMENTS_SQL = "DELETE FROM attachments WHERE task_id IN (SELECT id FROM tasks WHERE user_id=%s AND id IN ({ids}))"
+# Ślady usuniętych tasków dla synchronizacji przyrostowej (task_sync_service); parametry: deleted_at, user_id, id...
+_TOMBSTONES_SQL = (
+    "INSERT INTO task_tombstones (user_id, task_id, deleted_at) "
+    "SELECT user_id, id, %s FROM tasks WHERE user_id=%s AND id IN ({ids})"
+)
+
+
+def _delete_tasks(cur, *, user_id: int, ids: list[int], placeholders: str) -> tuple[int, int]:
+    # Referencje do współdzielonych obiektów S3 i ślady usunięć – przed skasowaniem wierszy.
+    released = attachment_store.release_tasks(cur, user_id=user_id, task_ids=ids, placeholders=placeholders)
+    cur.execute(_DELETE_ATTACHMENTS_SQL.format(ids=placeholders), (user_id, *ids))
+    cur.execute(_TOMBSTONES_SQL.format(ids=placeholders), (timezone.now(), user_id, *ids))
+    cur.execute(f"DELETE FROM tasks WHERE user_id=%s AND id IN ({placeholders})", (user_id, *ids))
+    return max(cur.rowcount, 0), released
+
+
 def delete_task_sql(*, user_id: int, task_id: int) -> None:
-    conn = _conn()
-    try:
-        with conn.cursor() as cur:
-            cur.execute(
-                "DELETE FROM tasks WHERE id=%s AND user_id=%s",
-                (task_id, user_id),
-            )
-        conn.commit()
-    except Exception:
-        conn.rollback()
-        raise
-    finally:
-        conn.close()
+    with connection() as conn:
+        try:
+            conn.begin()
+            with conn.cursor() as cur:
+                _, released = _delete_tasks(cur, user_id=user_id, ids=[task_id], placeholders="%s")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    if released:
+        attachment_store.collect(user_id=user_id)
+    _written(user_id, "deleted", [task_id])
+
+
+# Ile id wchodzi do jednego IN (...) – długie listy dzielimy, ale w jednej transakcji.
+BULK_CHUNK_SIZE = 500
+
+
+def _bulk_execute(*, user_id: int, task_ids, action: str, sql: str | None = None, params: tuple = ()) -> int:
+    """
+    Wykonuje `sql` (z {ids} w miejscu listy placeholderów, parametry: params, updated_at, user_id, id...)
+    dla wszystkich task_ids jednym połączeniem i jednym commitem. Zwraca liczbę zmienionych wierszy.
+    updated_at to czas wykonania danej paczki. Bez `sql` kasuje taski (_delete_tasks).
+    """
+    ids = sorted({int(task_id) for task_id in task_ids})
+    if not ids:
+        return 0
+
+    affected = released = 0
+    with connection() as conn:
+        try:
+            # Połączenia z puli mają autocommit – bez begin() każda paczka commitowałaby się osobno.
+            conn.begin()
+            with conn.cursor() as cur:
+                for start in range(0, len(ids), BULK_CHUNK_SIZE):
+                    chunk = ids[start:start + BULK_CHUNK_SIZE]
+                    placeholders = ", ".join(["%s"] * len(chunk))
+                    if sql is None:
+                        deleted, chunk_released = _delete_tasks(cur, user_id=user_id, ids=chunk, placeholders=placeholders)
+                        affected += deleted
+                        released += chunk_released
+                        continue
+                    cur.execute(sql.format(ids=placeholders), (*params, timezone.now(), user_id, *chunk))
+                    affected += max(cur.rowcount, 0)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    if released:
+        attachment_store.collect(user_id=user_id)
+    _written(user_id, action, ids)
+    return affected
+
+
+def bulk_set_status_sql(*, user_id: int, task_ids, status: str) -> int:
+    if status not in {"todo", "in_progress", "done", "archived"}:
+        raise ValueError(f"Nieznany status: {status}")
+
+    return _bulk_execute(
+        user_id=user_id,
+        task_ids=task_ids,
+        action="updated",
+        sql="UPDATE tasks SET status=%s, updated_at=%s WHERE user_id=%s AND id IN ({ids})",
+        params=(status,),
+    )
+
+
+def bulk_move_sql(*, user_id: int, task_ids, group: str) -> int:
+    group = (group or "Ważne").strip()
+
+    return _bulk_execute(
+        user_id=user_id,
+        task_ids=task_ids,
+        action="updated",
+        sql="UPDATE tasks SET `group`=%s, updated_at=%s WHERE user_id=%s AND id IN ({ids})",
+        params=(group,),
+    )
+
+
+def bulk_delete_sql(*, user_id: int, task_ids) -> int:
+    return _bulk_execute(
+        user_id=user_id,
+        task_ids=task_ids,
+        action="deleted",
+    )
+
+
+def add_attachment_sql(*, user_id: int, task_id: int, filename: str, object_key: str, file_url: str) -> int | None:
+    """
+    Dopisuje gotowy (już wysłany) załącznik do taska użytkownika.
+    Zwraca id załącznika albo None, gdy task nie należy do użytkownika.
+    Ponowne wywołanie dla tego samego object_key nie tworzy duplikatu.
+    """
+    now = timezone.now()
+
+    with connection() as conn:
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    INSERT INTO attachments (task_id, filename, object_key, file_url, status, created_at)
+                    SELECT t.id, %s, %s, %s, 'ready', %s
+                    FROM tasks t
+                    WHERE t.id=%s AND t.user_id=%s
+                      AND NOT EXISTS (SELECT 1 FROM attachments a WHERE a.task_id=t.id AND a.object_key=%s)
+                    """,
+                    (filename, object_key, file_url, now, task_id, user_id, object_key),
+                )
+                attachment_id = cur.lastrowid if cur.rowcount else None
+
+                if attachment_id is not None:
+                    cur.execute("UPDATE tasks SET updated_at=%s WHERE id=%s", (now, task_id))
+                else:
+                    cur.execute(
+                        """
+                        SELECT a.id FROM attachments a
+                        JOIN tasks t ON t.id = a.task_id
+                        WHERE a.task_id=%s AND t.user_id=%s AND a.object_key=%s
+                        """,
+                        (task_id, user_id, object_key),
+                    )
+                    row = cur.fetchone()
+                    attachment_id = row["id"] if row else None
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    _written(user_id, "updated", [task_id])
+    return attachment_id
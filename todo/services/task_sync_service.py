@@ -0,0 +1,159 @@
+"""
+Synchronizacja przyrostowa listy tasków (GET /tasks/changes/?since=<kursor>).
+
+Klient trzyma kursor z poprzedniej odpowiedzi i dostaje tylko taski utworzone/zmienione
+od tego czasu (po updated_at) oraz id usuniętych (task_tombstones). Bez kursora – pełny
+stan (stronami), od którego liczą się kolejne zmiany.
+"""
+import base64
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+
+from todo.services.mysql_pool import connection
+from todo.services.replicas import read_connection
+from todo.services.task_read_sql_service import MAX_PAGE_SIZE, _load_attachments, _task_dict
+
+def encode_sync_cursor(synced_at: datetime, updated_at: datetime | None, task_id: int, tombstone_id: int) -> str:
+    """
+    synced_at – do kiedy klient ma pełny obraz; (updated_at, task_id) i tombstone_id – ostatnia
+    odesłana zmiana taska i ostatni odesłany ślad usunięcia.
+    """
+    parts = (synced_at.isoformat(), updated_at.isoformat() if updated_at else "", task_id, tombstone_id)
+    raw = "|".join(str(p) for p in parts).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_sync_cursor(cursor: str) -> tuple[datetime, datetime | None, int, int]:
+    """
+    Odwrotność encode_sync_cursor. Dla śmieci rzuca ValueError.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        synced_at, updated_at, task_id, tombstone_id = raw.split("|")
+        return (
+            _aware(datetime.fromisoformat(synced_at)),
+            datetime.fromisoformat(updated_at) if updated_at else None,
+            int(task_id),
+            int(tombstone_id),
+        )
+    except (TypeError, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Nieprawidłowy kursor: {cursor!r}") from e
+
+
+def _aware(value: datetime) -> datetime:
+    # pymysql oddaje naiwne daty (UTC).
+    return value if timezone.is_aware(value) else timezone.make_aware(value, dt_timezone.utc)
+
+
+def get_changes(*, user_id: int, since: str | None = None, limit: int | None = None) -> dict:
+    """
+    Zwraca {changed, deleted, cursor, has_more, reset}:
+    changed – taski (jak w liście, z załącznikami) zmienione po kursorze, rosnąco po updated_at,
+    deleted – id tasków usuniętych po kursorze,
+    has_more – jest kolejna strona zmian (odpytać od razu z nowym kursorem),
+    reset – kursor starszy niż TASK_SYNC_TOMBSTONE_DAYS (ślady usunięć mogły zniknąć);
+    klient musi pobrać wszystko od nowa, bez kursora.
+
+    Zapisy z ostatnich TASK_SYNC_SETTLE_SECONDS czekają do kolejnego odpytania: znacznik czasu
+    powstaje przed commitem, więc transakcja w locie mogłaby wpaść za kursor i zginąć.
+    Rzuca ValueError dla uszkodzonego kursora.
+    """
+    limit = max(1, min(int(limit or getattr(settings, "TASK_SYNC_PAGE_SIZE", 200)), MAX_PAGE_SIZE))
+    now = timezone.now()
+    horizon = now - timedelta(seconds=getattr(settings, "TASK_SYNC_SETTLE_SECONDS", 2))
+    retention = now - timedelta(days=getattr(settings, "TASK_SYNC_TOMBSTONE_DAYS", 30))
+
+    if since:
+        synced_at, updated_at, task_id, tombstone_id = decode_sync_cursor(since)
+    else:
+        synced_at, updated_at, task_id, tombstone_id = None, None, 0, None
+    if synced_at is not None and synced_at < retention:
+        return {"changed": [], "deleted": [], "cursor": None, "has_more": False, "reset": True}
+
+    with read_connection(user_id=user_id) as conn:
+        with conn.cursor() as cur:
+            if tombstone_id is None:
+                # Pełny stan: wcześniejsze usunięcia klienta nie dotyczą.
+                cur.execute(
+                    "SELECT MAX(id) AS id FROM task_tombstones WHERE user_id=%s AND deleted_at <= %s",
+                    (user_id, horizon),
+                )
+                tombstone_id = (cur.fetchone() or {}).get("id") or 0
+
+            where = ["user_id = %s", "updated_at <= %s"]
+            params = [user_id, horizon]
+            if updated_at is not None:
+                where.append("(updated_at > %s OR (updated_at = %s AND id > %s))")
+                params += [updated_at, updated_at, task_id]
+            cur.execute(
+                f"""
+                SELECT id, user_id, title, description, `group`, status, created_at, updated_at
+                FROM tasks
+                WHERE {" AND ".join(where)}
+                ORDER BY updated_at, id
+                LIMIT %s
+                """,
+                (*params, limit + 1),
+            )
+            rows = cur.fetchall()
+
+            cur.execute(
+                """
+                SELECT id, task_id FROM task_tombstones
+                WHERE user_id=%s AND id > %s AND deleted_at <= %s
+                ORDER BY id
+                LIMIT %s
+                """,
+                (user_id, tombstone_id, horizon, limit + 1),
+            )
+            tombstones = cur.fetchall()
+
+            has_more = len(rows) > limit or len(tombstones) > limit
+            rows, tombstones = rows[:limit], tombstones[:limit]
+            changed = []
+            for r in rows:
+                task = _task_dict(r)
+                task["updated_at"] = r["updated_at"]
+                changed.append(task)
+            _load_attachments(cur, changed)
+
+    if rows:
+        updated_at, task_id = rows[-1]["updated_at"], rows[-1]["id"]
+    if tombstones:
+        tombstone_id = tombstones[-1]["id"]
+
+    return {
+        "changed": changed,
+        "deleted": [t["task_id"] for t in tombstones],
+        "cursor": encode_sync_cursor(horizon, updated_at, task_id, tombstone_id),
+        "has_more": has_more,
+        "reset": False,
+    }
+
+
+def prune_tombstones(*, older_than: datetime, batch_size: int = 1000) -> int:
+    """
+    Kasuje ślady usunięć starsze niż older_than, paczkami (krótkie blokady). Zwraca liczbę usuniętych.
+    """
+    deleted = 0
+    while True:
+        with connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "SELECT id FROM task_tombstones WHERE deleted_at < %s ORDER BY deleted_at LIMIT %s",
+                        (older_than, batch_size),
+                    )
+                    ids = [r["id"] for r in cur.fetchall()]
+                    if ids:
+                        placeholders = ", ".join(["%s"] * len(ids))
+                        cur.execute(f"DELETE FROM task_tombstones WHERE id IN ({placeholders})", ids)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        deleted += len(ids)
+        if len(ids) < batch_size:
+            return deleted
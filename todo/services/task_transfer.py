@@ -0,0 +1,210 @@
+"""
+Eksport i import tasków użytkownika (kopia zapasowa, przenosiny między kontami).
+
+Eksport (GET /tasks/export/?format=jsonl|csv) idzie paczkami po kluczu (created_at, id):
+paczka to jedno zapytanie o taski i jedno o ich załączniki, połączenie wraca do puli między
+paczkami, a w pamięci jest najwyżej jedna paczka – także przy wolnym kliencie.
+
+Import (manage.py import_tasks) wstawia taski wieloelementowymi INSERT-ami, każda paczka we
+własnej transakcji. Załączniki są w eksporcie tylko metadanymi (nazwa, URL, status) – import ich
+nie odtwarza: obiekty w S3 należą do konta źródłowego i jego liczników referencji (attachment_store).
+"""
+import csv
+import io
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.utils import timezone
+
+from todo.models import Task
+from todo.services.mysql_pool import connection
+from todo.services.replicas import read_connection
+from todo.services.task_read_sql_service import _load_attachments
+from todo.services.task_sql_service import _written
+from todo.services.task_sync_service import _aware
+
+FORMATS = {
+    "jsonl": "application/x-ndjson; charset=utf-8",
+    "csv": "text/csv; charset=utf-8",
+}
+CSV_FIELDS = ("id", "title", "description", "group", "status", "remind_at", "created_at", "updated_at", "attachments")
+# Ile błędnych wierszy importu opisujemy w wyniku (reszta jest tylko liczona).
+MAX_REPORTED_ERRORS = 20
+
+
+def fetch_batch(*, user_id: int, after: tuple | None = None, limit: int | None = None) -> tuple[list[dict], tuple | None]:
+    """
+    Paczka tasków użytkownika (rosnąco po created_at, id) z załącznikami.
+    Zwraca (taski, klucz następnej paczki albo None, gdy to ostatnia).
+    """
+    limit = limit or getattr(settings, "TASK_EXPORT_BATCH_SIZE", 500)
+    where, params = "user_id=%s", [user_id]
+    if after is not None:
+        where += " AND (created_at > %s OR (created_at = %s AND id > %s))"
+        params += [after[0], after[0], after[1]]
+
+    with read_connection(user_id=user_id) as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"""
+                SELECT id, title, description, `group`, status, remind_at, created_at, updated_at
+                FROM tasks
+                WHERE {where}
+                ORDER BY created_at, id
+                LIMIT %s
+                """,
+                (*params, limit),
+            )
+            tasks = [{**row, "attachments": []} for row in cur.fetchall()]
+            _load_attachments(cur, tasks)
+
+    if len(tasks) < limit:
+        return tasks, None
+    return tasks, (tasks[-1]["created_at"], tasks[-1]["id"])
+
+
+def _iso(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _export_dict(task: dict) -> dict:
+    data = {field: _iso(task[field]) for field in CSV_FIELDS if field != "attachments"}
+    data["attachments"] = [
+        {"filename": a["filename"], "file_url": a["file_url"], "status": a["status"], "created_at": _iso(a["created_at"])}
+        for a in reversed(task["attachments"])
+    ]
+    return data
+
+
+def render(fmt: str, tasks: list[dict], *, header: bool = False) -> str:
+    """
+    Fragment pliku eksportu dla paczki tasków; header=True – z nagłówkiem CSV (pierwsza paczka).
+    """
+    if fmt == "jsonl":
+        return "".join(json.dumps(_export_dict(task), ensure_ascii=False) + "\n" for task in tasks)
+
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=CSV_FIELDS)
+    if header:
+        writer.writeheader()
+    for task in tasks:
+        data = _export_dict(task)
+        data["attachments"] = json.dumps(data["attachments"], ensure_ascii=False) if data["attachments"] else ""
+        writer.writerow(data)
+    return out.getvalue()
+
+
+def export_chunks(*, user_id: int, fmt: str, batch_size: int | None = None):
+    """
+    Kolejne fragmenty pliku eksportu (do StreamingHttpResponse).
+    """
+    after, header = None, True
+    while True:
+        tasks, after = fetch_batch(user_id=user_id, after=after, limit=batch_size)
+        yield render(fmt, tasks, header=header)
+        header = False
+        if after is None:
+            return
+
+
+def _rows(fileobj, fmt: str):
+    # (numer linii, słownik pól); uszkodzony JSON to ValueError zamiast wiersza.
+    if fmt == "csv":
+        reader = csv.DictReader(fileobj)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for line_no, line in enumerate(fileobj, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = ValueError("niepoprawny JSON")
+        yield line_no, row
+
+
+def _datetime(value) -> datetime | None:
+    if not value:
+        return None
+    try:
+        return _aware(datetime.fromisoformat(value))
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"niepoprawna data: {value!r}") from e
+
+
+def _task_row(*, user_id: int, row, now: datetime) -> tuple:
+    if isinstance(row, ValueError):
+        raise row
+    if not isinstance(row, dict):
+        raise ValueError("wiersz nie jest obiektem")
+
+    title = str(row.get("title") or "").strip()[:255]
+    if not title:
+        raise ValueError("brak tytułu")
+    description = str(row.get("description") or "").strip() or None
+    group = row.get("group") if row.get("group") in Task.Group.values else Task.Group.IMPORTANT
+    status = row.get("status") if row.get("status") in Task.Status.values else Task.Status.TODO
+    created_at = _datetime(row.get("created_at")) or now
+    return (user_id, str(group), title, description, str(status), _datetime(row.get("remind_at")), created_at)
+
+
+def _insert_batch(rows: list[tuple]) -> None:
+    values = ", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s)"] * len(rows))
+    with connection() as conn:
+        try:
+            conn.begin()
+            # updated_at z chwili zapisu paczki, nie z początku importu – synchronizacja musi ją zobaczyć.
+            updated_at = timezone.now()
+            with conn.cursor() as cur:
+                cur.execute(
+                    "INSERT INTO tasks (user_id, `group`, title, description, status, remind_at, created_at, updated_at) "
+                    f"VALUES {values}",
+                    [value for row in rows for value in (*row, updated_at)],
+                )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+def import_tasks(*, user_id: int, fileobj, fmt: str, batch_size: int | None = None, on_progress=None) -> dict:
+    """
+    Wczytuje taski z pliku eksportu (otwartego w trybie tekstowym) na konto użytkownika, paczkami
+    po batch_size wierszy. on_progress(statystyki) po każdej zapisanej paczce. Błędne wiersze są
+    pomijane i opisane w errors (najwyżej MAX_REPORTED_ERRORS). Zwraca {imported, skipped, errors}.
+    Przerwany import zostawia zapisane paczki – liczba imported mówi, ile ich było.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Nieznany format: {fmt}")
+    batch_size = batch_size or getattr(settings, "TASK_IMPORT_BATCH_SIZE", 500)
+    now = timezone.now()
+    stats = {"imported": 0, "skipped": 0, "errors": []}
+
+    def flush(batch):
+        _insert_batch(batch)
+        stats["imported"] += len(batch)
+        if on_progress is not None:
+            on_progress(stats)
+
+    batch = []
+    try:
+        for line_no, row in _rows(fileobj, fmt):
+            try:
+                batch.append(_task_row(user_id=user_id, row=row, now=now))
+            except ValueError as e:
+                stats["skipped"] += 1
+                if len(stats["errors"]) < MAX_REPORTED_ERRORS:
+                    stats["errors"].append(f"linia {line_no}: {e}")
+                continue
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+    finally:
+        if stats["imported"]:
+            _written(user_id, "created", [])
+    return stats
@@ -1,68 +1,1371 @@
-from datetime import timedelta
+import asyncio
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
 
-from django.test import TestCase
+import boto3
+import pymysql
+from boto3.s3.transfer import TransferConfig
+from botocore.stub import Stubber
+from django.conf import settings
+from django.core.cache import caches
+from django.core import mail
+from django.core.management import CommandError, call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection as db_connection, transaction
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
 from django.utils import timezone
 
-from .models import Task, TaskGroup
+from . import async_views, search_index, views
+from .admin import EstimatedCountPaginator
+from .auth_backends import CachedUserBackend
+from .management.commands import relay_outbox, send_reminders
+from .middleware import ReplicaPinningMiddleware, RequestInstrumentationMiddleware
+from .models import Attachment, OutboxMessage, StoredObject, Task, TaskGroup, TaskTombstone, User
+from .services import (
+    attachment_store,
+    attachment_uploads,
+    direct_uploads,
+    instrumentation,
+    orphan_objects,
+    oss,
+    outbox,
+    ovh_users,
+    query_plans,
+    reminders,
+    replicas,
+    task_cache,
+    task_events,
+    task_read_sql_service,
+    task_sql_service,
+    task_sync_service,
+    task_transfer,
+)
+from .services import mysql_pool
+from .services.mysql_pool import ConnectionPool, PoolTimeout
+from .services.task_read_sql_service import decode_cursor, encode_cursor
+from .upload_handlers import AttachmentUploadHandler, StreamedUploadedFile, upload_too_large
 
 
 class TaskModelTests(TestCase):
     def setUp(self):
-        self.group_work = TaskGroup.objects.create(name="Praca", color="#ff8800")
-        self.group_home = TaskGroup.objects.create(name="Dom", color="#00ffaa")
-
-    def test_priority_sorting(self):
-        low = Task.objects.create(title="Niskie", priority=Task.Priority.LOW)
-        high = Task.objects.create(title="Wysokie", priority=Task.Priority.HIGH)
-        medium = Task.objects.create(title="Średnie", priority=Task.Priority.MEDIUM)
-
-        ordered = list(Task.objects.sorted("priority"))
-        self.assertEqual([task.title for task in ordered], ["Wysokie", "Średnie", "Niskie"])
-
-
-        low.group = self.group_work
-        low.save()
-        ordered_group = list(Task.objects.sorted("priority", group_id=self.group_work.id))
-        self.assertEqual(ordered_group[0], low)
-
-    def test_repeat_creates_next_occurrence(self):
-        due = timezone.now()
-        task = Task.objects.create(
-            title="Powtórka",
-            due_date=due,
-            repeat_frequency=Task.RepeatFrequency.DAILY,
-            repeat_interval=2,
-            group=self.group_work,
-        )
-        next_due = task.calculate_next_due_date()
-        self.assertAlmostEqual(next_due.timestamp(), (due + timedelta(days=2)).timestamp(), delta=1)
-
-        new_task = task.spawn_next_occurrence()
-        self.assertIsNotNone(new_task)
-        self.assertEqual(new_task.group, task.group)
-        self.assertEqual(new_task.priority, task.priority)
-        self.assertFalse(new_task.is_completed)
-        self.assertEqual(new_task.repeat_frequency, task.repeat_frequency)
-
-    def test_toggle_completion_triggers_repeat(self):
-        task = Task.objects.create(
-            title="Zadanie cykliczne",
-            repeat_frequency=Task.RepeatFrequency.WEEKLY,
-            due_date=timezone.now(),
+        self.user = User.objects.create_user(email="model@example.com", password="x")
+
+    def test_defaults(self):
+        task = Task.objects.create(user=self.user, title="Nowe")
+        self.assertEqual(task.status, Task.Status.TODO)
+        self.assertEqual(task.group, Task.Group.IMPORTANT)
+        self.assertIsNone(task.remind_at)
+        self.assertIsNone(task.reminder_sent_at)
+        self.assertEqual(str(task), "Nowe")
+
+    def test_newest_first(self):
+        now = timezone.now()
+        older = Task.objects.create(user=self.user, title="Starsze", created_at=now - timedelta(days=1))
+        newer = Task.objects.create(user=self.user, title="Nowsze", created_at=now)
+        self.assertEqual(list(Task.objects.all()), [newer, older])
+
+    def test_deleting_user_deletes_tasks(self):
+        Task.objects.create(user=self.user, title="Do usunięcia")
+        self.user.delete()
+        self.assertEqual(Task.objects.count(), 0)
+
+
+class TaskGroupTests(TestCase):
+    def test_ordered_by_order_then_id(self):
+        user = User.objects.create_user(email="groups@example.com", password="x")
+        home = TaskGroup.objects.create(user=user, name="Dom", order=2)
+        work = TaskGroup.objects.create(user=user, name="Praca", order=1)
+        self.assertEqual(list(user.task_groups.all()), [work, home])
+        self.assertEqual(str(work), "Praca (groups@example.com)")
+
+
+class FakeConnection:
+    def __init__(self):
+        self.open = True
+        self.pings = 0
+
+    def ping(self, reconnect=False):
+        self.pings += 1
+        if not self.open:
+            raise ConnectionError("closed")
+
+    def get_autocommit(self):
+        return True
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.open = False
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def make_pool(self, **kwargs):
+        self.created = []
+
+        def connect():
+            conn = FakeConnection()
+            self.created.append(conn)
+            return conn
+
+        return ConnectionPool(connect, **kwargs)
+
+    def test_reuses_connection(self):
+        pool = self.make_pool(max_size=2)
+        with pool.connection() as first:
+            pass
+        with pool.connection() as second:
+            pass
+
+        self.assertIs(first, second)
+        stats = pool.stats()
+        self.assertEqual(stats["handshakes"], 1)
+        self.assertEqual(stats["handshakes_avoided"], 1)
+        self.assertEqual(stats["idle"], 1)
+
+    def test_times_out_when_exhausted(self):
+        pool = self.make_pool(max_size=1, timeout=0.05)
+        with pool.connection():
+            with self.assertRaises(PoolTimeout):
+                with pool.connection():
+                    pass
+        self.assertEqual(pool.stats()["timeouts"], 1)
+        self.assertEqual(pool.stats()["waits"], 1)
+
+    def test_replaces_dead_and_expired_connections(self):
+        pool = self.make_pool(max_size=1, ping_after=0)
+        with pool.connection() as conn:
+            pass
+        conn.open = False
+        with pool.connection() as fresh:
+            self.assertIsNot(fresh, conn)
+        self.assertEqual(pool.stats()["health_check_failures"], 1)
+
+        pool.max_lifetime = 0
+        with pool.connection() as newest:
+            self.assertIsNot(newest, fresh)
+        self.assertEqual(pool.stats()["expired"], 1)
+        self.assertEqual(pool.stats()["size"], 1)
+
+    def test_reaps_idle_connections(self):
+        pool = self.make_pool(max_size=2, max_idle=0)
+        with pool.connection() as conn:
+            pass
+        with pool.connection():
+            pass
+        self.assertFalse(conn.open)
+        self.assertEqual(pool.stats()["reaped"], 1)
+
+
+# Opóźnienie zdarzeń o okno synchronizacji sprawdza TaskSyncTests.test_event_arrives_when_change_is_visible.
+@override_settings(TASK_SYNC_SETTLE_SECONDS=0)
+class TaskEventsTests(SimpleTestCase):
+    def test_publish_from_thread_reaches_only_users_streams(self):
+        async def run():
+            with task_events.subscribe(1) as mine, task_events.subscribe(2) as other:
+                thread = threading.Thread(target=task_events.publish, args=(1, "updated", [5, 3, 5]))
+                thread.start()
+                thread.join()
+                event = await mine.get(1)
+                return event, await other.get(0.01)
+
+        event, other = asyncio.run(run())
+        self.assertEqual((event["action"], event["task_ids"]), ("updated", [3, 5]))
+        self.assertIsNone(other)
+        self.assertEqual(task_events.event_stats()["streams"], 0)
+
+    @override_settings(TASK_EVENTS_QUEUE_SIZE=1)
+    def test_overflow_turns_into_resync(self):
+        async def run():
+            with task_events.subscribe(1) as sub:
+                task_events.publish(1, "created", [1])
+                task_events.publish(1, "created", [2])
+                await asyncio.sleep(0)
+                return await sub.get(1), await sub.get(0.01)
+
+        first, second = asyncio.run(run())
+        self.assertEqual(first["action"], task_events.RESYNC)
+        self.assertIsNone(second)
+
+    @override_settings(TASK_EVENTS_HEARTBEAT_SECONDS=0.01, TASK_EVENTS_MAX_SECONDS=1)
+    def test_stream_sends_events_and_heartbeats(self):
+        async def run():
+            stream = async_views._event_stream(7)
+            chunks = [await anext(stream)]
+            task_events.publish(7, "deleted", [9])
+            chunks += [await anext(stream), await anext(stream)]
+            await stream.aclose()
+            return chunks
+
+        retry, event, ping = asyncio.run(run())
+        self.assertTrue(retry.startswith("retry:"))
+        self.assertIn('event: task\ndata: {"action": "deleted", "task_ids": [9]}', event)
+        self.assertEqual(ping, ": ping\n\n")
+        self.assertEqual(task_events.event_stats()["streams"], 0)
+
+
+class ReadReplicaTests(SimpleTestCase):
+    def setUp(self):
+        self.replica = ConnectionPool(FakeConnection, max_size=1, timeout=0)
+        previous = replicas.install_replica_pools([self.replica])
+        self.addCleanup(replicas.install_replica_pools, previous)
+        self.addCleanup(caches["default"].clear)
+
+        self.primary = FakeConnection()
+        patcher = mock.patch.object(replicas, "connection")
+        patcher.start().return_value.__enter__.return_value = self.primary
+        self.addCleanup(patcher.stop)
+
+    def read(self, user_id=1):
+        with replicas.read_connection(user_id=user_id) as conn:
+            return conn
+
+    def test_reads_from_replica_until_users_own_write(self):
+        self.assertIsNot(self.read(), self.primary)
+
+        replicas.mark_write(1)
+        self.assertIs(self.read(), self.primary)
+        self.assertIsNot(self.read(user_id=2), self.primary)
+
+    def test_falls_back_to_primary_when_replica_is_busy(self):
+        with replicas.read_connection(user_id=1):
+            self.assertIs(self.read(), self.primary)
+        self.assertEqual(replicas.replica_stats()["fallbacks"], 1)
+
+    @override_settings(READ_REPLICA_RETRY_SECONDS=30)
+    def test_unreachable_replica_is_skipped_until_retry(self):
+        healthy = ConnectionPool(FakeConnection, max_size=1, timeout=0)
+        calls = []
+
+        def refuse():
+            calls.append(1)
+            raise pymysql.err.OperationalError(2003, "Can't connect")
+
+        down = ConnectionPool(refuse, max_size=1, timeout=0)
+        replicas.install_replica_pools([down, healthy])
+        reads = [self.read() for _ in range(4)]
+        # Jeden odczyt trafił na padniętą replikę (primary), kolejne idą tylko na zdrową.
+        self.assertEqual(reads.count(self.primary), 1)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([r["down"] for r in replicas.replica_stats()["replicas"]], [True, False])
+
+        replicas._down_until[id(down)] = time.monotonic()
+        self.read(), self.read()
+        self.assertEqual(len(calls), 2)
+
+    def test_middleware_pins_writes_and_starts_sticky_window(self):
+        user = mock.Mock(id=7, is_authenticated=True)
+        seen = []
+
+        def view(request):
+            seen.append(replicas.pinned())
+            return HttpResponse()
+
+        middleware = ReplicaPinningMiddleware(view)
+        for method in ("get", "post", "get"):
+            request = getattr(RequestFactory(), method)("/")
+            request.user = user
+            middleware(request)
+
+        self.assertEqual(seen, [False, True, True])
+        self.assertTrue(replicas.is_sticky(7))
+        self.assertFalse(replicas.pinned())
+
+
+class TaskPageTests(SimpleTestCase):
+    def make_tasks(self, n):
+        base = datetime(2026, 1, 1, 12, 0, 0)
+        return [{"id": i, "created_at": base + timedelta(minutes=i)} for i in range(n, 0, -1)]
+
+    def test_cursor_round_trip(self):
+        created_at = datetime(2026, 1, 6, 20, 56, 1, 123456)
+        self.assertEqual(decode_cursor(encode_cursor(created_at, 42)), (created_at, 42))
+        with self.assertRaises(ValueError):
+            decode_cursor("nie-kursor")
+
+    def test_first_page_has_only_next_cursor(self):
+        tasks = self.make_tasks(3)
+        with mock.patch.object(task_read_sql_service, "list_tasks_with_attachments", return_value=tasks) as fetch:
+            page = task_read_sql_service.list_tasks_page(user_id=1, page_size=2)
+
+        self.assertEqual(fetch.call_args.kwargs["limit"], 3)
+        self.assertEqual([t["id"] for t in page["tasks"]], [3, 2])
+        self.assertIsNone(page["prev_cursor"])
+        self.assertEqual(decode_cursor(page["next_cursor"])[1], 2)
+
+    def test_before_page_drops_extra_newest_task(self):
+        tasks = self.make_tasks(3)
+        cursor = encode_cursor(datetime(2026, 1, 1), 0)
+        with mock.patch.object(task_read_sql_service, "list_tasks_with_attachments", return_value=tasks):
+            page = task_read_sql_service.list_tasks_page(user_id=1, before=cursor, page_size=2)
+
+        self.assertEqual([t["id"] for t in page["tasks"]], [2, 1])
+        self.assertEqual(decode_cursor(page["prev_cursor"])[1], 2)
+        self.assertEqual(decode_cursor(page["next_cursor"])[1], 1)
+
+
+class TaskCacheTests(SimpleTestCase):
+    def setUp(self):
+        caches["default"].clear()
+
+    def test_page_is_cached_until_invalidated(self):
+        page = {"tasks": [], "next_cursor": None, "prev_cursor": None}
+        with mock.patch.object(task_cache, "list_tasks_page", return_value=page) as load:
+            task_cache.get_task_page(user_id=1, group="Praca")
+            task_cache.get_task_page(user_id=1, group="Praca")
+            self.assertEqual(load.call_count, 1)
+
+            task_cache.get_task_page(user_id=1)
+            task_cache.get_task_page(user_id=2, group="Praca")
+            self.assertEqual(load.call_count, 3)
+
+            task_cache.invalidate(1)
+            task_cache.get_task_page(user_id=1, group="Praca")
+            task_cache.get_task_page(user_id=2, group="Praca")
+            self.assertEqual(load.call_count, 4)
+
+    def test_invalidate_survives_evicted_version(self):
+        task_cache.invalidate(7)
+        caches["default"].delete("tasklist:7:version")
+        task_cache.invalidate(7)
+        self.assertIsNotNone(caches["default"].get("tasklist:7:version"))
+
+
+class AttachmentUploadTests(SimpleTestCase):
+    def test_spool_copies_in_memory_upload(self):
+        upload = SimpleUploadedFile("raport.pdf", b"%PDF-1.4 test")
+        path = attachment_uploads.spool(upload)
+        self.addCleanup(lambda: os.path.exists(path) and os.remove(path))
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), b"%PDF-1.4 test")
+
+    def test_run_marks_ready_and_removes_spooled_file(self):
+        path = attachment_uploads.spool(SimpleUploadedFile("a.txt", b"abc"))
+        with mock.patch.object(attachment_uploads, "_claim", return_value=True), \
+                mock.patch.object(attachment_uploads, "upload_file") as upload, \
+                mock.patch.object(attachment_uploads, "_set_status") as set_status, \
+                mock.patch.object(attachment_uploads.task_cache, "invalidate") as invalidate:
+            attachment_uploads._run(user_id=1, attachment_id=5, path=path, object_key="k", content_type="text/plain")
+
+        self.assertEqual(upload.call_args.kwargs["object_key"], "k")
+        set_status.assert_called_once_with(5, "ready")
+        invalidate.assert_called_once_with(1)
+        self.assertFalse(os.path.exists(path))
+
+    def test_run_marks_failed_on_upload_error(self):
+        path = attachment_uploads.spool(SimpleUploadedFile("a.txt", b"abc"))
+        with mock.patch.object(attachment_uploads, "_claim", return_value=True), \
+                mock.patch.object(attachment_uploads, "upload_file", side_effect=RuntimeError("S3")), \
+                mock.patch.object(attachment_uploads, "_set_status") as set_status, \
+                mock.patch.object(attachment_uploads.task_cache, "invalidate"), \
+                self.assertLogs("todo.services.attachment_uploads", "ERROR"):
+            attachment_uploads._run(user_id=1, attachment_id=5, path=path, object_key="k", content_type=None)
+
+        set_status.assert_called_once_with(5, "failed")
+        self.assertFalse(os.path.exists(path))
+
+    def test_run_leaves_pending_when_status_update_fails(self):
+        path = attachment_uploads.spool(SimpleUploadedFile("a.txt", b"abc"))
+        self.addCleanup(lambda: os.path.exists(path) and os.remove(path))
+        with mock.patch.object(attachment_uploads, "_claim", return_value=True), \
+                mock.patch.object(attachment_uploads, "upload_file"), \
+                mock.patch.object(attachment_uploads, "_set_status", side_effect=RuntimeError("MySQL")) as set_status, \
+                mock.patch.object(attachment_uploads.task_cache, "invalidate"), \
+                self.assertLogs("todo.services.attachment_uploads", "ERROR"):
+            attachment_uploads._run(user_id=1, attachment_id=5, path=path, object_key="k", content_type=None)
+
+        # Plik jest w S3, ale bez statusu: nie failed, a spool zostaje dla recover_uploads.
+        set_status.assert_called_once_with(5, "ready")
+        self.assertTrue(os.path.exists(path))
+
+    def test_run_skips_upload_claimed_elsewhere(self):
+        path = attachment_uploads.spool(SimpleUploadedFile("a.txt", b"abc"))
+        self.addCleanup(lambda: os.path.exists(path) and os.remove(path))
+        with mock.patch.object(attachment_uploads, "_claim", return_value=False), \
+                mock.patch.object(attachment_uploads, "upload_file") as upload:
+            attachment_uploads._run(user_id=1, attachment_id=5, path=path, object_key="k", content_type=None)
+
+        upload.assert_not_called()
+        self.assertTrue(os.path.exists(path))
+
+
+class DirectUploadTests(SimpleTestCase):
+    def start(self):
+        post = {"url": "https://bucket", "fields": {"key": "k"}}
+        with mock.patch.object(direct_uploads.oss, "presigned_post", return_value=post):
+            return direct_uploads.start(user_id=1, task_id=9, filename="plan.pdf", content_type="application/pdf")
+
+    def test_confirm_records_attachment_after_head(self):
+        upload = self.start()
+        with mock.patch.object(direct_uploads.oss, "head_object", return_value={"ContentLength": 10}), \
+                mock.patch.object(direct_uploads, "add_attachment_sql", return_value=3) as add:
+            attachment = direct_uploads.confirm(user_id=1, task_id=9, token=upload["token"])
+
+        self.assertEqual(attachment["id"], 3)
+        self.assertTrue(add.call_args.kwargs["object_key"].startswith("uploads/user_1/task_9/"))
+
+    def test_confirm_rejects_foreign_token_and_missing_object(self):
+        upload = self.start()
+        with self.assertRaises(direct_uploads.DirectUploadError):
+            direct_uploads.confirm(user_id=2, task_id=9, token=upload["token"])
+        with self.assertRaises(direct_uploads.DirectUploadError):
+            direct_uploads.confirm(user_id=1, task_id=9, token=upload["token"] + "x")
+        with mock.patch.object(direct_uploads.oss, "head_object", return_value=None), \
+                self.assertRaises(direct_uploads.DirectUploadError):
+            direct_uploads.confirm(user_id=1, task_id=9, token=upload["token"])
+
+
+class OssTransferTests(SimpleTestCase):
+    @override_settings(S3_MULTIPART_THRESHOLD=5 * 1024 * 1024, S3_MULTIPART_CHUNKSIZE=6 * 1024 * 1024, S3_MAX_CONCURRENCY=3)
+    def test_transfer_config_comes_from_settings(self):
+        config = oss.transfer_config()
+        self.assertEqual(config.multipart_threshold, 5 * 1024 * 1024)
+        self.assertEqual(config.multipart_chunksize, 6 * 1024 * 1024)
+        self.assertEqual(config.max_concurrency, 3)
+
+    @mock.patch.dict(os.environ, {"S3_ACCESS_KEY": "a", "S3_SECRET_KEY": "b"})
+    def test_client_is_created_once(self):
+        with mock.patch.object(oss, "_s3_client", None):
+            client = oss.get_client()
+            self.assertIs(oss.get_client(), client)
+            self.assertEqual(client.meta.config.max_pool_connections, settings.S3_MAX_POOL_CONNECTIONS)
+
+    def test_upload_file_uses_transfer_config_and_records_throughput(self):
+        path = attachment_uploads.spool(SimpleUploadedFile("a.bin", b"x" * 1000))
+        self.addCleanup(os.remove, path)
+        before = oss.upload_stats()
+        client = mock.Mock()
+        with mock.patch.object(oss, "get_client", return_value=client), self.assertLogs("todo.services.oss", "INFO"):
+            url = oss.upload_file(path=path, object_key="uploads/a.bin", content_type="application/octet-stream")
+
+        self.assertTrue(url.endswith("/uploads/a.bin"))
+        self.assertIsInstance(client.upload_file.call_args.kwargs["Config"], TransferConfig)
+        self.assertEqual(oss.upload_stats()["uploads"], before["uploads"] + 1)
+        self.assertEqual(oss.upload_stats()["bytes"], before["bytes"] + 1000)
+
+
+class UploadHandlerTests(SimpleTestCase):
+    data = b"0123456789"
+
+    def parse(self, user=None, data=None):
+        upload = SimpleUploadedFile("a.txt", data or self.data)
+        request = RequestFactory().post("/", {"title": "Zadanie", "file": upload})
+        request.user = user
+        request.upload_handlers = [AttachmentUploadHandler(request)]
+        request.FILES  # parsowanie
+        return request
+
+    @override_settings(ATTACHMENT_MAX_SIZE=9)
+    def test_oversized_file_is_rejected_while_streaming(self):
+        request = self.parse()
+        self.assertTrue(upload_too_large(request))
+        self.assertNotIn("file", request.FILES)
+        self.assertEqual(request.POST["title"], "Zadanie")
+
+        with mock.patch.object(views, "create_task_sql") as create, mock.patch.object(views, "messages") as msgs:
+            request.user = mock.Mock(id=1, is_authenticated=True)
+            views.create_task(request)
+        create.assert_not_called()
+        msgs.error.assert_called_once()
+
+    def test_spools_to_temporary_file_with_checksum(self):
+        upload = self.parse().FILES["file"]
+        self.addCleanup(upload.close)
+        self.assertTrue(hasattr(upload, "temporary_file_path"))
+        self.assertEqual(upload.read(), self.data)
+        self.assertEqual(upload.sha256, hashlib.sha256(self.data).hexdigest())
+
+    @override_settings(ATTACHMENT_STREAM_TO_S3=True, S3_MULTIPART_CHUNKSIZE=4)
+    def test_streams_parts_to_s3_without_temporary_file(self):
+        client = mock.Mock()
+        client.create_multipart_upload.return_value = {"UploadId": "u1"}
+        client.upload_part.side_effect = lambda **kw: {"ETag": f"e{kw['PartNumber']}"}
+        user = mock.Mock(id=7, is_authenticated=True)
+        with mock.patch.object(oss, "get_client", return_value=client), mock.patch.object(oss, "MIN_PART_SIZE", 4), \
+                self.assertLogs("todo.services.oss", "INFO"):
+            upload = self.parse(user=user).FILES["file"]
+
+        self.assertIsInstance(upload, StreamedUploadedFile)
+        self.assertTrue(upload.object_key.startswith("uploads/user_7/"))
+        self.assertEqual(upload.sha256, hashlib.sha256(self.data).hexdigest())
+        self.assertEqual([c.kwargs["Body"] for c in client.upload_part.call_args_list], [b"0123", b"4567", b"89"])
+        parts = client.complete_multipart_upload.call_args.kwargs["MultipartUpload"]["Parts"]
+        self.assertEqual([p["ETag"] for p in parts], ["e1", "e2", "e3"])
+
+    @override_settings(ATTACHMENT_STREAM_TO_S3=True, S3_MULTIPART_CHUNKSIZE=64 * 1024, ATTACHMENT_MAX_SIZE=150_000)
+    def test_aborts_multipart_upload_of_oversized_file(self):
+        client = mock.Mock()
+        client.create_multipart_upload.return_value = {"UploadId": "u1"}
+        client.upload_part.return_value = {"ETag": "e"}
+        with mock.patch.object(oss, "get_client", return_value=client), mock.patch.object(oss, "MIN_PART_SIZE", 4):
+            # Parser podaje plik kawałkami po 64 KB – część idzie do S3, zanim limit zostanie przekroczony.
+            request = self.parse(user=mock.Mock(id=7, is_authenticated=True), data=b"x" * 200_000)
+
+        self.assertTrue(upload_too_large(request))
+        self.assertTrue(client.upload_part.called)
+        client.abort_multipart_upload.assert_called_once()
+        client.complete_multipart_upload.assert_not_called()
+
+
+class AsyncViewTests(SimpleTestCase):
+    def test_run_blocking_is_bounded_by_executor(self):
+        lock = threading.Lock()
+        running = {"now": 0, "max": 0}
+
+        def blocking():
+            with lock:
+                running["now"] += 1
+                running["max"] = max(running["max"], running["now"])
+            time.sleep(0.02)
+            with lock:
+                running["now"] -= 1
+
+        async def many():
+            await asyncio.gather(*(async_views.run_blocking(blocking) for _ in range(8)))
+
+        executor = ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(executor.shutdown)
+        with mock.patch.object(async_views, "_executor", executor):
+            asyncio.run(many())
+
+        self.assertEqual(running["max"], 2)
+
+    def test_delete_task_offloads_service_call(self):
+        request = RequestFactory().post("/tasks/3/delete/")
+        user = mock.Mock(id=7, is_authenticated=True)
+
+        async def auser():
+            return user
+
+        request.auser = auser
+        with mock.patch.object(async_views, "delete_task_sql") as delete:
+            response = asyncio.run(async_views.delete_task(request, task_id=3))
+
+        self.assertEqual(response.status_code, 302)
+        delete.assert_called_once_with(user_id=7, task_id=3)
+
+
+class BulkTaskTests(SimpleTestCase):
+    def test_bulk_statements_share_one_transaction(self):
+        conn = mock.MagicMock()
+        cur = conn.cursor.return_value.__enter__.return_value
+        cur.rowcount = 2
+        with mock.patch.object(task_sql_service, "connection") as connection, \
+                mock.patch.object(task_sql_service, "BULK_CHUNK_SIZE", 2), \
+                mock.patch.object(task_sql_service.task_cache, "invalidate") as invalidate:
+            connection.return_value.__enter__.return_value = conn
+            affected = task_sql_service.bulk_set_status_sql(user_id=4, task_ids=["3", 1, 2, 3], status="archived")
+
+        self.assertEqual(affected, 4)
+        self.assertEqual(cur.execute.call_count, 2)
+        sql, params = cur.execute.call_args_list[0].args
+        self.assertIn("id IN (%s, %s)", sql)
+        self.assertEqual(params, ("archived", mock.ANY, 4, 1, 2))
+        self.assertEqual(conn.method_calls[0], mock.call.begin())
+        conn.commit.assert_called_once()
+        invalidate.assert_called_once_with(4)
+
+    def test_each_chunk_stamps_updated_at_when_it_runs(self):
+        conn = mock.MagicMock()
+        cur = conn.cursor.return_value.__enter__.return_value
+        cur.rowcount = 2
+        first, second = timezone.now(), timezone.now() + timedelta(seconds=5)
+        with mock.patch.object(task_sql_service, "connection") as connection, \
+                mock.patch.object(task_sql_service, "BULK_CHUNK_SIZE", 2), \
+                mock.patch.object(task_sql_service, "timezone") as clock, \
+                mock.patch.object(task_sql_service, "_written"):
+            connection.return_value.__enter__.return_value = conn
+            clock.now.side_effect = [first, second]
+            task_sql_service.bulk_move_sql(user_id=4, task_ids=[1, 2, 3], group="Praca")
+
+        stamps = [c.args[1][1] for c in cur.execute.call_args_list]
+        self.assertEqual(stamps, [first, second])
+
+    def test_failed_chunk_rolls_back_earlier_chunks(self):
+        conn = mock.MagicMock()
+        cur = conn.cursor.return_value.__enter__.return_value
+        cur.rowcount = 2
+        cur.execute.side_effect = [None, RuntimeError("deadlock")]
+        with mock.patch.object(task_sql_service, "connection") as connection, \
+                mock.patch.object(task_sql_service, "BULK_CHUNK_SIZE", 2), \
+                mock.patch.object(task_sql_service.task_cache, "invalidate") as invalidate, \
+                self.assertRaises(RuntimeError):
+            connection.return_value.__enter__.return_value = conn
+            task_sql_service.bulk_set_status_sql(user_id=4, task_ids=[1, 2, 3], status="done")
+
+        conn.begin.assert_called_once()
+        conn.rollback.assert_called_once()
+        conn.commit.assert_not_called()
+        invalidate.assert_not_called()
+
+    def test_delete_keeps_attachments_when_task_delete_fails(self):
+        def execute(sql, params=()):
+            if sql.strip().startswith("DELETE FROM tasks"):
+                raise RuntimeError("lock wait timeout")
+
+        for delete in (
+            lambda: task_sql_service.delete_task_sql(user_id=4, task_id=1),
+            lambda: task_sql_service.bulk_delete_sql(user_id=4, task_ids=[1, 2]),
+        ):
+            conn = mock.MagicMock()
+            cur = conn.cursor.return_value.__enter__.return_value
+            cur.execute.side_effect = execute
+            cur.fetchall.return_value = []
+            with mock.patch.object(task_sql_service, "connection") as connection, self.assertRaises(RuntimeError):
+                connection.return_value.__enter__.return_value = conn
+                delete()
+
+            # DELETE FROM attachments poszedł w tej samej transakcji – rollback go cofa.
+            self.assertEqual(conn.method_calls[0], mock.call.begin())
+            self.assertTrue(any("DELETE FROM attachments" in c.args[0] for c in cur.execute.call_args_list))
+            conn.rollback.assert_called_once()
+            conn.commit.assert_not_called()
+
+    def test_rejects_unknown_status(self):
+        with self.assertRaises(ValueError):
+            task_sql_service.bulk_set_status_sql(user_id=1, task_ids=[1], status="gone")
+
+    def test_view_dispatches_selected_action(self):
+        factory = RequestFactory()
+        request = factory.post("/tasks/bulk/", {"action": "move", "group": "Praca", "task_ids": ["5", "x", "6"]})
+        request.user = mock.Mock(id=2, is_authenticated=True)
+        with mock.patch.object(views, "bulk_move_sql") as move:
+            response = views.bulk_tasks(request)
+
+        self.assertEqual(response.status_code, 302)
+        move.assert_called_once_with(user_id=2, task_ids=[5, 6], group="Praca")
+
+        request = factory.post("/tasks/bulk/", {"action": "move", "group": "Nieznana", "task_ids": ["5"]})
+        request.user = mock.Mock(id=2, is_authenticated=True)
+        with mock.patch.object(views, "bulk_move_sql") as move:
+            views.bulk_tasks(request)
+        move.assert_not_called()
+
+
+class DjangoDBConnection:
+    """Połączenie z puli podmienione na testową bazę Django (SQLite, z migracjami)."""
+
+    vendor = db_connection.vendor
+
+    def cursor(self):
+        return DictCursor()
+
+    def begin(self):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class SavepointConnection(DjangoDBConnection):
+    """Transakcja połączenia z puli jako savepoint testowej bazy – rollback naprawdę cofa zapisy."""
+
+    def begin(self):
+        self._savepoint = transaction.savepoint()
+
+    def commit(self):
+        transaction.savepoint_commit(self._savepoint)
+
+    def rollback(self):
+        transaction.savepoint_rollback(self._savepoint)
+
+
+class DictCursor:
+    def __init__(self):
+        self._cur = db_connection.cursor()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cur.close()
+
+    @property
+    def lastrowid(self):
+        return self._cur.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cur.rowcount
+
+    def execute(self, sql, params=()):
+        self._cur.execute(sql, params)
+        instrumentation.record_query(sql, 0, params=params)
+
+    def fetchone(self):
+        rows = self.fetchall()
+        return rows[0] if rows else None
+
+    def fetchall(self):
+        columns = [c[0] for c in self._cur.description]
+        return [dict(zip(columns, row)) for row in self._cur.fetchall()]
+
+
+def use_test_db(test, *modules):
+    for module in modules:
+        for name in ("connection", "read_connection"):
+            if hasattr(module, name):
+                patcher = mock.patch.object(module, name)
+                patcher.start().return_value.__enter__.return_value = DjangoDBConnection()
+                test.addCleanup(patcher.stop)
+
+
+class TaskSearchTests(TestCase):
+    def setUp(self):
+        use_test_db(self, task_read_sql_service)
+
+        self.user = User.objects.create(mail="a@fomo.local", password="!")
+        other = User.objects.create(mail="b@fomo.local", password="!")
+        self.towel = Task.objects.create(user=self.user, title="Kupić ręcznik", description="ręcznik ręcznik")
+        self.both = Task.objects.create(user=self.user, title="Ręcznik i mydło")
+        Task.objects.create(user=self.user, title="Umyć okna")
+        Task.objects.create(user=other, title="Ręcznik sąsiada")
+
+    def test_ranked_pages_scoped_to_user(self):
+        first = task_read_sql_service.search_tasks_page(user_id=self.user.id, query="ręcznik", page_size=1)
+        self.assertEqual([t["id"] for t in first["tasks"]], [self.towel.id])
+        self.assertIsNotNone(first["next_cursor"])
+
+        second = task_read_sql_service.search_tasks_page(
+            user_id=self.user.id, query="ręcznik", page_size=1, after=first["next_cursor"]
         )
-        task.toggle_completion()
-        self.assertTrue(task.is_completed)
-        self.assertEqual(Task.objects.count(), 2)
+        self.assertEqual([t["id"] for t in second["tasks"]], [self.both.id])
+        self.assertIsNone(second["next_cursor"])
+
+    def test_pages_stop_at_max_results(self):
+        with override_settings(SEARCH_MAX_RESULTS=1):
+            first = task_read_sql_service.search_tasks_page(user_id=self.user.id, query="ręcznik", page_size=5)
+        self.assertEqual([t["id"] for t in first["tasks"]], [self.towel.id])
+        self.assertIsNone(first["next_cursor"])
+
+        beyond = task_read_sql_service.encode_search_cursor(1000)
+        self.assertEqual(task_read_sql_service.search_tasks_page(user_id=self.user.id, query="ręcznik", after=beyond)["tasks"], [])
+        with self.assertRaises(ValueError):
+            task_read_sql_service.search_tasks_page(user_id=self.user.id, query="ręcznik", after=encode_cursor(timezone.now(), 1))
+
+    def test_index_follows_writes_and_matches_prefixes(self):
+        Task.objects.filter(id=self.both.id).update(title="Mydło")
+        result = task_read_sql_service.search_tasks_page(user_id=self.user.id, query="myd")
+        self.assertEqual([t["id"] for t in result["tasks"]], [self.both.id])
+
+        result = task_read_sql_service.search_tasks_page(user_id=self.user.id, query="ręcznik")
+        self.assertEqual([t["id"] for t in result["tasks"]], [self.towel.id])
+
+    def test_blank_query_returns_nothing(self):
+        result = task_read_sql_service.search_tasks_page(user_id=self.user.id, query=" !? ")
+        self.assertEqual(result["tasks"], [])
+        self.assertEqual(search_index.search_terms("Kupić RĘCZNIK, +mydło*"), ["kupić", "ręcznik", "mydło"])
+
+    def test_mysql_match_is_limited_to_owner_in_index(self):
+        sql, params = task_read_sql_service._search_source("mysql", ["ręcznik"], user_id=7)
+        self.assertIn("MATCH(search_owner, title, description)", sql)
+        self.assertEqual(params, ["+fomouser7 +ręcznik*"] * 2)
+        # Słowo z tokenem innego użytkownika nic nie daje – wiersz ma tylko token swojego właściciela.
+        self.assertEqual(search_index.match_query("mysql", ["fomouser8"], user_id=7), "+fomouser7 +fomouser8*")
+
+
+class ReminderTests(TestCase):
+    def setUp(self):
+        use_test_db(self, reminders)
+        self.user = User.objects.create(mail="a@fomo.local", password="!")
+        self.past = timezone.now() - timedelta(minutes=5)
+
+    def task(self, **fields):
+        fields.setdefault("remind_at", self.past)
+        fields.setdefault("title", "Zadanie")
+        return Task.objects.create(user=self.user, **fields)
+
+    def test_sends_due_reminders_once(self):
+        due = [self.task(title="Pierwsze"), self.task(title="Drugie")]
+        self.task(remind_at=timezone.now() + timedelta(hours=1))
+        self.task(status="done")
+        self.task(reminder_sent_at=self.past)
+
+        self.assertEqual(reminders.run_once(worker="w1", batch_size=10, claim_ttl=60), 2)
+        self.assertEqual(sorted(m.subject for m in mail.outbox), ["Przypomnienie: Drugie", "Przypomnienie: Pierwsze"])
+        self.assertEqual(mail.outbox[0].to, ["a@fomo.local"])
+        for task in due:
+            task.refresh_from_db()
+            self.assertIsNotNone(task.reminder_sent_at)
+            self.assertIsNone(task.reminder_claimed_by)
+
+        self.assertEqual(reminders.run_once(worker="w1", batch_size=10, claim_ttl=60), 0)
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_skips_live_claims_and_retakes_expired_ones(self):
+        self.task(reminder_claimed_by="w2:abc", reminder_claimed_at=timezone.now())
+        expired = self.task(reminder_claimed_by="w3:abc", reminder_claimed_at=timezone.now() - timedelta(hours=1))
+
+        rows = reminders.claim_due(worker="w1", limit=10, claim_ttl=60)
+
+        self.assertEqual([r["id"] for r in rows], [expired.id])
+        expired.refresh_from_db()
+        self.assertTrue(expired.reminder_claimed_by.startswith("w1:"))
+
+    @override_settings(REMINDER_MAX_ATTEMPTS=2)
+    def test_failing_reminder_is_abandoned_after_max_attempts(self):
+        task = self.task()
+        stale = timezone.now() - timedelta(hours=1)
+        with mock.patch.object(reminders, "get_connection") as smtp, \
+                self.assertLogs("todo.services.reminders", "ERROR") as logs:
+            smtp.return_value.__enter__.return_value.send_messages.side_effect = OSError("550 mailbox unavailable")
+            for _ in range(3):
+                reminders.run_once(worker="w1", batch_size=10, claim_ttl=60)
+                Task.objects.filter(id=task.id).update(reminder_claimed_at=stale)
 
-    def test_move_between_groups(self):
-        task = Task.objects.create(title="Przenieś mnie", group=self.group_home, position=1)
-        task.move_to(self.group_work, position=5)
         task.refresh_from_db()
-        self.assertEqual(task.group, self.group_work)
-        self.assertEqual(task.position, 5)
+        self.assertEqual(task.reminder_attempts, 2)
+        self.assertIsNone(task.reminder_sent_at)
+        self.assertTrue(any("porzucone" in line for line in logs.output))
+        self.assertEqual(reminders.claim_due(worker="w1", limit=10, claim_ttl=60), [])
 
+    def test_worker_survives_failed_batch(self):
+        command = send_reminders.Command(stdout=io.StringIO())
+        command._sleep = mock.Mock(side_effect=lambda seconds: setattr(command, "_stop", True))
+        with mock.patch.object(send_reminders.reminders, "run_once", side_effect=RuntimeError("db down")) as run_once, \
+                mock.patch.object(send_reminders.signal, "signal"), \
+                self.assertLogs("todo.management.commands.send_reminders", "ERROR"):
+            command.handle(batch_size=10, interval=5, once=False)
 
-class TaskGroupTests(TestCase):
-    def test_slug_is_generated(self):
-        group = TaskGroup.objects.create(name="Porządki domowe", color="#ffffff")
-        self.assertTrue(group.slug.startswith("porzadki-domowe"))
+        run_once.assert_called_once()
+        command._sleep.assert_called_once_with(5)
+
+
+class InstrumentationTests(TestCase):
+    def test_fingerprint_ignores_values_and_in_list_length(self):
+        a = instrumentation.sql_fingerprint("SELECT * FROM attachments WHERE task_id IN (%s, %s) AND status = 'ready'")
+        b = instrumentation.sql_fingerprint("SELECT *  FROM attachments\nWHERE task_id IN (%s) AND status = 'failed'")
+        self.assertEqual(a, b)
+
+    @override_settings(INSTRUMENTATION_SERVER_TIMING=True, INSTRUMENTATION_N_PLUS_ONE_THRESHOLD=3)
+    def test_middleware_reports_queries_templates_and_n_plus_one(self):
+        def view(request):
+            User.objects.count()
+            for task_id in range(3):
+                instrumentation.record_query(f"SELECT * FROM attachments WHERE task_id = {task_id}", 0.001)
+            return HttpResponse(render_to_string("todo/login.html", {"form": None}, request=request))
+
+        middleware = RequestInstrumentationMiddleware(view)
+        with self.assertLogs("todo.requests", "WARNING") as logs:
+            response = middleware(RequestFactory().get("/"))
+
+        timing = response["Server-Timing"]
+        self.assertIn('desc="SQL x3"', timing)
+        self.assertIn('desc="ORM x1"', timing)
+        self.assertNotIn("tpl;dur=0.0,", timing)
+        self.assertIn('"n_plus_one"', logs.output[0])
+        self.assertIn("task_id = ?", logs.output[0])
+
+    def test_s3_calls_are_counted_inside_request_only(self):
+        client = boto3.client(
+            "s3", region_name="us-east-1", aws_access_key_id="a", aws_secret_access_key="b"
+        )
+        instrumentation.instrument_s3_client(client)
+        stats, token = instrumentation.start()
+        try:
+            with Stubber(client) as stub:
+                stub.add_response("put_object", {}, {"Bucket": "b", "Key": "k", "Body": b"x" * 10})
+                client.put_object(Bucket="b", Key="k", Body=b"x" * 10)
+        finally:
+            instrumentation.stop(token)
+
+        self.assertEqual((stats.s3_calls, stats.s3_bytes), (1, 10))
+        self.assertIsNone(instrumentation.current())
+
+
+@override_settings(TASK_SYNC_SETTLE_SECONDS=0)
+class TaskSyncTests(TestCase):
+    def setUp(self):
+        use_test_db(self, task_sql_service, task_sync_service)
+        self.user = User.objects.create(mail="a@fomo.local", password="!")
+        other = User.objects.create(mail="b@fomo.local", password="!")
+        task_sql_service.create_task_sql(user_id=other.id, title="Cudzy", description="", group="Praca", status="todo")
+
+    def _create(self, title):
+        return task_sql_service.create_task_sql(
+            user_id=self.user.id, title=title, description="", group="Praca", status="todo"
+        )
+
+    def test_full_sync_then_only_deltas(self):
+        a, b, c = self._create("A"), self._create("B"), self._create("C")
+
+        first = task_sync_service.get_changes(user_id=self.user.id, limit=2)
+        self.assertEqual([t["id"] for t in first["changed"]], [a, b])
+        self.assertTrue(first["has_more"])
+        second = task_sync_service.get_changes(user_id=self.user.id, since=first["cursor"], limit=2)
+        self.assertEqual([t["id"] for t in second["changed"]], [c])
+        self.assertFalse(second["has_more"])
+
+        empty = task_sync_service.get_changes(user_id=self.user.id, since=second["cursor"])
+        self.assertEqual((empty["changed"], empty["deleted"]), ([], []))
+
+        task_sql_service.update_task_sql(
+            user_id=self.user.id, task_id=a, title="A2", description="", group="Praca", status="done"
+        )
+        task_sql_service.bulk_delete_sql(user_id=self.user.id, task_ids=[b])
+        delta = task_sync_service.get_changes(user_id=self.user.id, since=empty["cursor"])
+        self.assertEqual([(t["id"], t["title"]) for t in delta["changed"]], [(a, "A2")])
+        self.assertEqual(delta["deleted"], [b])
+
+        # Usunięcia sprzed pełnej synchronizacji nie są odsyłane.
+        self.assertEqual(task_sync_service.get_changes(user_id=self.user.id)["deleted"], [])
+
+    def test_recent_writes_wait_for_settle_window(self):
+        self._create("A")
+        with override_settings(TASK_SYNC_SETTLE_SECONDS=60):
+            changes = task_sync_service.get_changes(user_id=self.user.id)
+        self.assertEqual(changes["changed"], [])
+        later = task_sync_service.get_changes(user_id=self.user.id, since=changes["cursor"])
+        self.assertEqual(len(later["changed"]), 1)
+
+    def test_event_arrives_when_change_is_visible(self):
+        subscribed, received = threading.Event(), {}
+
+        async def listen():
+            with task_events.subscribe(self.user.id) as sub:
+                subscribed.set()
+                received["event"] = await sub.get(5)
+                received["at"] = time.monotonic()
+
+        # Strumień na własnej pętli w innym wątku, zapis z tego wątku – jak pod ASGI z run_blocking.
+        listener = threading.Thread(target=asyncio.run, args=(listen(),))
+        listener.start()
+        subscribed.wait(1)
+        with override_settings(TASK_SYNC_SETTLE_SECONDS=2):
+            task_id = self._create("A")
+            written = time.monotonic()
+            early = task_sync_service.get_changes(user_id=self.user.id)
+            listener.join(6)
+            changes = task_sync_service.get_changes(user_id=self.user.id)
+
+        # Zapis jeszcze w oknie – zdarzenie czeka, aż /tasks/changes/ go odda.
+        self.assertEqual(early["changed"], [])
+        self.assertEqual(received["event"]["task_ids"], [task_id])
+        self.assertGreaterEqual(received["at"] - written, 1.9)
+        self.assertEqual([t["id"] for t in changes["changed"]], [task_id])
+
+    def test_orm_delete_and_stale_cursor(self):
+        task_id = Task.objects.create(user=self.user, title="A").id
+        cursor = task_sync_service.get_changes(user_id=self.user.id)["cursor"]
+        Task.objects.filter(id=task_id).delete()
+        self.assertTrue(TaskTombstone.objects.filter(user_id=self.user.id, task_id=task_id).exists())
+        self.assertEqual(task_sync_service.get_changes(user_id=self.user.id, since=cursor)["deleted"], [task_id])
+
+        stale = task_sync_service.encode_sync_cursor(timezone.now() - timedelta(days=31), None, 0, 0)
+        self.assertTrue(task_sync_service.get_changes(user_id=self.user.id, since=stale)["reset"])
+        with self.assertRaises(ValueError):
+            task_sync_service.get_changes(user_id=self.user.id, since="zly")
+
+    def test_naive_cursor_time_is_read_as_utc(self):
+        # Kursor z naiwną datą (np. updated_at prosto z pymysql) – bez strefy to UTC.
+        naive = datetime(2026, 1, 2, 3, 4, 5)
+        synced_at, _, _, _ = task_sync_service.decode_sync_cursor(
+            task_sync_service.encode_sync_cursor(naive, naive, 1, 0)
+        )
+        self.assertEqual(synced_at, datetime(2026, 1, 2, 3, 4, 5, tzinfo=dt_timezone.utc))
+
+        recent = task_sync_service.encode_sync_cursor(timezone.now().replace(tzinfo=None), None, 0, 0)
+        self.assertFalse(task_sync_service.get_changes(user_id=self.user.id, since=recent)["reset"])
+
+
+class CachedAuthTests(TestCase):
+    def setUp(self):
+        caches["default"].clear()
+        self.user = User.objects.create_user(email="a@fomo.local", password="haslo-123", is_staff=True)
+        self.client.force_login(self.user)
+        self.client.get("/metrics/")
+
+    def test_authenticated_request_without_session_or_user_queries(self):
+        with self.assertNumQueries(0):
+            response = self.client.get("/metrics/")
+        self.assertEqual(response.status_code, 200)
+
+        with self.assertNumQueries(0):
+            user = asyncio.run(CachedUserBackend().aget_user(self.user.id))
+        self.assertEqual(user.mail, "a@fomo.local")
+
+    def test_password_or_active_change_invalidates_cached_user(self):
+        self.user.set_password("nowe-haslo-456")
+        self.user.save()
+        self.assertEqual(self.client.get("/metrics/").status_code, 403)
+
+        self.client.force_login(self.user)
+        User.objects.get(id=self.user.id).save()
+        self.user.is_active = False
+        self.user.save(update_fields=["is_active"])
+        self.assertEqual(self.client.get("/metrics/").status_code, 403)
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        use_test_db(self, outbox)
+
+    def test_registration_enqueues_provisioning_instead_of_calling_ovh(self):
+        with mock.patch.object(ovh_users, "provision_users") as provision:
+            response = self.client.post("/register/", {"email": "Nowy@fomo.local", "password": "haslo-123"})
+
+        self.assertEqual(response.status_code, 302)
+        provision.assert_not_called()
+        user = User.objects.get(mail="nowy@fomo.local")
+        message = OutboxMessage.objects.get()
+        self.assertEqual((message.topic, message.payload["id"]), ("ovh_user", user.id))
+
+    def test_relay_delivers_batch_and_retries_failures_later(self):
+        for i in (1, 2):
+            outbox.enqueue("ovh_user", {"id": i, "mail": f"{i}@fomo.local", "password_hash": "x"})
+
+        with mock.patch.object(ovh_users, "provision_users", side_effect=RuntimeError("OVH niedostępne")):
+            self.assertEqual(outbox.run_once(worker="w", batch_size=10, claim_ttl=60), 2)
+        message = OutboxMessage.objects.first()
+        self.assertEqual(message.attempts, 1)
+        self.assertGreater(message.available_at, timezone.now())
+        self.assertEqual(outbox.run_once(worker="w", batch_size=10, claim_ttl=60), 0)
+
+        OutboxMessage.objects.update(available_at=timezone.now())
+        with mock.patch.object(ovh_users, "provision_users") as provision:
+            outbox.run_once(worker="w", batch_size=10, claim_ttl=60)
+        provision.assert_called_once()
+        self.assertEqual([p["id"] for p in provision.call_args.args[0]], [1, 2])
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    @override_settings(OUTBOX_MAX_ATTEMPTS=2)
+    def test_bad_message_is_isolated_and_dead_lettered(self):
+        for i in (1, 2, 3):
+            outbox.enqueue("ovh_user", {"id": i, "mail": f"{i}@fomo.local", "password_hash": "x"})
+
+        def provision(payloads):
+            if any(p["id"] == 2 for p in payloads):
+                raise ValueError("zły adres")
+
+        for _ in range(2):
+            with mock.patch.object(ovh_users, "provision_users", side_effect=provision), \
+                    self.assertLogs("todo.services.outbox", "ERROR"):
+                outbox.run_once(worker="w", batch_size=10, claim_ttl=60)
+            OutboxMessage.objects.update(available_at=timezone.now())
+
+        message = OutboxMessage.objects.get()
+        self.assertEqual((message.payload["id"], message.attempts), (2, 2))
+        self.assertIsNotNone(message.dead_at)
+        self.assertIn("zły adres", message.last_error)
+        self.assertEqual(outbox.run_once(worker="w", batch_size=10, claim_ttl=60), 0)
+
+    def test_relay_survives_database_errors(self):
+        command = relay_outbox.Command(stdout=io.StringIO())
+        command._sleep = mock.Mock(side_effect=lambda seconds: setattr(command, "_stop", True))
+        with mock.patch.object(relay_outbox.outbox, "run_once", side_effect=RuntimeError("db down")), \
+                mock.patch.object(relay_outbox.signal, "signal"), \
+                self.assertLogs("todo.management.commands.relay_outbox", "ERROR"):
+            command.handle(batch_size=10, interval=1, once=False)
+
+        command._sleep.assert_called_once_with(1)
+
+    def test_provisioning_is_one_idempotent_insert(self):
+        conn = mock.MagicMock(vendor="mysql")
+        cur = conn.cursor.return_value.__enter__.return_value
+        with mock.patch.object(ovh_users, "connection") as connection:
+            connection.return_value.__enter__.return_value = conn
+            ovh_users.provision_users([{"id": 1, "mail": "a@x", "password_hash": "h"}, {"id": 2, "mail": "b@x", "password_hash": "h"}])
+
+        sql, params = cur.execute.call_args.args
+        self.assertIn("VALUES (%s, %s, %s, %s), (%s, %s, %s, %s) ON DUPLICATE KEY UPDATE", sql)
+        self.assertEqual(params[:3] + params[4:7], [1, "a@x", "h", 2, "b@x", "h"])
+        cur.execute.assert_called_once()
+
+
+class AttachmentDedupTests(TestCase):
+    def setUp(self):
+        use_test_db(self, task_sql_service, attachment_store, attachment_uploads)
+        self.user = User.objects.create(mail="a@fomo.local", password="!")
+        for target, name in ((attachment_uploads, "enqueue"), (attachment_store, "delete_object")):
+            patcher = mock.patch.object(target, name)
+            setattr(self, name, patcher.start())
+            self.addCleanup(patcher.stop)
+        self.addCleanup(lambda: [
+            os.remove(call.kwargs["path"]) for call in self.enqueue.call_args_list if os.path.exists(call.kwargs["path"])
+        ])
+
+    def create(self, data=b"%PDF raport"):
+        upload = SimpleUploadedFile("raport.pdf", data, content_type="application/pdf")
+        upload.sha256 = hashlib.sha256(data).hexdigest()
+        return task_sql_service.create_task_sql(
+            user_id=self.user.id, title="Zadanie", description="", group="Ważne", status="todo", upload=upload
+        )
+
+    def test_same_content_is_uploaded_once_and_shared(self):
+        first, second = self.create(), self.create()
+        self.create(b"inny plik")
+
+        self.assertEqual(self.enqueue.call_count, 2)
+        a, b = (Attachment.objects.get(task_id=task_id) for task_id in (first, second))
+        self.assertEqual(a.object_key, b.object_key)
+        self.assertEqual(StoredObject.objects.get(object_key=a.object_key).ref_count, 2)
+
+        attachment_uploads._set_status(a.id, "ready")
+        self.assertEqual(set(Attachment.objects.filter(object_key=a.object_key).values_list("status", flat=True)), {"ready"})
+
+    def test_updated_at_is_taken_after_spool_and_object_lock(self):
+        marks = []
+
+        def marking(real):
+            def wrapper(*args, **kwargs):
+                result = real(*args, **kwargs)
+                marks.append(timezone.now())
+                return result
+            return wrapper
+
+        with mock.patch.object(attachment_uploads, "spool", marking(attachment_uploads.spool)), \
+                mock.patch.object(attachment_store, "acquire", marking(attachment_store.acquire)):
+            task_id = self.create()
+
+        self.assertEqual(len(marks), 2)
+        self.assertGreaterEqual(Task.objects.get(id=task_id).updated_at, max(marks))
+
+    def test_object_is_deleted_with_last_reference(self):
+        first, second = self.create(), self.create()
+        key = Attachment.objects.get(task_id=first).object_key
+
+        task_sql_service.delete_task_sql(user_id=self.user.id, task_id=first)
+        self.delete_object.assert_not_called()
+
+        task_sql_service.bulk_delete_sql(user_id=self.user.id, task_ids=[second])
+        self.delete_object.assert_called_once_with(key)
+        self.assertFalse(StoredObject.objects.exists())
+
+    def test_recover_pending_retries_spooled_and_fails_lost_uploads(self):
+        spooled, lost = self.create(), self.create(b"inny plik")
+        shared = self.create()
+        os.remove(Attachment.objects.get(task_id=lost).spool_path)
+        self.assertIsNone(Attachment.objects.get(task_id=shared).spool_path)
+        Attachment.objects.update(created_at=timezone.now() - timedelta(days=2))
+
+        with mock.patch.object(attachment_uploads, "upload_file") as upload:
+            stats = attachment_uploads.recover_pending(retry_after=timedelta(minutes=15), fail_after=timedelta(hours=24))
+
+        self.assertEqual(stats, {"retried": 1, "failed": 1})
+        self.assertEqual(upload.call_args.kwargs["content_type"], "application/pdf")
+        statuses = {a.task_id: a.status for a in Attachment.objects.all()}
+        self.assertEqual(statuses, {spooled: "ready", shared: "ready", lost: "failed"})
+        self.assertFalse(os.path.exists(self.enqueue.call_args_list[0].kwargs["path"]))
+
+
+    def test_recover_pending_skips_claimed_uploads(self):
+        task_id = self.create()
+        attachment = Attachment.objects.get(task_id=task_id)
+        Attachment.objects.update(created_at=timezone.now() - timedelta(hours=1))
+        # Wątek w tle właśnie wysyła – recover_uploads nie może wysłać drugi raz.
+        self.assertTrue(attachment_uploads._claim(attachment.id, ttl=timedelta(minutes=15)))
+        self.assertFalse(attachment_uploads._claim(attachment.id, ttl=timedelta(minutes=15)))
+
+        with mock.patch.object(attachment_uploads, "upload_file") as upload:
+            stats = attachment_uploads.recover_pending(retry_after=timedelta(minutes=15), fail_after=timedelta(hours=24))
+            self.assertEqual(stats, {"retried": 0, "failed": 0})
+            upload.assert_not_called()
+
+            # Przejęcie starsze niż retry_after – wysyłka zginęła, recover_uploads ją dokańcza.
+            Attachment.objects.update(upload_claimed_at=timezone.now() - timedelta(minutes=20))
+            stats = attachment_uploads.recover_pending(retry_after=timedelta(minutes=15), fail_after=timedelta(hours=24))
+
+        self.assertEqual(stats, {"retried": 1, "failed": 0})
+        self.assertEqual(Attachment.objects.get(id=attachment.id).status, "ready")
+
+class OrphanObjectsTests(TestCase):
+    def setUp(self):
+        use_test_db(self, orphan_objects)
+        user = User.objects.create(mail="a@fomo.local", password="!")
+        task = Task.objects.create(user=user, title="Z załącznikiem")
+        self.prefix = f"uploads/user_{user.id}"
+        self.kept = f"{self.prefix}/task_{task.id}/a_plik.pdf"
+        Attachment.objects.create(task=task, filename="plik.pdf", object_key=self.kept, file_url="")
+        # Obiekt po deduplikacji: klucz z taskiem, którego już nie ma, ale obiekt jest w użyciu.
+        self.shared = f"{self.prefix}/task_999/b_raport.pdf"
+        StoredObject.objects.create(user=user, content_hash="h", object_key=self.shared, ref_count=1)
+
+        old = timezone.now() - timedelta(days=2)
+        self.orphans = [f"{self.prefix}/d_przerwany.bin", f"{self.prefix}/task_{task.id}/c_stary.pdf"]
+        objects = [{"Key": key, "LastModified": old} for key in (self.kept, self.shared, f"{self.prefix}/inne/f.txt", *self.orphans)]
+        objects.append({"Key": f"{self.prefix}/e_swiezy.bin", "LastModified": timezone.now()})
+        # Jak S3: rosnąco po kluczu, strony po 3.
+        objects.sort(key=lambda obj: obj["Key"])
+        self.pages = [objects[:3], objects[3:]]
+
+    def list_objects(self, *, prefix, start_after=None, page_size):
+        for page in self.pages:
+            yield [obj for obj in page if start_after is None or obj["Key"] > start_after]
+
+    def test_deletes_only_old_unreferenced_keys_page_by_page(self):
+        with mock.patch.object(oss, "list_objects", self.list_objects), \
+                mock.patch.object(oss, "delete_objects", return_value=[]) as delete:
+            stats = orphan_objects.collect_orphans(grace=timedelta(hours=24))
+
+        self.assertEqual([c.args[0] for c in delete.call_args_list], [[key] for key in self.orphans])
+        self.assertEqual((stats["pages"], stats["scanned"], stats["skipped"], stats["deleted"]), (2, 6, 2, 2))
+        self.assertEqual(stats["last_key"], self.shared)
+
+    def test_command_resumes_from_checkpoint(self):
+        checkpoint = os.path.join(settings.BASE_DIR, f"orphans-{os.getpid()}.checkpoint")
+        self.addCleanup(lambda: os.path.exists(checkpoint) and os.remove(checkpoint))
+        with mock.patch.object(oss, "list_objects", self.list_objects), \
+                mock.patch.object(oss, "delete_objects", return_value=[]) as delete:
+            call_command("collect_orphan_objects", checkpoint=checkpoint, max_pages=1, stdout=mock.Mock())
+            with open(checkpoint) as f:
+                self.assertEqual(f.read(), f"{self.prefix}/inne/f.txt")
+
+            call_command("collect_orphan_objects", checkpoint=checkpoint, stdout=mock.Mock())
+
+        self.assertEqual([c.args[0] for c in delete.call_args_list], [[key] for key in self.orphans])
+        self.assertFalse(os.path.exists(checkpoint))
+
+
+class TaskTransferTests(TestCase):
+    def setUp(self):
+        use_test_db(self, task_transfer)
+        self.user = User.objects.create(mail="a@fomo.local", password="!")
+        start = timezone.now() - timedelta(days=1)
+        self.tasks = [
+            Task.objects.create(user=self.user, title=f"Zadanie {i}", created_at=start + timedelta(minutes=i))
+            for i in range(3)
+        ]
+        Attachment.objects.create(task=self.tasks[0], filename="a.pdf", object_key="k", file_url="https://x/k")
+        Task.objects.create(user=User.objects.create(mail="b@fomo.local", password="!"), title="Cudze")
+
+    @override_settings(TASK_EXPORT_BATCH_SIZE=2)
+    def test_export_streams_batches_in_both_formats(self):
+        self.client.force_login(self.user)
+        response = self.client.get("/tasks/export/")
+        self.assertTrue(response.streaming)
+        chunks = [chunk.decode() for chunk in response.streaming_content]
+        self.assertEqual(len(chunks), 2)
+        rows = [json.loads(line) for line in "".join(chunks).splitlines()]
+        self.assertEqual([r["title"] for r in rows], ["Zadanie 0", "Zadanie 1", "Zadanie 2"])
+        self.assertEqual(rows[0]["attachments"][0]["filename"], "a.pdf")
+
+        response = self.client.get("/tasks/export/?format=csv")
+        self.assertIn("attachment;", response["Content-Disposition"])
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], ",".join(task_transfer.CSV_FIELDS))
+        self.assertEqual(len(lines), 4)
+
+        self.assertEqual(self.client.get("/tasks/export/?format=xml").status_code, 400)
+
+    def test_import_inserts_batches_and_reports_bad_rows(self):
+        exported = "".join(task_transfer.export_chunks(user_id=self.user.id, fmt="jsonl"))
+        source = io.StringIO(exported + '{"title": ""}\nnie json\n{"title": "Nowe", "status": "zly"}\n')
+        other = User.objects.get(mail="b@fomo.local")
+        progress = []
+
+        with mock.patch.object(task_transfer, "_insert_batch", wraps=task_transfer._insert_batch) as insert:
+            stats = task_transfer.import_tasks(
+                user_id=other.id, fileobj=source, fmt="jsonl", batch_size=3, on_progress=lambda s: progress.append(s["imported"])
+            )
+
+        self.assertEqual((stats["imported"], stats["skipped"]), (4, 2))
+        self.assertEqual(stats["errors"], ["linia 4: brak tytułu", "linia 5: niepoprawny JSON"])
+        self.assertEqual([len(call.args[0]) for call in insert.call_args_list], [3, 1])
+        self.assertEqual(progress, [3, 4])
+        imported = Task.objects.filter(user=other).exclude(title="Cudze").order_by("created_at", "id")
+        self.assertEqual([t.title for t in imported], ["Zadanie 0", "Zadanie 1", "Zadanie 2", "Nowe"])
+        self.assertEqual(imported[0].created_at, self.tasks[0].created_at)
+        self.assertEqual(imported.last().status, "todo")
+
+    def test_import_command_finds_owner_regardless_of_case(self):
+        owner = User.objects.create(mail="Jan.Kowalski@fomo.local", password="!")
+        exported = "".join(task_transfer.export_chunks(user_id=self.user.id, fmt="jsonl"))
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False) as f:
+            f.write(exported)
+        self.addCleanup(os.remove, f.name)
+
+        with mock.patch.object(task_transfer, "_written"):
+            call_command("import_tasks", f.name, user=" jan.kowalski@FOMO.local", stdout=io.StringIO())
+        self.assertEqual(Task.objects.filter(user=owner).count(), 3)
+
+        User.objects.create(mail="jan.kowalski@fomo.local", password="!")
+        with self.assertRaises(CommandError):
+            call_command("import_tasks", f.name, user="JAN.kowalski@fomo.local", stdout=io.StringIO())
+
+
+class AdminChangelistTests(TestCase):
+    def setUp(self):
+        caches["default"].clear()
+        self.client.force_login(User.objects.create_superuser(email="admin@fomo.local", password="x"))
+        self.client.get("/admin/todo/task/")
+        for i in range(3):
+            user = User.objects.create(mail=f"u{i}@fomo.local", password="!")
+            task = Task.objects.create(user=user, title=f"Kupić ręcznik {i}" if i else "Umyć okna")
+            task.attachments.create(filename="a.txt", object_key=f"k{i}", file_url="")
+
+    def _listed(self, url, queries):
+        # Licznik i strona (sesja i użytkownik z cache) – bez zapytań per wiersz.
+        with self.assertNumQueries(queries):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [obj.id for obj in response.context["cl"].result_list]
+
+    def test_task_changelist_joins_users_and_searches_full_text(self):
+        self.assertEqual(len(self._listed("/admin/todo/task/", 2)), 3)
+        found = self._listed("/admin/todo/task/?q=ręczn", 2)
+        self.assertEqual(sorted(found), sorted(Task.objects.filter(title__startswith="Kupić").values_list("id", flat=True)))
+        self.assertEqual(len(self._listed("/admin/todo/task/?q=u0@fomo.local", 2)), 1)
+
+    def test_attachment_changelist_searches_ids_only(self):
+        self.assertEqual(len(self._listed("/admin/todo/attachment/", 2)), 3)
+        self.assertEqual(self._listed("/admin/todo/attachment/?q=a.txt", 2), [])
+
+    def test_count_is_capped(self):
+        with mock.patch.object(EstimatedCountPaginator, "count_limit", 2):
+            response = self.client.get("/admin/todo/task/?status__exact=todo")
+        self.assertEqual(response.context["cl"].result_count, 2)
+
+
+class QueryPlanTests(TestCase):
+    def setUp(self):
+        # Jedno wypożyczenie z puli: cały workload musi iść wspólnym połączeniem rolled_back().
+        pool = mock.Mock()
+        pool.connection.side_effect = [nullcontext(SavepointConnection())]
+        patcher = mock.patch.object(mysql_pool, "get_pool", return_value=pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_service_queries_use_indexes(self):
+        self.assertEqual(query_plans.check(), {})
+
+    def test_workload_leaves_database_unchanged(self):
+        other = User.objects.create(mail="b@fomo.local", password="!")
+        due = Task.objects.create(user=other, title="Cudze", remind_at=datetime(1960, 1, 1, tzinfo=dt_timezone.utc))
+
+        with instrumentation.capture_queries() as queries:
+            query_plans.run_workload()
+
+        self.assertTrue(any("UPDATE tasks" in sql for sql, _ in queries))
+        self.assertEqual(list(User.objects.all()), [other])
+        self.assertEqual(list(Task.objects.all()), [due])
+        due.refresh_from_db()
+        self.assertIsNone(due.reminder_sent_at)
+        self.assertIsNone(due.reminder_claimed_by)
+        self.assertEqual(due.reminder_attempts, 0)
+
+    def test_flags_full_scan_and_filesort(self):
+        problems = query_plans.explain(DjangoDBConnection(), "SELECT id FROM tasks WHERE title = %s ORDER BY remind_at", ("x",))
+        self.assertEqual(problems, {query_plans.FULL_SCAN, query_plans.FILESORT})
+
+    def test_mysql_plan_rows(self):
+        rows = [
+            {"table": "<derived2>", "type": "ALL", "Extra": "Using filesort"},
+            {"table": "a", "type": "ref", "Extra": None},
+            {"table": "t", "type": "ALL", "Extra": "Using where; Using filesort"},
+        ]
+        self.assertEqual(query_plans._mysql_problems(rows), {query_plans.FULL_SCAN, query_plans.FILESORT})
+        self.assertEqual(query_plans._mysql_problems(rows[:2]), set())
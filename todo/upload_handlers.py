@@ -0,0 +1,128 @@
+"""
+Odbiór załączników z formularza (FILE_UPLOAD_HANDLERS w settings).
+
+Limit ATTACHMENT_MAX_SIZE jest sprawdzany w trakcie odbioru: za duży plik przerywa upload
+od razu (bez czytania reszty requestu), a widok dostaje upload_too_large(request).
+Suma sha256 liczy się w locie. Plik trafia do pliku tymczasowego (dalej: spool i wysyłka
+w tle), a przy ATTACHMENT_STREAM_TO_S3 – kawałkami prosto do multipart uploadu S3.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile, UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopFutureHandlers, StopUpload
+
+from todo.services import oss
+
+# Zapas na pola formularza i nagłówki multipart ponad sam plik.
+FORM_OVERHEAD = 1024 * 1024
+
+
+def upload_too_large(request) -> bool:
+    return getattr(request, "_upload_too_large", False)
+
+
+class StreamedUploadedFile(UploadedFile):
+    """
+    Plik już zapisany w S3 (object_key, file_url) – w requeście zostają tylko metadane.
+    """
+
+    def __init__(self, *, name, content_type, size, charset, object_key: str, file_url: str, sha256: str):
+        super().__init__(None, name, content_type, size, charset)
+        self.object_key = object_key
+        self.file_url = file_url
+        self.sha256 = sha256
+
+    def open(self, mode=None):
+        raise ValueError("Plik został wysłany do S3 w trakcie odbioru – nie ma lokalnej kopii.")
+
+    def close(self):
+        pass
+
+
+class AttachmentUploadHandler(FileUploadHandler):
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.max_size = settings.ATTACHMENT_MAX_SIZE
+        self.request_length = None
+        self._file = None
+        self._stream = None
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self.request_length = content_length
+
+    def _reject(self):
+        self._discard()
+        if self.request is not None:
+            self.request._upload_too_large = True
+        raise StopUpload(connection_reset=True)
+
+    def _discard(self):
+        if self._stream is not None:
+            self._stream.abort()
+            self._stream = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _user_id(self) -> int | None:
+        user = getattr(self.request, "user", None)
+        return user.id if user is not None and user.is_authenticated else None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        # Content-Length całego requestu (albo części) już przekracza limit – nie czytamy nic więcej.
+        if (self.content_length or 0) > self.max_size or (self.request_length or 0) > self.max_size + FORM_OVERHEAD:
+            self._reject()
+
+        self._sha256 = hashlib.sha256()
+        user_id = self._user_id()
+        if getattr(settings, "ATTACHMENT_STREAM_TO_S3", False) and user_id is not None:
+            self._stream = oss.StreamingUpload(
+                object_key=oss.safe_object_key(user_id=user_id, task_id=None, filename=self.file_name),
+                content_type=self.content_type,
+            )
+        else:
+            self._file = TemporaryUploadedFile(
+                self.file_name, self.content_type, 0, self.charset, self.content_type_extra
+            )
+        raise StopFutureHandlers
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > self.max_size:
+            self._reject()
+        self._sha256.update(raw_data)
+        try:
+            (self._stream or self._file).write(raw_data)
+        except Exception:
+            self._discard()
+            raise
+        return None
+
+    def file_complete(self, file_size):
+        sha256 = self._sha256.hexdigest()
+        if self._stream is not None:
+            stream, self._stream = self._stream, None
+            try:
+                file_url = stream.complete()
+            except Exception:
+                stream.abort()
+                raise
+            return StreamedUploadedFile(
+                name=self.file_name,
+                content_type=self.content_type,
+                size=file_size,
+                charset=self.charset,
+                object_key=stream.object_key,
+                file_url=file_url,
+                sha256=sha256,
+            )
+
+        upload, self._file = self._file, None
+        upload.seek(0)
+        upload.size = file_size
+        upload.sha256 = sha256
+        return upload
+
+    def upload_interrupted(self):
+        self._discard()
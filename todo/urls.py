@@ -1,12 +1,27 @@
+from django.conf import settings
 from django.urls import path
 from todo import views
 
+if settings.ASYNC_VIEWS:
+    from todo import async_views as task_views
+else:
+    task_views = views
+
 urlpatterns = [
-    path("", views.task_list, name="task_list"),
-    path("tasks/create/", views.create_task, name="create_task"),
-    path("tasks/<int:task_id>/delete/", views.delete_task, name="delete_task"),
-    path("tasks/<int:task_id>/update/", views.update_task, name="update_task"),
+    path("", task_views.task_list, name="task_list"),
+    path("tasks/changes/", task_views.task_changes, name="task_changes"),
+    path("tasks/create/", task_views.create_task, name="create_task"),
+    path("tasks/export/", task_views.export_tasks, name="export_tasks"),
+    path("tasks/bulk/", task_views.bulk_tasks, name="bulk_tasks"),
+    path("tasks/<int:task_id>/delete/", task_views.delete_task, name="delete_task"),
+    path("tasks/<int:task_id>/update/", task_views.update_task, name="update_task"),
+    path("tasks/<int:task_id>/attachments/confirm/", views.confirm_attachment, name="confirm_attachment"),
     path("login/", views.login_view, name="login"),
     path("register/", views.register_view, name="register"),
     path("logout/", views.logout_view, name="logout"),
+    path("metrics/", views.metrics_view, name="metrics"),
 ]
+
+# Zdarzenia na żywo (SSE) trzymają połączenie otwarte – tylko pod ASGI, gdzie nie blokują wątku.
+if settings.ASYNC_VIEWS:
+    urlpatterns.append(path("tasks/events/", task_views.task_events_stream, name="task_events"))
@@ -1,13 +1,32 @@
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib import messages
 from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect
-from django.views.decorators.http import require_POST
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_GET, require_POST
 
 from todo.forms import TaskCreateForm, RegisterForm, LoginForm
-from todo.services.ovh_users import ensure_ovh_user
+from todo.services import direct_uploads, metrics, task_transfer
+from todo.services.ovh_users import enqueue_ovh_user
 from todo.services.task_sql_service import create_task_sql
-from todo.services.task_read_sql_service import list_tasks_with_attachments
-from todo.services.task_sql_service import create_task_sql, delete_task_sql, update_task_sql
+from todo.services.task_cache import get_task_page
+from todo.services.task_read_sql_service import DEFAULT_PAGE_SIZE, search_tasks_page
+from todo.services.task_sync_service import get_changes
+from todo.services.task_sql_service import (
+    bulk_delete_sql,
+    bulk_move_sql,
+    bulk_set_status_sql,
+    create_task_sql,
+    delete_task_sql,
+    update_task_sql,
+)
+from todo.upload_handlers import upload_too_large
 
 
 STATUS_LABELS = {
@@ -25,13 +44,10 @@ def register_view(request):
 
     form = RegisterForm(request.POST or None)
     if request.method == "POST" and form.is_valid():
-        user = form.save()
-
-        ensure_ovh_user(
-            django_user_id=user.id,
-            email=user.mail,
-            password_hash=user.password,
-        )
+        # Konto w OVH zakłada w tle manage.py relay_outbox – zlecenie zapisuje się razem z użytkownikiem.
+        with transaction.atomic():
+            user = form.save()
+            enqueue_ovh_user(user)
 
         login(request, user)
         return redirect("task_list")
@@ -56,69 +72,251 @@ def logout_view(request):
     return redirect("login")
 
 
-@login_required
-def task_list(request):
+def _page_params(request) -> dict:
     selected_group = request.GET.get("group") or None
     if selected_group not in GROUPS:
         selected_group = None
 
-    tasks = list_tasks_with_attachments(user_id=request.user.id, group=selected_group)
+    try:
+        page_size = int(request.GET.get("page_size", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        page_size = DEFAULT_PAGE_SIZE
+
+    return {
+        "group": selected_group,
+        "query": request.GET.get("q", "").strip(),
+        "after": request.GET.get("after") or None,
+        "before": request.GET.get("before") or None,
+        "page_size": page_size,
+    }
+
+
+def _load_task_page(*, user_id: int, params: dict) -> dict:
+    group, page_size = params["group"], params["page_size"]
+    if params["query"]:
+        try:
+            return search_tasks_page(
+                user_id=user_id, query=params["query"], group=group, after=params["after"], page_size=page_size
+            )
+        except ValueError:
+            return search_tasks_page(user_id=user_id, query=params["query"], group=group, page_size=page_size)
+
+    try:
+        return get_task_page(
+            user_id=user_id, group=group, after=params["after"], before=params["before"], page_size=page_size
+        )
+    except ValueError:
+        return get_task_page(user_id=user_id, group=group, page_size=page_size)
+
+
+def _task_changes_response(*, user_id: int, params) -> JsonResponse:
+    try:
+        limit = int(params.get("limit", settings.TASK_SYNC_PAGE_SIZE))
+    except ValueError:
+        limit = settings.TASK_SYNC_PAGE_SIZE
+
+    try:
+        changes = get_changes(user_id=user_id, since=params.get("since") or None, limit=limit)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse(changes)
+
+
+def _export_format(request) -> str | None:
+    fmt = request.GET.get("format", "jsonl")
+    return fmt if fmt in task_transfer.FORMATS else None
+
+
+def _export_response(chunks, fmt: str) -> StreamingHttpResponse:
+    response = StreamingHttpResponse(chunks, content_type=task_transfer.FORMATS[fmt])
+    response["Content-Disposition"] = f'attachment; filename="fomo-zadania.{fmt}"'
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+def _task_list_context(*, page: dict, params: dict) -> dict:
+    selected_group = params["group"]
+    page_size = params["page_size"]
+    query = params["query"]
+
+    def page_url(**cursor):
+        params = {
+            "group": selected_group,
+            "q": query,
+            "page_size": page_size if page_size != DEFAULT_PAGE_SIZE else None,
+        }
+        params.update(cursor)
+        qs = urlencode({k: v for k, v in params.items() if v})
+        return f"{reverse('task_list')}?{qs}" if qs else reverse("task_list")
+
+    next_url = page_url(after=page["next_cursor"]) if page["next_cursor"] else None
+    prev_url = page_url(before=page["prev_cursor"]) if page["prev_cursor"] else None
+
     form = TaskCreateForm()
-    return render(
-        request,
-        "todo/task_list.html",
-        {"tasks": tasks, "form": form, "groups": GROUPS, "selected_group": selected_group},
-    )
+    return {
+        "tasks": page["tasks"],
+        "form": form,
+        "groups": GROUPS,
+        "selected_group": selected_group,
+        "query": query,
+        "next_url": next_url,
+        "prev_url": prev_url,
+        "direct_upload": settings.ATTACHMENT_DIRECT_UPLOAD,
+    }
+
+
+def _task_fields(request) -> dict:
+    return {
+        "title": request.POST.get("title", "").strip(),
+        "description": request.POST.get("description", "").strip(),
+        "group": request.POST.get("group", "Ważne"),
+        "status": request.POST.get("status", "todo"),
+    }
+
+
+def _direct_upload_request(request) -> dict | None:
+    """
+    Parametry wysyłki bezpośrednio do bucketu albo None, gdy formularz idzie klasycznie.
+    """
+    filename = request.POST.get("direct_upload_filename", "").strip()
+    if not (filename and settings.ATTACHMENT_DIRECT_UPLOAD):
+        return None
+    try:
+        size = int(request.POST.get("direct_upload_size", "0"))
+    except ValueError:
+        size = 0
+    return {
+        "filename": filename,
+        "size": size,
+        "content_type": request.POST.get("direct_upload_content_type") or "application/octet-stream",
+    }
+
+
+BULK_ACTIONS = ("done", "archived", "move", "delete")
+
+
+def _bulk_request(request) -> dict | None:
+    """
+    Akcja zbiorcza z formularza listy: {"action", "task_ids", "group"} albo None,
+    gdy akcja jest nieznana, nie zaznaczono tasków albo grupa jest spoza listy.
+    """
+    action = request.POST.get("action")
+    task_ids = [int(v) for v in request.POST.getlist("task_ids") if v.isdigit()]
+    group = request.POST.get("group") or None
+    if action not in BULK_ACTIONS or not task_ids:
+        return None
+    if action == "move" and group not in GROUPS:
+        return None
+    return {"action": action, "task_ids": task_ids, "group": group}
+
+
+def _run_bulk(*, user_id: int, action: str, task_ids: list[int], group: str | None) -> int:
+    if action == "delete":
+        return bulk_delete_sql(user_id=user_id, task_ids=task_ids)
+    if action == "move":
+        return bulk_move_sql(user_id=user_id, task_ids=task_ids, group=group)
+    return bulk_set_status_sql(user_id=user_id, task_ids=task_ids, status=action)
+
+
+@login_required
+def task_list(request):
+    params = _page_params(request)
+    page = _load_task_page(user_id=request.user.id, params=params)
+    return render(request, "todo/task_list.html", _task_list_context(page=page, params=params))
+
+@require_GET
+@login_required
+def task_changes(request):
+    # Synchronizacja przyrostowa: ?since=<kursor z poprzedniej odpowiedzi>.
+    return _task_changes_response(user_id=request.user.id, params=request.GET)
+
+
+@require_GET
+@login_required
+def export_tasks(request):
+    # Strumień paczkami (task_transfer.export_chunks) – pamięć nie rośnie z liczbą tasków.
+    fmt = _export_format(request)
+    if fmt is None:
+        return JsonResponse({"error": "Nieznany format eksportu."}, status=400)
+    return _export_response(task_transfer.export_chunks(user_id=request.user.id, fmt=fmt), fmt)
+
 
 @require_POST
 @login_required
 def update_task(request, task_id: int):
-    title = request.POST.get("title", "").strip()
-    description = request.POST.get("description", "").strip()
-    group = request.POST.get("group", "Ważne")
-    status = request.POST.get("status", "todo")
-
-    update_task_sql(
-        user_id=request.user.id,
-        task_id=task_id,
-        title=title,
-        description=description,
-        group=group,
-        status=status,
-    )
+    update_task_sql(user_id=request.user.id, task_id=task_id, **_task_fields(request))
     return redirect("task_list")
 
 
 @require_POST
 @login_required
 def create_task(request):
-    title = request.POST.get("title", "").strip()
-    description = request.POST.get("description", "").strip()
-    group = request.POST.get("group", "Ważne")
-    status = request.POST.get("status", "todo")
+    fields = _task_fields(request)
     upload = request.FILES.get("file")
 
-    if upload and upload.size > 100 * 1024 * 1024:
+    if upload_too_large(request) or (upload and upload.size > settings.ATTACHMENT_MAX_SIZE):
         messages.error(request, "Plik jest za duży. Maksymalny rozmiar to 100 MB.")
         return redirect("task_list")
 
-    if status not in ("todo", "in_progress", "done"):
-        status = "todo"
-
-    create_task_sql(
-        user_id=request.user.id,
-        title=title,
-        description=description,
-        group=group,
-        status=status,
-        upload=upload,
-    )
+    if fields["status"] not in ("todo", "in_progress", "done"):
+        fields["status"] = "todo"
+
+    # Wysyłka bezpośrednio do bucketu: tworzymy sam task, przeglądarka dostaje presigned POST.
+    direct = _direct_upload_request(request)
+    if direct:
+        if direct["size"] > settings.ATTACHMENT_MAX_SIZE:
+            return JsonResponse({"error": "Plik jest za duży. Maksymalny rozmiar to 100 MB."}, status=400)
+
+        task_id = create_task_sql(user_id=request.user.id, **fields)
+        direct_upload = direct_uploads.start(
+            user_id=request.user.id,
+            task_id=task_id,
+            filename=direct["filename"],
+            content_type=direct["content_type"],
+        )
+        direct_upload["confirm_url"] = reverse("confirm_attachment", args=[task_id])
+        return JsonResponse({"task_id": task_id, "upload": direct_upload})
+
+    create_task_sql(user_id=request.user.id, upload=upload, **fields)
     return redirect("task_list")
 
 
+@require_POST
+@login_required
+def confirm_attachment(request, task_id: int):
+    try:
+        attachment = direct_uploads.confirm(
+            user_id=request.user.id,
+            task_id=task_id,
+            token=request.POST.get("token", ""),
+        )
+    except direct_uploads.DirectUploadError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    return JsonResponse(attachment)
+
+
 @require_POST
 @login_required
 def delete_task(request, task_id: int):
     delete_task_sql(user_id=request.user.id, task_id=task_id)
     return redirect("task_list")
 
+
+@require_POST
+@login_required
+def bulk_tasks(request):
+    bulk = _bulk_request(request)
+    if bulk:
+        _run_bulk(user_id=request.user.id, **bulk)
+    return redirect("task_list")
+
+
+def metrics_view(request):
+    token = settings.METRICS_TOKEN
+    auth = request.headers.get("Authorization", "")
+    if not (token and constant_time_compare(auth, f"Bearer {token}")) and not request.user.is_staff:
+        return HttpResponseForbidden()
+
+    return HttpResponse(metrics.render_prometheus(), content_type="text/plain; version=0.0.4")
+